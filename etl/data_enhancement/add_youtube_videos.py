@@ -1,7 +1,7 @@
-"""Adds the youtube video links to the art_ontology.json
+"""Adds the youtube video links to the artworks, artists and movements in the entity store
 
 Pre-conditions:
-    The art_ontology.json file has to be existing
+    The entities have to be in the entity store (see shared/entity_store.py)
 
 Examples:
     python3 add_youtube_videos.py
@@ -10,7 +10,7 @@ Examples:
     python3 add_youtube_videos.py -c
 
 Returns:
-    Modified version of the art_ontology.json with youtube video links
+    The entities in the entity store with youtube video links
 """
 
 import csv
@@ -22,19 +22,20 @@ from typing import Dict, List, Optional
 
 import requests
 
+from data_extraction.request_utils import get_session, log_session_stats
 from shared.constants import (
     ADD_YOUTUBE_VIDEOS_LOG_FILENAME,
     ARTIST,
     ARTWORK,
     ETL_STATES,
     ID,
-    JSON,
     MOVEMENT,
     PLURAL,
     VIDEOS,
     YOUTUBE_VIDEOS_FILE,
 )
-from shared.utils import check_state, create_new_path, setup_logger, write_state
+from shared.entity_store import EntityStore
+from shared.utils import check_state, setup_logger, write_state
 
 # setup logger
 logger = setup_logger(
@@ -63,7 +64,7 @@ def check_yt_id_valid(id: str) -> bool:
         id, GOOGLE_DEV_KEY
     )
     try:
-        res = requests.get(api_request_url)
+        res = get_session().get(api_request_url)
         video = res.json()
         video_exists = video["pageInfo"]["totalResults"] == 1
         return video_exists or res.status_code == 403
@@ -161,26 +162,16 @@ if __name__ == "__main__":
     if RECOVER_MODE and check_state(ETL_STATES.DATA_TRANSFORMATION.ADD_YOUTUBE_VIDEOS):
         exit(0)
     check = "-c" in sys.argv
+    store = EntityStore()
     for entity_type in [ARTWORK[PLURAL], ARTIST[PLURAL], MOVEMENT[PLURAL]]:
         print(
             datetime.datetime.now(),
             f"Starting with adding youtube videos for file: {entity_type}",
         )
         try:
-            # Open file
-            with open((create_new_path(entity_type)).with_suffix(f".{JSON}"), encoding="utf-8") as file:
-                items = json.load(file)
-
-            entities = add_youtube_videos(items, check_ids=check)
-
-            # Overwrite file
-            with open(
-                (create_new_path(entity_type)).with_suffix(f".{JSON}"),
-                "w",
-                newline="",
-                encoding="utf-8",
-            ) as file:
-                json.dump(entities, file, ensure_ascii=False)
+            # Only the ids are read and only the entities with videos are updated
+            entities = add_youtube_videos(list(store.read(entity_type, [ID])), check_ids=check)
+            store.update(entity_type, [VIDEOS], [entity for entity in entities if VIDEOS in entity])
         except Exception as error:
             logger.error(f"Error when opening following file: {entity_type}. Skipping file now.\nError:")
             logger.exception(error)
@@ -189,4 +180,6 @@ if __name__ == "__main__":
             datetime.datetime.now(),
             f"Finished adding youtube videos for file: {entity_type}",
         )
+    store.close()
+    log_session_stats(logger)
     write_state(ETL_STATES.DATA_TRANSFORMATION.ADD_YOUTUBE_VIDEOS)
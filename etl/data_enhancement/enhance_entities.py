@@ -0,0 +1,254 @@
+"""Runs all enhancement steps in one process over the entities of the entity store
+
+Every step is a pass which declares the fields it reads and writes per entity type. The runner reads the union
+of the fields of all passes once from the entity store (see shared/entity_store.py), applies the passes in
+memory in their order and writes the union of the written fields of every type once. So the artworks are read
+and written once instead of once per step.
+
+The steps can still be run on their own with their scripts (estimate_movement_period.py, ...). main.py builds
+one stage per pass from ENHANCEMENT_PASSES and runs it with --pass, so both pipelines run the same passes.
+
+Examples:
+    python3 enhance_entities.py
+
+    # check for valid youtube ids
+    python3 enhance_entities.py -c
+
+    # only run the ranking pass
+    python3 enhance_entities.py --pass ranking
+
+Returns:
+    The entities in the entity store with the fields of all enhancement steps
+"""
+
+# ruff: noqa: F403 F405
+import datetime
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from data_enhancement import add_youtube_videos, estimate_movement_period, has_part_part_of_enhancement, ranking
+from data_extraction.request_utils import log_session_stats
+from shared.constants import *
+from shared.entity_store import EntityStore
+from shared.utils import check_state, setup_logger, write_state
+
+logger = setup_logger(
+    "data_enhancement.enhance_entities",
+    Path(__file__).parent.parent.absolute() / "logs" / ENHANCE_ENTITIES_LOG_FILENAME,
+)
+
+RECOVER_MODE = False
+CHECK_YOUTUBE_IDS = False
+
+
+class EnhancementPass(NamedTuple):
+    """A transform of the entities with the fields it reads and writes per entity type
+
+    reads maps an entity type to the fields the pass needs, None means the whole documents. The id is always read.
+    apply gets the entities of all read types and changes them in place. files are the files the pass reads
+    besides the entity store.
+    """
+
+    name: str
+    state: str
+    reads: Dict[str, Optional[List[str]]]
+    writes: Dict[str, List[str]]
+    apply: Callable[[Dict[str, List[Dict]]], None]
+    files: List[Path] = []
+
+
+def estimate_movement_period_pass(entities: Dict[str, List[Dict]]) -> None:
+    estimate_movement_period.estimate_movement_periods(entities[ARTWORK[PLURAL]], entities[MOVEMENT[PLURAL]])
+
+
+def has_part_part_of_pass(entities: Dict[str, List[Dict]]) -> None:
+    movements = has_part_part_of_enhancement.inverse_attribute_enhancement(
+        HAS_PART, PART_OF, entities[MOVEMENT[PLURAL]]
+    )
+    has_part_part_of_enhancement.inverse_attribute_enhancement(PART_OF, HAS_PART, movements)
+
+
+def youtube_videos_pass(entities: Dict[str, List[Dict]]) -> None:
+    for entity_type in [ARTWORK[PLURAL], ARTIST[PLURAL], MOVEMENT[PLURAL]]:
+        add_youtube_videos.add_youtube_videos(entities[entity_type], check_ids=CHECK_YOUTUBE_IDS)
+
+
+def ranking_pass(entities: Dict[str, List[Dict]]) -> None:
+    artworks = ranking.rank_artworks(entities[ARTWORK[PLURAL]])
+    for entity_type in ranking.SUBJECT_TYPES:
+        ranking.rank_subjects(entity_type, entities[entity_type], artworks)
+
+
+# The passes in the order of scripts/etl.sh before they were fused. The ranking counts all fields of an artwork,
+# so it has to be the last pass
+ENHANCEMENT_PASSES = [
+    EnhancementPass(
+        "estimate_movement_period",
+        ETL_STATES.DATA_TRANSFORMATION.ESTIMATE_MOVEMENT_PERIOD,
+        {ARTWORK[PLURAL]: [MOVEMENT[PLURAL], "inception"], MOVEMENT[PLURAL]: ["start_time", "end_time"]},
+        {MOVEMENT[PLURAL]: ["start_time_est", "end_time_est"]},
+        estimate_movement_period_pass,
+    ),
+    EnhancementPass(
+        "has_part_part_of_enhancement",
+        ETL_STATES.DATA_TRANSFORMATION.HAS_PART_PART_OF_ENHANCEMENT,
+        {MOVEMENT[PLURAL]: [HAS_PART, PART_OF]},
+        {MOVEMENT[PLURAL]: [HAS_PART, PART_OF]},
+        has_part_part_of_pass,
+    ),
+    EnhancementPass(
+        "add_youtube_videos",
+        ETL_STATES.DATA_TRANSFORMATION.ADD_YOUTUBE_VIDEOS,
+        {ARTWORK[PLURAL]: [], ARTIST[PLURAL]: [], MOVEMENT[PLURAL]: []},
+        {ARTWORK[PLURAL]: [VIDEOS], ARTIST[PLURAL]: [VIDEOS], MOVEMENT[PLURAL]: [VIDEOS]},
+        youtube_videos_pass,
+        [Path(__file__).resolve().parent / YOUTUBE_VIDEOS_FILE],
+    ),
+    EnhancementPass(
+        "ranking",
+        ETL_STATES.DATA_TRANSFORMATION.RANKING,
+        {ARTWORK[PLURAL]: None, **{entity_type: [] for entity_type in ranking.SUBJECT_TYPES}},
+        {entity_type: [ABSOLUTE_RANK, RELATIVE_RANK] for entity_type in [ARTWORK[PLURAL], *ranking.SUBJECT_TYPES]},
+        ranking_pass,
+    ),
+]
+
+
+def get_read_fields(passes: List[EnhancementPass]) -> Dict[str, Optional[List[str]]]:
+    """Union of the fields the passes read per entity type, None if a pass reads the whole documents
+
+    Args:
+        passes: The passes which are run
+
+    Returns:
+        The fields per entity type
+    """
+    read_fields = {}
+    for enhancement_pass in passes:
+        for entity_type, fields in enhancement_pass.reads.items():
+            if fields is None or (entity_type in read_fields and read_fields[entity_type] is None):
+                read_fields[entity_type] = None
+            else:
+                read_fields[entity_type] = list(dict.fromkeys([*read_fields.get(entity_type, []), *fields]))
+    return read_fields
+
+
+def _overlap(fields: Optional[List[str]], other_fields: Optional[List[str]]) -> bool:
+    """Checks if two field lists share a field, None means all fields"""
+    if fields is None:
+        return other_fields is None or len(other_fields) > 0
+    if other_fields is None:
+        return len(fields) > 0
+    return any(field in other_fields for field in fields)
+
+
+def depends_on(enhancement_pass: EnhancementPass, earlier_pass: EnhancementPass) -> bool:
+    """Checks if a pass has to run after an earlier pass of ENHANCEMENT_PASSES
+
+    This is the case if one of them writes fields the other reads or both write the same fields, otherwise the
+    result of the passes doesn't depend on their order.
+
+    Args:
+        enhancement_pass: The pass
+        earlier_pass: A pass before it in ENHANCEMENT_PASSES
+
+    Returns:
+        True if enhancement_pass has to run after earlier_pass
+    """
+    for entity_type, fields in enhancement_pass.reads.items():
+        if _overlap(fields, earlier_pass.writes.get(entity_type, [])):
+            return True
+    for entity_type, fields in enhancement_pass.writes.items():
+        if _overlap(fields, earlier_pass.writes.get(entity_type, [])):
+            return True
+        if entity_type in earlier_pass.reads and _overlap(fields, earlier_pass.reads[entity_type]):
+            return True
+    return False
+
+
+def write_entities(store: EntityStore, entity_type: str, fields: List[str], entities: List[Dict]) -> None:
+    """Writes the fields of the entities to the entity store
+
+    A pass doesn't have to set a field on every entity (e. g. the videos), so the entities are grouped by the
+    written fields they contain.
+
+    Args:
+        store: The entity store
+        entity_type: Type of the entities e. g. 'artworks'
+        fields: Fields which were written by the passes
+        entities: The entities
+    """
+    groups = {}
+    for entity in entities:
+        groups.setdefault(tuple(field for field in fields if field in entity), []).append(entity)
+    for group_fields, group in groups.items():
+        store.update(entity_type, list(group_fields), group)
+
+
+def run_passes(passes: List[EnhancementPass], store: EntityStore) -> List[EnhancementPass]:
+    """Reads the entities once, applies the passes and writes every entity type once
+
+    A failed pass is logged and skipped, its fields aren't written.
+
+    Args:
+        passes: The passes in the order they are applied
+        store: The entity store
+
+    Returns:
+        The passes which succeeded
+    """
+    entities = {}
+    for entity_type, fields in get_read_fields(passes).items():
+        print(datetime.datetime.now(), f"Reading {entity_type} from the entity store")
+        try:
+            entities[entity_type] = list(store.read(entity_type, fields))
+        except FileNotFoundError as error:
+            logger.error(f"Error when reading {entity_type}, passes which need them are skipped. Error: {error}")
+
+    succeeded = []
+    for enhancement_pass in passes:
+        if any(entity_type not in entities for entity_type in enhancement_pass.reads):
+            continue
+        print(datetime.datetime.now(), f"Starting {enhancement_pass.name}")
+        try:
+            enhancement_pass.apply(entities)
+        except Exception as error:
+            logger.error(f"Error in {enhancement_pass.name}. Skipping it now.\nError:")
+            logger.exception(error)
+            continue
+        succeeded.append(enhancement_pass)
+        print(datetime.datetime.now(), f"Finished {enhancement_pass.name}")
+
+    written_fields = {}
+    for enhancement_pass in succeeded:
+        for entity_type, fields in enhancement_pass.writes.items():
+            written_fields[entity_type] = list(dict.fromkeys([*written_fields.get(entity_type, []), *fields]))
+    for entity_type, fields in written_fields.items():
+        print(datetime.datetime.now(), f"Writing {', '.join(fields)} of {entity_type} to the entity store")
+        write_entities(store, entity_type, fields, entities[entity_type])
+    return succeeded
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and "-r" in sys.argv:
+        RECOVER_MODE = True
+    CHECK_YOUTUBE_IDS = "-c" in sys.argv
+    passes = ENHANCEMENT_PASSES
+    if "--pass" in sys.argv:
+        if len(sys.argv) <= sys.argv.index("--pass") + 1:
+            print("--pass needs the name of a pass")
+            exit(1)
+        name = sys.argv[sys.argv.index("--pass") + 1]
+        passes = [enhancement_pass for enhancement_pass in ENHANCEMENT_PASSES if enhancement_pass.name == name]
+        if not passes:
+            print(f"Unknown pass {name}, the passes are {', '.join(p.name for p in ENHANCEMENT_PASSES)}")
+            exit(1)
+    passes = [
+        enhancement_pass for enhancement_pass in passes if not (RECOVER_MODE and check_state(enhancement_pass.state))
+    ]
+    with EntityStore() as store:
+        succeeded = run_passes(passes, store)
+    log_session_stats(logger)
+    for enhancement_pass in succeeded:
+        write_state(enhancement_pass.state)
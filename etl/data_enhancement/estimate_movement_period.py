@@ -1,29 +1,26 @@
 """Script to estimate start and end of each movement by finding first and last artwork of the movement."""
 
-import json
 import sys
-from pathlib import Path
+from typing import Dict, Iterable, List
 
-import ijson
-
-from shared.constants import ETL_STATES
-from shared.utils import DecimalEncoder, check_state, write_state
+from shared.constants import ARTWORK, ETL_STATES, MOVEMENT, PLURAL
+from shared.entity_store import EntityStore
+from shared.utils import check_state, write_state
 
 inceptions = {}
 RECOVER_MODE = False
 
 
-def find_start_end_in_artworks(artworks_file):
+def find_start_end_in_artworks(artworks_list: Iterable[Dict]):
     """Finds the first and last inception for each movement in a batch of artworks.
     Fills in inceptions dict.
 
     Args:
-        artworks_file (path-like object): path to file containing the batch to process
+        artworks_list: Artworks with the fields movements and inception
 
     Examples:
-        find_start_end_in_artworks(artworks_file)
+        find_start_end_in_artworks(store.read("artworks", ["movements", "inception"]))
     """
-    artworks_list = ijson.items(open(artworks_file, "r", encoding="utf-8"), "item")
     # find first and last inception for each movement in artworks
     for artwork in artworks_list:
         if artwork["movements"] and artwork["inception"]:
@@ -41,27 +38,18 @@ def find_start_end_in_artworks(artworks_file):
     return
 
 
-if __name__ == "__main__":
-    """Gets for all movements all first and last inceptions from the artworks file and
-       sets them to each movement if start_time/end_time is missing.
-    """
-    if len(sys.argv) > 1 and "-r" in sys.argv:
-        RECOVER_MODE = True
+def estimate_movement_periods(artworks_list: Iterable[Dict], movements_list: Iterable[Dict]) -> List[Dict]:
+    """Sets start_time_est and end_time_est of each movement to the first and last inception of its artworks
+    if start_time/end_time is missing or later/earlier
 
-    if RECOVER_MODE and check_state(ETL_STATES.DATA_TRANSFORMATION.ESTIMATE_MOVEMENT_PERIOD):
-        exit(0)
-
-    # start = datetime.now()
-    movements_file = (
-        Path(__file__).resolve().parent.parent / "crawler_output" / "intermediate_files" / "json" / "movements.json"
-    )
-    artworks_file = (
-        Path(__file__).resolve().parent.parent / "crawler_output" / "intermediate_files" / "json" / "artworks.json"
-    )
-    movements_output_file = movements_file  # Change here for different output file
-    movements_list = ijson.items(open(movements_file, "r", encoding="utf-8"), "item")
+    Args:
+        artworks_list: Artworks with the fields movements and inception
+        movements_list: Movements with the fields start_time and end_time
 
-    find_start_end_in_artworks(artworks_file)
+    Returns:
+        The movements with the estimated start and end
+    """
+    find_start_end_in_artworks(artworks_list)
 
     movements_modified = []
     # for each movement check if start/end needs to be estimated
@@ -87,8 +75,28 @@ if __name__ == "__main__":
             movement["end_time_est"] = ""
         movements_modified.append(movement)
 
-    with open(movements_output_file, "w", newline="", encoding="utf-8") as file:
-        json.dump(movements_modified, file, ensure_ascii=False, cls=DecimalEncoder)
+    return movements_modified
+
+
+if __name__ == "__main__":
+    """Gets for all movements all first and last inceptions from the artworks file and
+       sets them to each movement if start_time/end_time is missing.
+    """
+    if len(sys.argv) > 1 and "-r" in sys.argv:
+        RECOVER_MODE = True
+
+    if RECOVER_MODE and check_state(ETL_STATES.DATA_TRANSFORMATION.ESTIMATE_MOVEMENT_PERIOD):
+        exit(0)
+
+    # start = datetime.now()
+    store = EntityStore()
+    # Only the fields which are needed for the estimation are read from the entity store
+    movements_modified = estimate_movement_periods(
+        store.read(ARTWORK[PLURAL], ["movements", "inception"]),
+        store.read(MOVEMENT[PLURAL], ["start_time", "end_time"]),
+    )
+    store.update(MOVEMENT[PLURAL], ["start_time_est", "end_time_est"], movements_modified)
+    store.close()
     write_state(ETL_STATES.DATA_TRANSFORMATION.ESTIMATE_MOVEMENT_PERIOD)
 
     # print('took ', datetime.now() - start)
@@ -0,0 +1,38 @@
+"""Exports the entities of the entity store to the intermediate JSON files
+
+The extraction and the enhancement steps write their fields to the entity store (see shared/entity_store.py),
+this script writes crawler_output/intermediate_files/json/<type>.json once at the end for split_languages.py.
+
+Examples:
+    python3 export_entities.py
+
+    # also write a <type>.ndjson file (one entity per line) for every type
+    python3 export_entities.py -n
+
+Returns:
+    A <type>.json file for every type in the entity store
+"""
+
+import datetime
+import sys
+
+from shared.constants import ETL_STATES, JSON, NDJSON
+from shared.entity_store import EntityStore
+from shared.utils import check_state, write_state
+
+RECOVER_MODE = False
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and "-r" in sys.argv:
+        RECOVER_MODE = True
+    if RECOVER_MODE and check_state(ETL_STATES.DATA_TRANSFORMATION.EXPORT_ENTITIES):
+        exit(0)
+    file_types = [JSON, NDJSON] if "-n" in sys.argv else [JSON]
+    with EntityStore() as store:
+        for entity_type in store.entity_types():
+            for file_type in file_types:
+                export = store.export_ndjson if file_type == NDJSON else store.export_json
+                count = export(entity_type)
+                print(datetime.datetime.now(), f"Exported {count} {entity_type} to {entity_type}.{file_type}")
+    write_state(ETL_STATES.DATA_TRANSFORMATION.EXPORT_ENTITIES)
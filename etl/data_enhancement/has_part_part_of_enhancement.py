@@ -4,12 +4,11 @@ since they are inverse to each other
 """
 
 import datetime
-import json
 import sys
-from pathlib import Path
 from typing import Dict, List
 
-from shared.constants import ETL_STATES, HAS_PART, ID, PART_OF
+from shared.constants import ETL_STATES, HAS_PART, ID, MOVEMENT, PART_OF, PLURAL
+from shared.entity_store import EntityStore
 from shared.utils import check_state, write_state
 
 RECOVER_MODE = False
@@ -47,17 +46,11 @@ if __name__ == "__main__":
         exit(0)
 
     print("Starting part of, has part enhancement on movements", datetime.datetime.now())
-    movements_file = (
-        Path(__file__).resolve().parent.parent / "crawler_output" / "intermediate_files" / "json" / "movements.json"
-    )
-
-    with open(movements_file, encoding="utf-8") as file:
-        movements = json.load(file)
+    with EntityStore() as store:
+        movements = list(store.read(MOVEMENT[PLURAL], [HAS_PART, PART_OF]))
         movements = inverse_attribute_enhancement(HAS_PART, PART_OF, movements)
         movements = inverse_attribute_enhancement(PART_OF, HAS_PART, movements)
-
-    with open(movements_file, "w", newline="", encoding="utf-8") as file:
-        file.write(json.dumps(movements, ensure_ascii=False))
+        store.update(MOVEMENT[PLURAL], [HAS_PART, PART_OF], movements)
 
     print("Finished part of, has part enhancement on movements", datetime.datetime.now())
     write_state(ETL_STATES.DATA_TRANSFORMATION.HAS_PART_PART_OF_ENHANCEMENT)
@@ -8,14 +8,14 @@ Returns:
 
 # ruff: noqa: F403 F405
 import datetime
-import json
 import sys
 from numbers import Number
 from pathlib import Path
 from typing import Dict, List
 
 from shared.constants import *
-from shared.utils import check_state, create_new_path, setup_logger, write_state
+from shared.entity_store import EntityStore
+from shared.utils import check_state, setup_logger, write_state
 
 # setup logger
 logger = setup_logger(
@@ -25,6 +25,17 @@ logger = setup_logger(
 
 RECOVER_MODE = False
 
+# Types which are ranked by the number of artworks they occur in, the field of the artworks has the same name
+SUBJECT_TYPES = [
+    MOTIF[PLURAL],  # Main subjects are not considered
+    GENRE[PLURAL],
+    MATERIAL[PLURAL],
+    MOVEMENT[PLURAL],
+    ARTIST[PLURAL],
+    LOCATION[PLURAL],
+    CLASS[PLURAL],
+]
+
 
 def rank_artworks(artworks: List[Dict], ignore_keys: List[str] = None) -> List[Dict]:
     """Ranks a list of artwork entities (JSON-Objects)
@@ -94,37 +105,22 @@ if __name__ == "__main__":
     if RECOVER_MODE and check_state(ETL_STATES.DATA_TRANSFORMATION.RANKING):
         exit(0)
     artworks = []
-    for filename in [
-        ARTWORK[PLURAL],  # Artworks has to be first otherwise the ranking doesn't work
-        MOTIF[PLURAL],  # Main subjects are not considered
-        GENRE[PLURAL],
-        MATERIAL[PLURAL],
-        MOVEMENT[PLURAL],
-        ARTIST[PLURAL],
-        LOCATION[PLURAL],
-        CLASS[PLURAL],
-    ]:
+    store = EntityStore()
+    # Artworks has to be first otherwise the ranking doesn't work
+    for filename in [ARTWORK[PLURAL], *SUBJECT_TYPES]:
         print(
             datetime.datetime.now(),
             "Starting ranking with",
             filename,
         )
         try:
-            # Read in file
-            with open((create_new_path(filename)).with_suffix(f".{JSON}"), encoding="utf-8") as file:
-                if filename is ARTWORK[PLURAL]:
-                    artworks = out_file = rank_artworks(json.load(file))
-                else:
-                    out_file = rank_subjects(filename, json.load(file), artworks)
-            # Overwrite file
-            # TODO if merging is done with sth else as js script than overwrite current file
-            with open(
-                (create_new_path(filename)).with_suffix(f".{JSON}"),
-                "w",
-                newline="",
-                encoding="utf-8",
-            ) as file:
-                json.dump(out_file, file, ensure_ascii=False)
+            # The artworks are ranked by all their fields, the subjects only need their ids
+            if filename is ARTWORK[PLURAL]:
+                artworks = out_file = rank_artworks(list(store.read(filename)))
+            else:
+                out_file = rank_subjects(filename, list(store.read(filename, [ID])), artworks)
+            # Only the ranks are written back
+            store.update(filename, [ABSOLUTE_RANK, RELATIVE_RANK], out_file)
             print(
                 datetime.datetime.now(),
                 "Finished ranking with",
@@ -134,4 +130,5 @@ if __name__ == "__main__":
             logger.error(f"Error when opening following file: {filename}. Skipping file now.\nError:")
             logger.exception(error)
             continue
+    store.close()
     write_state(ETL_STATES.DATA_TRANSFORMATION.RANKING)
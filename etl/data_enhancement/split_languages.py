@@ -17,10 +17,6 @@ import sys
 from pathlib import Path
 from typing import Any, Dict, List
 
-import ijson
-import json
-from decimal import Decimal
-
 from shared.constants import (
     ABSTRACT,
     CITIZENSHIP,
@@ -48,7 +44,15 @@ from shared.constants import (
     CLASS,
     PLURAL,
 )
-from shared.utils import check_state, create_new_path, is_jsonable, language_config_to_list, write_state
+from shared.utils import (
+    check_state,
+    create_new_path,
+    get_json_codec,
+    iter_json_items,
+    language_config_to_list,
+    write_ndjson,
+    write_state,
+)
 
 language_values = language_config_to_list()
 language_keys = [item[0] for item in language_values]
@@ -229,6 +233,9 @@ def _open_new_batch_file(lang_key: str, part_idx: int, output_dir: Path):
 def _write_batches_for_languages(item_iterator, batch_size: int = 1000, output_dir: Path = None):
     """Stream items from `item_iterator` and write per-language NDJSON batch files.
 
+    Every language dict is serialized once, Decimals parsed by ijson are written as numbers. Items which aren't
+    serializable are logged and skipped.
+
     Args:
         item_iterator: iterator that yields JSON objects (artwork dicts)
         batch_size: number of items per output file
@@ -248,30 +255,15 @@ def _write_batches_for_languages(item_iterator, batch_size: int = 1000, output_d
         counts[lang] = 0
         handles[lang], _ = _open_new_batch_file(lang, part_idx[lang], output_dir)
 
+    codec = get_json_codec(decimals_as_numbers=True)
     total = 0
     for item in item_iterator:
         total += 1
-        if not is_jsonable(item):
-            continue
         for lang in language_keys:
             modified = modify_langdict(item, lang)
             modified = remove_language_key_attributes_in_exhibitions([modified], [lang])[0]
-
-            # sanitize non-serializable types (e.g., Decimal) before writing
-            def _sanitize(obj):
-                # recursively convert Decimal to float and sanitize nested structures
-                if isinstance(obj, Decimal):
-                    return float(obj)
-                if isinstance(obj, dict):
-                    return {k: _sanitize(v) for k, v in obj.items()}
-                if isinstance(obj, list):
-                    return [_sanitize(v) for v in obj]
-                return obj
-
-            sanitized = _sanitize(modified)
             # write to current file for lang
-            handles[lang].write(json.dumps(sanitized, ensure_ascii=False) + "\n")
-            counts[lang] += 1
+            counts[lang] += write_ndjson([modified], handles[lang], codec)
             if counts[lang] >= batch_size:
                 handles[lang].close()
                 part_idx[lang] += 1
@@ -319,8 +311,7 @@ if __name__ == "__main__":
     aggregated = crawler_dir / "art_ontology.json"
     item_iter = None
     if aggregated.exists():
-        f = open(aggregated, encoding="utf-8")
-        item_iter = ijson.items(f, "item")
+        item_iter = iter_json_items(aggregated)
     else:
         # look for intermediate files under intermediate_files/json
         inter_dir = Path(__file__).resolve().parent.parent / CRAWLER_OUTPUT / INTERMEDIATE_FILES / JSON
@@ -339,9 +330,7 @@ if __name__ == "__main__":
             for filename in filenames:
                 if not (filepath:=create_new_path(filename).with_suffix(f".{JSON}")).exists():
                     continue
-                with open(filepath, encoding="utf-8") as file:
-                    for item in ijson.items(file, "item"):
-                        yield item
+                yield from iter_json_items(filepath)
 
         item_iter = gen()
 
@@ -0,0 +1,132 @@
+"""Micro-benchmark of the compiled claims mapper against the try_get functions
+
+Maps recorded wikidata entities with both paths, checks that they produce the same artwork fields and prints
+the entities per second of each path.
+
+Usage:
+    python3 data_extraction/benchmark_claims_mapper.py [entities.json|entities.ndjson] [-n repeats] [-q]
+
+The file contains either a wbgetentities response, a JSON list of entities or one entity per line.
+Without a file the artwork entities of the entity cache (cache/wikidata_entities.sqlite) are used.
+-q disables the logging of missing attributes to measure the mapping alone.
+"""
+
+# ruff: noqa: F403 F405
+import json
+import logging
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from data_extraction import map_wd_attribute
+from data_extraction.constants import *
+from data_extraction.load_wd_entities import ARTWORK_CLAIM_SPECS, map_artwork_claims
+from data_extraction.response_cache import CACHE_DIRECTORY
+from shared.blocklist import BLOCKLIST
+from shared.constants import *
+from shared.utils import iter_ndjson
+
+# try_get function per kind, this is how map_artwork mapped the claims before the compiled mapper
+TRY_GET_FUNCTIONS = {
+    map_wd_attribute.QID_LIST: map_wd_attribute.try_get_qid_reference_list,
+    map_wd_attribute.FIRST_QID: map_wd_attribute.try_get_first_qid,
+    map_wd_attribute.VALUE_LIST: map_wd_attribute.try_get_value_list,
+    map_wd_attribute.FIRST_VALUE: map_wd_attribute.try_get_first_value,
+    map_wd_attribute.DIMENSION_VALUE: map_wd_attribute.try_get_dimension_value,
+    map_wd_attribute.DIMENSION_UNIT: map_wd_attribute.try_get_dimension_unit,
+    map_wd_attribute.YEAR: map_wd_attribute.try_get_year_from_property_timestamp,
+}
+
+
+def map_claims_with_try_get_functions(entity_dict: Dict, oab_type: str) -> Dict[str, Any]:
+    """Maps the artwork claims with one try_get call per field and applies the blocklist afterwards"""
+    mapped = {}
+    for field, property_name, kind in ARTWORK_CLAIM_SPECS:
+        if kind == map_wd_attribute.SIGNIFICANT_EVENTS:
+            mapped[field] = map_wd_attribute.try_get_significant_events(entity_dict)
+        else:
+            mapped[field] = TRY_GET_FUNCTIONS[kind](entity_dict, PROPERTY_NAME_TO_PROPERTY_ID[property_name], oab_type)
+        if kind in (map_wd_attribute.QID_LIST, map_wd_attribute.VALUE_LIST):
+            mapped[field] = list(set(mapped[field]) - set(BLOCKLIST))
+    return mapped
+
+
+def load_entities(path: Path) -> List[Dict]:
+    """Loads recorded entities from a JSON or NDJSON file
+
+    Args:
+        path: Path of a wbgetentities response, a JSON list of entities or a NDJSON file
+
+    Returns:
+        The entities with claims
+    """
+    if path.suffix == f".{NDJSON}":
+        entities = list(iter_ndjson(path))
+    else:
+        with open(path, encoding="utf-8") as file:
+            entities = json.load(file)
+        if isinstance(entities, dict):
+            entities = list(entities[ENTITIES].values())
+    return [entity for entity in entities if CLAIMS in entity]
+
+
+def load_cached_entities(limit: int = 10000) -> List[Dict]:
+    """Loads the entities with an image from the entity cache, these are the artworks"""
+    connection = sqlite3.connect(CACHE_DIRECTORY / ENTITY_CACHE_FILENAME)
+    try:
+        rows = connection.execute("SELECT value FROM entries LIMIT ?", (limit * 4,)).fetchall()
+    finally:
+        connection.close()
+    entities = [json.loads(value) for (value,) in rows]
+    image = PROPERTY_NAME_TO_PROPERTY_ID[IMAGE]
+    return [entity for entity in entities if image in entity.get(CLAIMS, {})][:limit]
+
+
+def normalize(mapped: Dict[str, Any]) -> Dict[str, Any]:
+    """Sorts the reference lists because their order depends on a set"""
+    return {
+        field: sorted(value, key=json.dumps) if isinstance(value, list) else value for field, value in mapped.items()
+    }
+
+
+def measure(map_claims: Callable[[Dict, str], Dict], entities: List[Dict], repeats: int) -> float:
+    """Returns the best entities per second of the repeats"""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for entity in entities:
+            map_claims(entity, ARTWORK[PLURAL])
+        best = min(best, time.perf_counter() - start)
+    return len(entities) / best
+
+
+if __name__ == "__main__":
+    repeats = 5
+    if "-n" in sys.argv:
+        repeats = int(sys.argv[sys.argv.index("-n") + 1])
+        del sys.argv[sys.argv.index("-n") : sys.argv.index("-n") + 2]
+    if "-q" in sys.argv:
+        sys.argv.remove("-q")
+        logging.disable(logging.INFO)
+    entities = load_entities(Path(sys.argv[1])) if len(sys.argv) > 1 else load_cached_entities()
+    if not entities:
+        print("No entities to benchmark")
+        exit(1)
+
+    mismatches = [
+        entity[ID]
+        for entity in entities
+        if normalize(map_artwork_claims(entity, ARTWORK[PLURAL]))
+        != normalize(map_claims_with_try_get_functions(entity, ARTWORK[PLURAL]))
+    ]
+    if mismatches:
+        print(f"The mappers differ on {len(mismatches)} entities e. g. {mismatches[:10]}")
+        exit(1)
+
+    try_get_rate = measure(map_claims_with_try_get_functions, entities, repeats)
+    compiled_rate = measure(map_artwork_claims, entities, repeats)
+    print(f"{len(entities)} entities, best of {repeats} runs")
+    print(f"try_get functions: {try_get_rate:,.0f} entities/s")
+    print(f"compiled mapper:   {compiled_rate:,.0f} entities/s ({compiled_rate / try_get_rate:.1f}x)")
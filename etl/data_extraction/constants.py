@@ -11,8 +11,46 @@ HTTP_HEADER = {
 }
 
 MAX_LAG = 10  # see https://www.mediawiki.org/wiki/Manual:Maxlag_parameter
-SLEEP_TIME = 60  # Time in seconds to sleep if a request failed
+SLEEP_TIME = 60  # Maximum time in seconds to back off if a request failed and the server sent no Retry-After
 TIMEOUT = 5  # Time to timeout a request
+# Maximum number of HTTP requests in flight at the same time per host. The cap is shared by every caller within
+# the process so running several extraction loops concurrently doesn't multiply the load on the wikimedia servers
+MAX_CONCURRENT_REQUESTS = 4
+# AIMD rate controller per host, see rate_controller.py
+RATE_MIN_CONCURRENCY = 1  # The in-flight limit never drops below this value
+RATE_DECREASE_FACTOR = 0.5  # Multiplicative decrease of the in-flight limit on throttling
+RATE_LATENCY_TARGET = 3  # Seconds, slower responses are treated as a sign of an overloaded server
+RATE_MIN_BACKOFF = 1  # Seconds of the first back-off if the server sent no Retry-After
+# Connection pool sizes of the shared HTTP session
+HTTP_POOL_CONNECTIONS = 16  # Number of hosts which keep their pool (wikidata, wikipedias, query service, youtube)
+HTTP_POOL_MAXSIZE = MAX_CONCURRENT_REQUESTS  # Number of kept-alive connections per host
+SPARQL_TIMEOUT = 90  # The wikidata query service stops queries after 60 seconds
+SPARQL_LATENCY_TARGET = 60  # Seconds, queries are slow by nature so only answers close to the timeout throttle
+SPARQL_SHARD_SIZE = 50  # Number of subclasses of an artwork type which are queried together
+WIKIPEDIA_TITLES_PER_REQUEST = 50  # Maximum number of titles per request of the MediaWiki API
+
+# On-disk cache for wikidata entities, see response_cache.py
+ENTITY_CACHE_FILENAME = "wikidata_entities.sqlite"
+ENTITY_CACHE_TTL = 7 * 24 * 60 * 60  # Seconds an entity is served from the cache without checking its revision
+ENTITY_CACHE_MAX_SIZE = 16 * 1024**3  # Bytes, least recently used entities are evicted if the cache gets bigger
+# On-disk cache for the intro extracts of wikipedia pages, see response_cache.py
+EXTRACT_CACHE_FILENAME = "wikipedia_extracts.sqlite"
+EXTRACT_CACHE_TTL = 30 * 24 * 60 * 60  # Seconds an extract is served before its revision is checked with prop=info
+EXTRACT_CACHE_MAX_SIZE = 4 * 1024**3  # Bytes, least recently used extracts are evicted if the cache gets bigger
+CACHE_ACCESS_FLUSH_SIZE = 1000  # Read entries whose access time is buffered before it's written to the cache
+
+# Entities of a wikidata JSON dump, see wd_dump.py
+DUMP_STORE_FILENAME = "wikidata_dump.sqlite"
+DUMP_BATCH_SIZE = 1000  # Dump lines which are parsed per task of a worker process
+
+# Maximum number of levels of the transitive closures e. g. over 'subclass_of' of classes
+TRANSITIVE_CLOSURE_MAX_DEPTH = 50
+
+# Number of sampled items per missing attribute in the summary of map_wd_attribute.log_missing_attribute_stats
+MISSING_ATTRIBUTE_EXAMPLES = 3
+
+# Artwork revisions of the last run which are compared in the incremental mode of get_wikidata_items.py
+REVISIONS_FILENAME = "revisions.json"
 
 QID_PATTERN = r"^Q[1-9]\d*"  # Possible QIDs regex starting from Q1
 
@@ -21,6 +59,7 @@ GET_WIKIPEDIA_EXTRACS_LOG_FILENAME = "get_wikipedia_extracts.log"
 WIKIDATA_MAP_ATTRIBUTE_LOG_FILENAME = "map_wd_attribute.log"
 WIKIDATA_MAP_RESPONSE_LOG_FILENAME = "map_wd_response.log"
 ARTWORK_IDS_QUERY_FILENAME = "artwork_ids_query.sparql"
+ARTWORK_CLASSES_QUERY_FILENAME = "artwork_classes_query.sparql"
 WIKIDATA_SPARQL_URL = "https://query.wikidata.org/sparql"
 WIKIDATA_ENTITY_URL = "http://www.wikidata.org/entity/"
 WIKIDATA_API_URL = "https://www.wikidata.org/w/api.php"
@@ -44,6 +83,8 @@ TEXT = "text"
 COMMONS_MEDIA = "commonsMedia"
 EN = "en"
 ENTITIES = "entities"
+INFO = "info"
+LASTREVID = "lastrevid"
 ABBREVIATION = "abbreviation"
 # The wd: prefix is used here because these ids are used in a SPARQL query
 SOURCE_TYPES = [
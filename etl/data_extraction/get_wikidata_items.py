@@ -10,13 +10,23 @@ Examples:
     Get two chunks per artwork subclass
     python3 get_wikidata_items.py -d 2
 
+    Request every entity from wikidata instead of serving cached entities from the entity cache
+    python3 get_wikidata_items.py --no-cache
+
+    Read the entities from a local wikidata JSON dump instead of requesting them from the APIs
+    python3 get_wikidata_items.py --dump /data/latest-all.json.gz
+
+    Only request artworks which are new or changed since the previous run, the other artworks
+    are copied from the previous output files. Cached subjects are only used if their revision didn't change
+    python3 get_wikidata_items.py -i
+
 Returns:
     Different *.json and *.csv files for the extracted wikidata entities which are mapped
     to the openArtBrowser entities/models
     - artworks.json/.csv
-        - paintings.json/.csv
-        - drawings.json/.csv
-        - sculptures.json/.csv
+        - paintings.ndjson/.csv
+        - drawings.ndjson/.csv
+        - sculptures.ndjson/.csv
     - artists.json/.csv
     - classes.json/.csv
     - genres.json/.csv
@@ -30,21 +40,27 @@ Returns:
 # ruff: noqa: F403 F405
 import csv
 import datetime
+import json
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Optional
-
-import ijson
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
-from data_extraction import load_wd_entities
+from data_extraction import load_wd_entities, map_wd_attribute, rate_controller, wd_dump
 from data_extraction.constants import *
+from data_extraction.rate_controller import log_rate_controller_stats
+from data_extraction.request_utils import log_session_stats
+from data_extraction.response_cache import get_entity_cache
 from shared.blocklist import BLOCKLIST
+from shared.chunk_journal import ChunkJournal, journal_path
 from shared.constants import *
+from shared.entity_store import EntityStore
 from shared.utils import (
     check_state,
     create_new_path,
-    generate_json,
-    is_jsonable,
+    get_json_codec,
+    iter_json_items,
     language_config_to_list,
     setup_logger,
     write_state,
@@ -53,6 +69,8 @@ from shared.utils import (
 DEV = False
 DEV_CHUNK_LIMIT = 2  # Not entry but chunks of 50
 RECOVER_MODE = False
+INCREMENTAL_MODE = False
+PROCESSES = 1  # Number of worker processes which extract the artwork types concurrently
 TEST_MODE = False
 CLASS_LIM = 2
 
@@ -64,7 +82,7 @@ logger = setup_logger(
 lang_keys = [item[0] for item in language_config_to_list()]
 
 
-def write_data_to_json_and_csv(
+def write_data_to_store_and_csv(
     motifs: List[Dict],
     genres: List[Dict],
     extracted_classes: List[Dict],
@@ -75,7 +93,9 @@ def write_data_to_json_and_csv(
     artists: List[Dict],
     classes: List[Dict],
 ) -> None:
-    """Writes the given lists of dictionaries to json and csv files
+    """Writes the given lists of dictionaries to the entity store and csv files
+
+    The JSON files are exported from the entity store after the enhancement steps.
 
     Args:
         motifs: List of motifs
@@ -88,61 +108,62 @@ def write_data_to_json_and_csv(
         artists: List of artists
         classes: List of classes
     """
-    generate_json(motifs, create_new_path(MOTIF[PLURAL]))
-    generate_csv(
-        motifs,
-        get_fields(MOTIF[PLURAL]),
-        create_new_path(MOTIF[PLURAL], file_type=CSV),
-    )
-    generate_json(genres, create_new_path(GENRE[PLURAL]))
-    generate_csv(
-        genres,
-        get_fields(GENRE[PLURAL]),
-        create_new_path(GENRE[PLURAL], file_type=CSV),
-    )
-    generate_json(extracted_classes, create_new_path(EXTRACTED_CLASS[PLURAL]))
-    generate_csv(
-        extracted_classes,
-        get_fields(EXTRACTED_CLASS[PLURAL]),
-        create_new_path(EXTRACTED_CLASS[PLURAL], file_type=CSV),
-    )
-    generate_json(materials, create_new_path(MATERIAL[PLURAL]))
-    generate_csv(
-        materials,
-        get_fields(MATERIAL[PLURAL]),
-        create_new_path(MATERIAL[PLURAL], file_type=CSV),
-    )
-    generate_json(movements, create_new_path(MOVEMENT[PLURAL]))
-    generate_csv(
-        movements,
-        get_fields(MOVEMENT[PLURAL]),
-        create_new_path(MOVEMENT[PLURAL], file_type=CSV),
-    )
-    generate_json(locations, create_new_path(LOCATION[PLURAL]))
-    generate_csv(
-        locations,
-        get_fields(LOCATION[PLURAL]),
-        create_new_path(LOCATION[PLURAL], file_type=CSV),
-    )
-    print(f"writing json of {len(merged_artworks)} artworks")
-    generate_json(merged_artworks, create_new_path(ARTWORK[PLURAL]))
-    generate_csv(
-        merged_artworks,
-        get_fields(ARTWORK[PLURAL]),
-        create_new_path(ARTWORK[PLURAL], file_type=CSV),
-    )
-    generate_json(artists, create_new_path(ARTIST[PLURAL]))
-    generate_csv(
-        artists,
-        get_fields(ARTIST[PLURAL]),
-        create_new_path(ARTIST[PLURAL], file_type=CSV),
-    )
-    generate_json(classes, create_new_path(CLASS[PLURAL]))
-    generate_csv(
-        classes,
-        get_fields(CLASS[PLURAL]),
-        create_new_path(CLASS[PLURAL], file_type=CSV),
-    )
+    with EntityStore() as store:
+        store.replace(MOTIF[PLURAL], motifs)
+        generate_csv(
+            motifs,
+            get_fields(MOTIF[PLURAL]),
+            create_new_path(MOTIF[PLURAL], file_type=CSV),
+        )
+        store.replace(GENRE[PLURAL], genres)
+        generate_csv(
+            genres,
+            get_fields(GENRE[PLURAL]),
+            create_new_path(GENRE[PLURAL], file_type=CSV),
+        )
+        store.replace(EXTRACTED_CLASS[PLURAL], extracted_classes)
+        generate_csv(
+            extracted_classes,
+            get_fields(EXTRACTED_CLASS[PLURAL]),
+            create_new_path(EXTRACTED_CLASS[PLURAL], file_type=CSV),
+        )
+        store.replace(MATERIAL[PLURAL], materials)
+        generate_csv(
+            materials,
+            get_fields(MATERIAL[PLURAL]),
+            create_new_path(MATERIAL[PLURAL], file_type=CSV),
+        )
+        store.replace(MOVEMENT[PLURAL], movements)
+        generate_csv(
+            movements,
+            get_fields(MOVEMENT[PLURAL]),
+            create_new_path(MOVEMENT[PLURAL], file_type=CSV),
+        )
+        store.replace(LOCATION[PLURAL], locations)
+        generate_csv(
+            locations,
+            get_fields(LOCATION[PLURAL]),
+            create_new_path(LOCATION[PLURAL], file_type=CSV),
+        )
+        print(f"writing {len(merged_artworks)} artworks to the entity store")
+        store.replace(ARTWORK[PLURAL], merged_artworks)
+        generate_csv(
+            merged_artworks,
+            get_fields(ARTWORK[PLURAL]),
+            create_new_path(ARTWORK[PLURAL], file_type=CSV),
+        )
+        store.replace(ARTIST[PLURAL], artists)
+        generate_csv(
+            artists,
+            get_fields(ARTIST[PLURAL]),
+            create_new_path(ARTIST[PLURAL], file_type=CSV),
+        )
+        store.replace(CLASS[PLURAL], classes)
+        generate_csv(
+            classes,
+            get_fields(CLASS[PLURAL]),
+            create_new_path(CLASS[PLURAL], file_type=CSV),
+        )
 
 
 # region csv file functions
@@ -242,34 +263,86 @@ def generate_csv(extract_dicts: List[Dict], fields: List[str], filename: str) ->
             writer.writerow(extract_dict)
 
 
+def write_artworks(
+    artwork_chunks: Iterable[List[Dict]],
+    fields: List[str],
+    type_name: str,
+    journal: Optional[ChunkJournal] = None,
+) -> int:
+    """Writes the artwork chunks of one type to '<type>.ndjson' and '<type>.csv' in the same pass
+
+    Every chunk is appended to both files as soon as it is mapped, so only one chunk is held in memory.
+    The files are written to temporary files which replace the output of the previous run when all
+    chunks are written. The incremental mode reads the previous output while the new one is written.
+
+    Args:
+        artwork_chunks: Chunks of artwork dicts e. g. from load_wd_entities.extract_artworks
+        fields: Column names of the csv file
+        type_name: Artwork type e. g. paintings
+        journal: Journal of the unit. The temporary files are opened with it, on resume they are
+            truncated to the last committed chunk and continued. Defaults to None.
+
+    Returns:
+        The number of artworks written in this run
+    """
+    json_path = create_new_path(ARTWORK[PLURAL], f"{type_name}.{NDJSON}")
+    csv_path = create_new_path(ARTWORK[PLURAL], f"{type_name}.{CSV}", CSV)
+    json_tmp_path = json_path.with_name(f"{json_path.name}.tmp")
+    csv_tmp_path = csv_path.with_name(f"{csv_path.name}.tmp")
+    json_path.parent.mkdir(parents=True, exist_ok=True)
+    csv_path.parent.mkdir(parents=True, exist_ok=True)
+    codec = get_json_codec()
+    count = 0
+    if journal is not None:
+        json_file = journal.open_output(NDJSON, json_tmp_path)
+        csv_file = journal.open_output(CSV, csv_tmp_path)
+    else:
+        json_file = open(json_tmp_path, "w", newline="", encoding="utf-8")
+        csv_file = open(csv_tmp_path, "w", newline="", encoding="utf-8")
+    with json_file, csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=fields, delimiter=";", quotechar='"')
+        # A resumed file already contains the header
+        if csv_file.tell() == 0:
+            writer.writeheader()
+        for artworks in artwork_chunks:
+            for artwork in artworks:
+                json_file.write(codec.dumps(artwork))
+                json_file.write("\n")
+                writer.writerow(artwork)
+            count += len(artworks)
+    os.replace(json_tmp_path, json_path)
+    os.replace(csv_tmp_path, csv_path)
+    return count
+
+
 # endregion
 
 
 def merge_artworks() -> List[Dict]:
-    """Merges artworks from files 'paintings.json', 'drawings.json',
-    'sculptures.json' (function extract_artworks) and
+    """Merges artworks from files 'paintings.ndjson', 'drawings.ndjson',
+    'sculptures.ndjson' (function extract_artworks) and
     stores them in a dictionary
 
+    The files are streamed line by line, only the merged list is held in memory.
+    Numbers with a fraction are read as Decimal like ijson does
+
     Returns:
         A list of dictionaries containing all artworks
     """
     print(datetime.datetime.now(), "Starting with", "merging artworks")
     artworks = set()
-    file_names = [f"{source_type[PLURAL]}.{JSON}" for source_type in SOURCE_TYPES]
+    file_names = [f"{source_type[PLURAL]}.{NDJSON}" for source_type in SOURCE_TYPES]
     file_names = [create_new_path(ARTWORK[PLURAL], subpath=file_name) for file_name in file_names]
     extract_dicts = []
 
     for file_name in file_names:
         try:
-            with open(file_name, encoding="utf-8") as input:
-                objects = ijson.items(input, "item")
-                object_array = (o for o in objects)
-                for object in object_array:
-                    # remove duplicates
-                    if object[ID] not in artworks and is_jsonable(object):
-                        object[TYPE] = ARTWORK[SINGULAR]
-                        extract_dicts.append(object)
-                        artworks.add(object[ID])
+            for object in iter_json_items(file_name):
+                # remove duplicates
+                if object[ID] not in artworks:
+                    object[TYPE] = ARTWORK[SINGULAR]
+                    extract_dicts.append(object)
+                    artworks.add(object[ID])
         except Exception as e:
             logger.error(f"Error when opening following file: {file_name}. Skipping file now.")
             logger.error(e)
@@ -279,36 +352,251 @@ def merge_artworks() -> List[Dict]:
     return extract_dicts
 
 
+def load_revisions() -> Dict[str, int]:
+    """Loads the artwork revisions of the previous run from 'revisions.json'
+
+    Returns:
+        A dict of the artwork qids and their revision, empty if there was no previous run
+    """
+    try:
+        with open(create_new_path(ARTWORK[PLURAL], subpath=REVISIONS_FILENAME), encoding="utf-8") as input:
+            return json.load(input)
+    except FileNotFoundError:
+        logger.warning("No revisions of a previous run found. All artworks are extracted")
+        return {}
+
+
+def write_revisions(revisions: Dict[str, int]) -> None:
+    """Writes the artwork revisions of this run to 'revisions.json' for the next incremental run
+
+    Args:
+        revisions: Dict of the artwork qids and their revision
+    """
+    path_name = create_new_path(ARTWORK[PLURAL], subpath=REVISIONS_FILENAME)
+    path_name.parent.mkdir(parents=True, exist_ok=True)
+    with open(path_name, "w", newline="", encoding="utf-8") as file:
+        json.dump(revisions, file)
+
+
+def get_previous_artworks_path(type_name: str) -> Optional[Path]:
+    """Returns the output file of one artwork type of the previous run e. g. 'paintings.ndjson'
+
+    Args:
+        type_name: Artwork type e. g. paintings
+
+    Returns:
+        The path of the file, None if there was no previous run
+    """
+    path_name = create_new_path(ARTWORK[PLURAL], subpath=f"{type_name}.{NDJSON}")
+    return path_name if path_name.exists() else None
+
+
+def extract_source_type(
+    source: Dict,
+    artwork_ids: List[str],
+    already_crawled_wikidata_items: Set[str],
+    revisions: Dict[str, int],
+) -> ChunkJournal:
+    """Extracts the artworks of one artwork type to '<type>.ndjson' and '<type>.csv'
+
+    Args:
+        source: Artwork type of SOURCE_TYPES
+        artwork_ids: Qids of the artworks of the type
+        already_crawled_wikidata_items: Qids of the artworks extracted by other types, the extracted qids are added
+        revisions: Revisions of the artworks, the revisions of the extracted artworks are added
+
+    Returns:
+        The journal of the type, it has to be finished after finish_source_type
+    """
+    journal = ChunkJournal(ETL_STATES.GET_WIKIDATA_ITEMS.EXTRACT_SOURCE + source[PLURAL], resume=RECOVER_MODE)
+    artwork_chunks = load_wd_entities.extract_artworks(
+        source[PLURAL],
+        source[ID],
+        already_crawled_wikidata_items,
+        DEV,
+        DEV_CHUNK_LIMIT,
+        revisions=revisions,
+        previous_artworks_path=get_previous_artworks_path(source[PLURAL]) if INCREMENTAL_MODE else None,
+        journal=journal,
+        artwork_ids=artwork_ids,
+    )
+    write_artworks(artwork_chunks, get_fields(source[PLURAL]), source[PLURAL], journal)
+    return journal
+
+
+def finish_source_type(source: Dict, revisions: Dict[str, int]) -> None:
+    """Writes the revisions and the state of an extracted artwork type
+
+    Args:
+        source: Artwork type of SOURCE_TYPES
+        revisions: Revisions of all artworks
+    """
+    if revisions:
+        write_revisions(revisions)
+    write_state(ETL_STATES.GET_WIKIDATA_ITEMS.EXTRACT_SOURCE + source[PLURAL])
+
+
+def _init_worker(settings: Dict, host_limits: Dict) -> None:
+    """Applies the flags of the parent process in a worker process of extract_source_types_in_processes
+
+    Args:
+        settings: Flags of the parent process
+        host_limits: Semaphores by host which all workers share, see rate_controller.create_shared_host_limits
+    """
+    global DEV, DEV_CHUNK_LIMIT, RECOVER_MODE, INCREMENTAL_MODE
+    DEV = settings["dev"]
+    DEV_CHUNK_LIMIT = settings["dev_chunk_limit"]
+    RECOVER_MODE = settings["recover_mode"]
+    INCREMENTAL_MODE = settings["incremental_mode"]
+    load_wd_entities.USE_ENTITY_CACHE = settings["use_entity_cache"]
+    load_wd_entities.REVALIDATE_CACHED_ENTITIES = settings["revalidate_cached_entities"]
+    if settings["dump_store_path"] is not None:
+        load_wd_entities.DUMP_STORE = wd_dump.DumpEntityStore(Path(settings["dump_store_path"]))
+    rate_controller.use_shared_host_limits(host_limits)
+
+
+def _extract_source_type_in_worker(
+    source: Dict, artwork_ids: List[str], revisions: Dict[str, int]
+) -> Tuple[Dict[str, int], Dict]:
+    """Extracts one artwork type in a worker process, see extract_source_type
+
+    Returns:
+        The revisions of the artworks of the type and the missing attributes counted while mapping them
+    """
+    journal = extract_source_type(source, artwork_ids, set(), revisions)
+    journal.close()
+    # A worker extracts several types, so the counters are reset after every type
+    return revisions, map_wd_attribute.get_missing_attribute_stats(reset=True)
+
+
+def extract_source_types_in_processes(
+    source_types: List[Dict],
+    artwork_ids_by_type: Dict[str, List[str]],
+    already_crawled_wikidata_items: Set[str],
+    revisions: Dict[str, int],
+) -> None:
+    """Extracts the artwork types concurrently in a pool of PROCESSES worker processes
+
+    The qids of all types are known before the workers start, so every qid is claimed here for the first type
+    (in the order of SOURCE_TYPES) which contains it. The workers don't share any state, an artwork is still
+    requested only once and ends up in the same type as in the sequential extraction.
+    The workers share a semaphore of MAX_CONCURRENT_REQUESTS per wikidata host, so the load on the wikimedia
+    servers doesn't grow with the number of processes. The mapping of the artworks and the output files use all
+    cores.
+
+    Args:
+        source_types: Artwork types to extract
+        artwork_ids_by_type: Qids of the artworks by type name, see load_wd_entities.query_artwork_qids_of_types
+        already_crawled_wikidata_items: Qids which were already extracted, e. g. by finished types in recover mode
+        revisions: Revisions of all artworks, the revisions of the extracted artworks are added
+    """
+    claimed_artwork_ids = set(already_crawled_wikidata_items)
+    artwork_ids_of_type = {}
+    for source in source_types:
+        artwork_ids_of_type[source[PLURAL]] = [
+            artwork_id
+            for artwork_id in artwork_ids_by_type.pop(source[PLURAL])
+            if artwork_id not in claimed_artwork_ids
+        ]
+        claimed_artwork_ids.update(artwork_ids_of_type[source[PLURAL]])
+    del claimed_artwork_ids
+
+    processes = min(PROCESSES, len(source_types)) or 1
+    settings = {
+        "dev": DEV,
+        "dev_chunk_limit": DEV_CHUNK_LIMIT,
+        "recover_mode": RECOVER_MODE,
+        "incremental_mode": INCREMENTAL_MODE,
+        "use_entity_cache": load_wd_entities.USE_ENTITY_CACHE,
+        "revalidate_cached_entities": load_wd_entities.REVALIDATE_CACHED_ENTITIES,
+        "dump_store_path": str(load_wd_entities.DUMP_STORE.path) if load_wd_entities.DUMP_STORE is not None else None,
+    }
+    host_limits = rate_controller.create_shared_host_limits([WIKIDATA_API_URL, WIKIDATA_SPARQL_URL])
+    print(datetime.datetime.now(), f"Extracting {len(source_types)} artwork types in {processes} processes")
+    errors = []
+    with ProcessPoolExecutor(
+        max_workers=processes, initializer=_init_worker, initargs=(settings, host_limits)
+    ) as executor:
+        futures = {}
+        for source in source_types:
+            artwork_ids = artwork_ids_of_type.pop(source[PLURAL])
+            # Only the revisions of the type are sent to the worker
+            type_revisions = {qid: revisions[qid] for qid in artwork_ids if qid in revisions}
+            futures[executor.submit(_extract_source_type_in_worker, source, artwork_ids, type_revisions)] = source
+        for future in as_completed(futures):
+            source = futures[future]
+            try:
+                type_revisions, missing_attributes = future.result()
+            except Exception as error:
+                # The other types are still finished, the failed type is continued in recover mode
+                logger.error(f"Extracting {source[PLURAL]} failed")
+                logger.exception(error)
+                errors.append(error)
+                continue
+            revisions.update(type_revisions)
+            map_wd_attribute.merge_missing_attribute_stats(missing_attributes)
+            finish_source_type(source, revisions)
+            journal_path(ETL_STATES.GET_WIKIDATA_ITEMS.EXTRACT_SOURCE + source[PLURAL]).unlink(missing_ok=True)
+    if errors:
+        raise errors[0]
+
+
 def extract_art_ontology() -> None:
     """Extracts *.csv and *.json files for artworks and subjects (e. g. motifs, movements) from wikidata"""
 
     # Array of already crawled wikidata items
     already_crawled_wikidata_items = set(BLOCKLIST)
+    # Revisions of all artworks, in incremental mode the revisions of the previous run are replaced.
+    # In recover mode the revisions of the finished types were already written
+    revisions = load_revisions() if INCREMENTAL_MODE or RECOVER_MODE else {}
 
-    for source in SOURCE_TYPES if not TEST_MODE else SOURCE_TYPES[:CLASS_LIM]:
+    source_types = SOURCE_TYPES if not TEST_MODE else SOURCE_TYPES[:CLASS_LIM]
+    pending_source_types = []
+    for source in source_types:
         if RECOVER_MODE and check_state(ETL_STATES.GET_WIKIDATA_ITEMS.EXTRACT_SOURCE + source[PLURAL]):
-            continue
-        extracted_artwork = load_wd_entities.extract_artworks(
-            source[PLURAL], source[ID], already_crawled_wikidata_items, DEV, DEV_CHUNK_LIMIT
+            # The artworks of the finished type must not be loaded again by the following types
+            already_crawled_wikidata_items.update(
+                artwork[ID]
+                for artwork in iter_json_items(create_new_path(ARTWORK[PLURAL], f"{source[PLURAL]}.{NDJSON}"))
+            )
+        else:
+            pending_source_types.append(source)
+    # The artwork qids of all remaining types are queried concurrently before the extraction starts
+    artwork_ids_by_type = load_wd_entities.query_artwork_qids_of_types(pending_source_types)
+
+    if PROCESSES > 1:
+        extract_source_types_in_processes(
+            pending_source_types, artwork_ids_by_type, already_crawled_wikidata_items, revisions
         )
-
-        path_name = create_new_path(ARTWORK[PLURAL], source[PLURAL], CSV)
-        generate_csv(extracted_artwork, get_fields(source[PLURAL]), path_name)
-
-        path_name = create_new_path(ARTWORK[PLURAL], source[PLURAL], JSON)
-        generate_json(extracted_artwork, path_name)
-        write_state(ETL_STATES.GET_WIKIDATA_ITEMS.EXTRACT_SOURCE + source[PLURAL])
+    else:
+        for source in pending_source_types:
+            journal = extract_source_type(
+                source, artwork_ids_by_type.pop(source[PLURAL]), already_crawled_wikidata_items, revisions
+            )
+            finish_source_type(source, revisions)
+            journal.finish()
 
     if RECOVER_MODE and check_state(ETL_STATES.GET_WIKIDATA_ITEMS.MERGED_ARTWORKS):
         return
     merged_artworks = merge_artworks()
 
-    path_name = create_new_path(ARTWORK[PLURAL], file_type=CSV)
-
     # Get motifs and main subjects
     motifs = load_wd_entities.extract_motifs_and_main_subjects(merged_artworks)
     [motif.update({TYPE: MOTIF[SINGULAR]}) for motif in motifs]
     # Get extracted genres, materials, etc.
+    subject_types = [
+        GENRE[PLURAL],
+        MATERIAL[PLURAL],
+        MOVEMENT[PLURAL],
+        ARTIST[PLURAL],
+        LOCATION[PLURAL],
+        CLASS[PLURAL],
+    ]
+    # The journals are kept until the subjects are written with the merged artworks
+    subject_journals = {
+        subject_type: ChunkJournal(ETL_STATES.GET_WIKIDATA_ITEMS.EXTRACT_SUBJECTS + subject_type, resume=RECOVER_MODE)
+        for subject_type in subject_types
+    }
     (
         genres,
         materials,
@@ -317,15 +605,9 @@ def extract_art_ontology() -> None:
         locations,
         classes,
     ) = load_wd_entities.bundle_extract_subjects_calls(
-        [
-            GENRE[PLURAL],
-            MATERIAL[PLURAL],
-            MOVEMENT[PLURAL],
-            ARTIST[PLURAL],
-            LOCATION[PLURAL],
-            CLASS[PLURAL],
-        ],
+        subject_types,
         merged_artworks,
+        subject_journals,
     )
     print("Total movements after transitive closure loading: ", len(movements))
 
@@ -365,29 +647,19 @@ def extract_art_ontology() -> None:
             classes.append(class_itm)
 
     print("Total classes after transitive closure loading: ", len(classes))
-    # Get country labels for merged artworks and locations
+    # Get country labels for merged artworks and locations, labels for artists, unit symbols for artworks,
+    # exhibition histories and significant events as subdict. All qids are fetched together in full batches
     (
         locations,
         merged_artworks,
         movements,
-    ) = load_wd_entities.get_country_labels_for_merged_artworks_and_locations(locations, merged_artworks, movements)
-
-    # Get labels for artists
-    artists = load_wd_entities.get_labels_for_artists(artists, [GENDER, PLACE_OF_BIRTH, PLACE_OF_DEATH, CITIZENSHIP])
-
-    # Get unit symbols from qid for artworks
-    distinct_unit_qids = load_wd_entities.get_distinct_unit_symbol_qids(merged_artworks)
-    unit_symbols = load_wd_entities.get_unit_symbols(distinct_unit_qids)
-    load_wd_entities.resolve_unit_id_to_unit_symbol(merged_artworks, unit_symbols)
-
-    # Get exhibition histories as subdict
-    merged_artworks = load_wd_entities.resolve_exhibition_ids_to_exhibition_entities(merged_artworks)
-
-    # Significant events as subdict
-    merged_artworks = load_wd_entities.resolve_significant_event_id_entities_to_labels(merged_artworks)
+        artists,
+    ) = load_wd_entities.resolve_qids_to_labels_and_entities(
+        locations, merged_artworks, movements, artists, [GENDER, PLACE_OF_BIRTH, PLACE_OF_DEATH, CITIZENSHIP]
+    )
 
-    # Write to JSON
-    write_data_to_json_and_csv(
+    # Write to the entity store
+    write_data_to_store_and_csv(
         motifs,
         genres,
         extracted_classes,
@@ -399,6 +671,8 @@ def extract_art_ontology() -> None:
         classes,
     )
     write_state(ETL_STATES.GET_WIKIDATA_ITEMS.MERGED_ARTWORKS)
+    for journal in subject_journals.values():
+        journal.finish()
 
 
 if __name__ == "__main__":
@@ -421,8 +695,41 @@ if __name__ == "__main__":
             DEV = True
             if not dev_count_set:
                 DEV_CHUNK_LIMIT = 3
+        if "-i" in sys.argv:
+            print("INCREMENTAL MODE: on")
+            INCREMENTAL_MODE = True
+            # The subjects of the artworks are served from the entity cache only if they didn't change
+            load_wd_entities.REVALIDATE_CACHED_ENTITIES = True
+        if "-p" in sys.argv:
+            if len(sys.argv) > sys.argv.index("-p") + 1 and sys.argv[sys.argv.index("-p") + 1].isdigit():
+                PROCESSES = int(sys.argv[sys.argv.index("-p") + 1])
+            else:
+                PROCESSES = os.cpu_count()
+            print("PARALLEL MODE: on, PROCESSES={0}".format(PROCESSES))
+        if "--no-cache" in sys.argv:
+            load_wd_entities.USE_ENTITY_CACHE = False
+        if "--dump" in sys.argv:
+            if len(sys.argv) <= sys.argv.index("--dump") + 1:
+                print("The --dump flag needs the path of a wikidata JSON dump")
+                exit(1)
+            dump_path = Path(sys.argv[sys.argv.index("--dump") + 1])
+            print("DUMP MODE: on, DUMP={0}".format(dump_path))
+            # Only the artwork types and the entities their artworks reference are loaded from the dump
+            source_types = SOURCE_TYPES if not TEST_MODE else SOURCE_TYPES[:CLASS_LIM]
+            load_wd_entities.DUMP_STORE = wd_dump.load_dump_store(
+                dump_path,
+                classes={source_type[ID].replace("wd:", "") for source_type in source_types},
+                with_references=True,
+            )
     if RECOVER_MODE and check_state(ETL_STATES.GET_WIKIDATA_ITEMS.STATE):
         exit(0)
     logger.info("Extracting Art Ontology")
     extract_art_ontology()
+    map_wd_attribute.log_missing_attribute_stats(logger)
+    log_session_stats(logger)
+    log_rate_controller_stats(logger)
+    if load_wd_entities.USE_ENTITY_CACHE:
+        logger.info(f"Entity cache stats: {get_entity_cache().stats()}")
+    if load_wd_entities.DUMP_STORE is not None:
+        logger.info(f"Dump store stats: {load_wd_entities.DUMP_STORE.stats()}")
     write_state(ETL_STATES.GET_WIKIDATA_ITEMS.STATE)
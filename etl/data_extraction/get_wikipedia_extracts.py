@@ -1,30 +1,42 @@
 """Extract the wikipedia extracts for the sitelinks from wikidata
 
 Pre-conditions:
-    get_wikipedia_items.py should've been run and crawler_output/intermediate_files/json contains required files
+    get_wikidata_items.py should've been run and written the entities to the entity store
 
 Examples:
     python3 get_wikipedia_extract.py
 
 Returns:
-    *.json files with added attributes wikipediaLink and abstract
+    The entities in the entity store with the added attribute abstract
 """
 
 # ruff: noqa: F405
 import datetime
 import json
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional
 
 # ruff: noqa: F403
 from data_extraction.constants import *
-from data_extraction.request_utils import send_http_request
+from data_extraction.rate_controller import log_rate_controller_stats
+from data_extraction.request_utils import concurrent_map, log_session_stats, send_http_request
+from data_extraction.response_cache import ExtractCache, get_extract_cache
+from shared.chunk_journal import ChunkJournal
 from shared.constants import JSON
-from shared.utils import check_state, chunks, create_new_path, language_config_to_list, setup_logger, write_state
+from shared.entity_store import EntityStore
+from shared.utils import check_state, chunks, language_config_to_list, setup_logger, write_state
 
 RECOVER_MODE = False
 
+# Serve extracts from the on-disk extract cache and only request the changed pages
+USE_EXTRACT_CACHE = True
+
+# Properties of the pages which are stored in the extract cache
+EXTRACT_PAGE_FIELDS = ["pageid", "title", LASTREVID, "extract", "missing", "invalid"]
+
 logger = setup_logger(
     "data_extraction.get_wikipedia_extracts",
     Path(__file__).parent.parent.absolute() / "logs" / GET_WIKIPEDIA_EXTRACS_LOG_FILENAME,
@@ -33,94 +45,97 @@ logger = setup_logger(
 lang_keys = [item[0] for item in language_config_to_list()]
 
 
-def get_wikipedia_page_ids(
-    items: List[Dict],
-    indices: List[int],
+def query_wikipedia_pages(
+    titles: List[str],
     langkey: str,
+    parameters: Dict,
     timeout: Optional[int] = TIMEOUT,
     sleep_time: Optional[int] = SLEEP_TIME,
     maxlag: Optional[int] = MAX_LAG,
-) -> Dict:
-    """Function to get the wikipedia page ids from their label referenced in the sitelinks
+) -> Dict[str, Dict]:
+    """Sends a query for titles to a wikipedia and returns the page of every title
 
     https://en.wikipedia.org/w/api.php?action=help&modules=query
-    sitelink de: Mona_Lisa is resolved to
+
+    The API resolves the titles to pages and follows redirects. The normalized and redirects tables of the response
+    map the pages back to the requested titles. Continued responses (e. g. excontinue) are requested until the
+    query is complete and their page properties are merged.
 
     Args:
-        items: List of items
-        indices: A list of indices which contain a sitelink
+        titles: Titles of the sitelinks e. g. 'Mona_Lisa'
         langkey: A specific language key e. g. 'en'
+        parameters: Query parameters e. g. the prop
         timeout: Timeout on the request. Defaults to TIMEOUT.
         sleep_time: Waiting time if there are serverside problems. Defaults to SLEEP_TIME.
         maxlag: Maxlag for the wikidata server see https://www.mediawiki.org/wiki/Manual:Maxlag_parameter.
             Defaults to MAX_LAG
 
     Returns:
-        A dictionary which maps the wikipedia page id (which is not a qid like in wikidata)
-            to an index in the items dictionary
-
-    Source:
-        https://stackoverflow.com/questions/52787504/how-to-get-page-id-from-wikipedia-page-title
+        A dictionary which maps the titles to their page, missing pages contain the key 'missing'
     """
-    title_indice_dictionary = {}
-    wikipedia_url = f"https://{langkey}.wikipedia.org/wiki/"
-    for index in indices:
-        title_indice_dictionary.update({items[index][f"{WIKIPEDIA_LINK}_{langkey}"].replace(wikipedia_url, ""): index})
-
     parameters = {
         "action": "query",
         "format": JSON,
-        "prop": "info",
-        "titles": "|".join(title_indice_dictionary.keys()),
+        "redirects": True,
+        "titles": "|".join(titles),
         # if the server needs more than maxlag seconds to answer
         # the query an error response is returned
         "maxlag": maxlag,
+        **parameters,
     }
 
     url = f"https://{langkey}.wikipedia.org/w/api.php"
-    response = send_http_request(
-        parameters,
-        HTTP_HEADER,
-        url,
-        logger,
-        items=title_indice_dictionary.keys(),
-        timeout=TIMEOUT,
-        sleep_time=SLEEP_TIME,
-        maxlag=MAX_LAG,
-    )
-
-    page_normalized_titles = {x: x for x in title_indice_dictionary.keys()}
-
-    # map index of json array to page id of wikipedia
-    item_page_id_index_dictionary = {}
-    if "normalized" in response["query"]:
-        for mapping in response["query"]["normalized"]:
-            page_normalized_titles[mapping["to"]] = mapping["from"]
-
-    for page_id, page_info in response["query"]["pages"].items():
-        normalized_title = page_info["title"]
-        page_title = page_normalized_titles[normalized_title]
-        index = title_indice_dictionary[page_title]
-        item_page_id_index_dictionary[page_id] = index
-
-    return item_page_id_index_dictionary
+    resolved_titles = {}
+    pages = {}
+    while True:
+        response = send_http_request(
+            parameters,
+            HTTP_HEADER,
+            url,
+            logger,
+            items=titles,
+            timeout=timeout,
+            sleep_time=sleep_time,
+            maxlag=maxlag,
+        )
+        query = response["query"]
+        for mapping in query.get("normalized", []) + query.get("redirects", []):
+            resolved_titles[mapping["from"]] = mapping["to"]
+        for page in query["pages"].values():
+            pages.setdefault(page["title"], {}).update(page)
+        if "continue" not in response:
+            break
+        parameters.update(response["continue"])
+
+    title_pages = {}
+    for title in titles:
+        # Follow the normalization (e. g. '_' to ' ') and the redirects to the title of the page
+        page_title = title
+        for _ in range(len(resolved_titles)):
+            if page_title not in resolved_titles:
+                break
+            page_title = resolved_titles[page_title]
+        title_pages[title] = pages[page_title]
+    return title_pages
 
 
 def get_wikipedia_extracts(
     items: List[Dict],
-    page_id_index_dictionary: Dict,
+    indices: List[int],
     langkey: str,
     timeout: Optional[int] = TIMEOUT,
     sleep_time: Optional[int] = SLEEP_TIME,
     maxlag: Optional[int] = MAX_LAG,
-):
-    """Get the wikipedia extracts (in our data model they're called abstracts)
+) -> Dict[int, str]:
+    """Get the wikipedia extracts (in our data model they're called abstracts) by the titles of the sitelinks
 
-    https://en.wikipedia.org/w/api.php?action=help&modules=query
+    The extracts are requested for the titles directly with one request per chunk, see query_wikipedia_pages.
+    With the extract cache, extracts are served from the cache within their time to live. Expired extracts are
+    checked with a prop=info request for their revision, only the extracts of changed pages are downloaded again.
 
     Args:
         items: List of entities
-        page_id_index_dictionary: Dictionary to resolve the page ids from the indices in the items list
+        indices: A list of indices which contain a sitelink
         langkey: A specific language key e. g. 'en'
         timeout: Timeout on the request. Defaults to TIMEOUT.
         sleep_time: Waiting time if there are serverside problems. Defaults to SLEEP_TIME.
@@ -131,169 +146,236 @@ def get_wikipedia_extracts(
         A dictionary with index and abstract which is added to the entity of the index later
 
     Source:
-            https://en.wikipedia.org/w/api.php?format=json&action=query&prop=extracts&exintro&explaintext&pageids=70889|1115370
+            https://en.wikipedia.org/w/api.php?format=json&action=query&prop=extracts&exintro&explaintext&redirects&titles=Mona_Lisa|The_Night_Watch
     """
-    parameters = {
-        "action": "query",
-        "format": JSON,
-        "prop": "extracts",
-        "exintro": True,
-        "explaintext": True,
-        "pageids": "|".join(page_id_index_dictionary.keys()),
-        # if the server needs more than maxlag seconds to answer
-        # the query an error response is returned
-        "maxlag": maxlag,
-    }
-
-    # Send HTTP-Request
-    url = f"https://{langkey}.wikipedia.org/w/api.php"
-    response = send_http_request(
-        parameters,
-        HTTP_HEADER,
-        url,
-        logger,
-        items=page_id_index_dictionary.keys(),
-        abstracts=True,
-        timeout=TIMEOUT,
-        sleep_time=SLEEP_TIME,
-        maxlag=MAX_LAG,
-    )
+    # Several items can link the same page
+    title_indices_dictionary = {}
+    wikipedia_url = f"https://{langkey}.wikipedia.org/wiki/"
+    for index in indices:
+        title = items[index][f"{WIKIPEDIA_LINK}_{langkey}"].replace(wikipedia_url, "")
+        title_indices_dictionary.setdefault(title, []).append(index)
+
+    pages = {}
+    if USE_EXTRACT_CACHE:
+        cache = get_extract_cache()
+        key_titles = {ExtractCache.extract_key(langkey, title): title for title in title_indices_dictionary}
+        cached = {key: value for key, (value, _revision) in cache.get_many(list(key_titles)).items()}
+        expired = cache.get_expired([key for key in key_titles if key not in cached])
+        if expired:
+            revisions = query_wikipedia_pages(
+                [key_titles[key] for key in expired], langkey, {"prop": "info"}, timeout, sleep_time, maxlag
+            )
+            revalidated = {
+                key: value
+                for key, (value, revision) in expired.items()
+                if revisions[key_titles[key]].get(LASTREVID) == revision
+            }
+            cache.revalidate(revalidated)
+            cached.update(revalidated)
+        pages = {key_titles[key]: json.loads(value) for key, value in cached.items()}
+
+    titles_to_fetch = [title for title in title_indices_dictionary if title not in pages]
+    if titles_to_fetch:
+        # The API returns at most 20 intro extracts per response, the remaining extracts
+        # of the pages are requested with the excontinue offset of the previous response
+        # Further information https://stackoverflow.com/questions/9846795/prop-extracts-not-returning-all-extracts-in-the-wikimedia-api
+        parameters = {"prop": "extracts|info", "exintro": True, "explaintext": True, "exlimit": "max"}
+        fetched = {
+            title: {field: page[field] for field in EXTRACT_PAGE_FIELDS if field in page}
+            for title, page in query_wikipedia_pages(
+                titles_to_fetch, langkey, parameters, timeout, sleep_time, maxlag
+            ).items()
+        }
+        pages.update(fetched)
+        if USE_EXTRACT_CACHE:
+            cache.put_many(
+                (
+                    ExtractCache.extract_key(langkey, title),
+                    json.dumps(page, ensure_ascii=False, separators=(",", ":")),
+                    page.get(LASTREVID),
+                )
+                for title, page in fetched.items()
+                if "extract" in page or "missing" in page
+            )
 
     index_extract_dictionary = {}
-    for page_id, index in page_id_index_dictionary.items():
-        if int(page_id) < 0:
-            print(
-                "For the wikidata item {0} there was no pageid found on the {1}.wikipedia site."
-                " Therefore the extract is set to an empty string now".format(items[index]["id"], langkey)
-            )
-            # Return empty extract for those cases
-            index_extract_dictionary[index] = ""
-            continue
-        index_extract_dictionary[index] = response["query"]["pages"][page_id]["extract"]
+    for title, title_indices in title_indices_dictionary.items():
+        page = pages[title]
+        for index in title_indices:
+            if "missing" in page or "invalid" in page:
+                print(
+                    "For the wikidata item {0} there was no page found on the {1}.wikipedia site."
+                    " Therefore the extract is set to an empty string now".format(items[index]["id"], langkey)
+                )
+                # Return empty extract for those cases
+                index_extract_dictionary[index] = ""
+            else:
+                index_extract_dictionary[index] = page["extract"]
     return index_extract_dictionary
 
 
+def get_wikipedia_abstracts(items: List[Dict], indices: List[int], langkey: str) -> Dict[int, str]:
+    """Get the abstracts of a chunk of items, a failed chunk is split in halves which are retried
+
+    Only the failed chunk is retried, so one broken title doesn't restart the whole language.
+
+    Args:
+        items: List of entities
+        indices: Indices of the items which have a wikipedia link in the language
+        langkey: A specific language key e. g. 'en'
+
+    Raises:
+        Exception: If the abstract of a single item can't be fetched
+
+    Returns:
+        A dictionary with index and abstract
+    """
+    try:
+        return get_wikipedia_extracts(items, indices, langkey)
+    except Exception as error:
+        if len(indices) == 1:
+            logger.exception(error)
+            raise error
+        logger.error(f"Fetching wikipedia extracts for lang:{langkey} and chunk size:{len(indices)} failed!")
+        logger.error(error)
+        middle = len(indices) // 2
+        logger.info(f"Trying the wikipedia extracts again with chunk sizes:{middle} and {len(indices) - middle}")
+        return {
+            **get_wikipedia_abstracts(items, indices[:middle], langkey),
+            **get_wikipedia_abstracts(items, indices[middle:], langkey),
+        }
+
+
+def add_wikipedia_extracts_of_language(
+    items: List[Dict], indices: List[int], langkey: str, journal: ChunkJournal, lock: threading.Lock
+) -> None:
+    """Adds the abstracts of one language to the items
+
+    The chunks are requested concurrently, the rate controller of the wikipedia host limits the requests in flight.
+    Several languages can run at the same time, the items and the journal are only changed with the lock held.
+
+    Args:
+        items: List of entities
+        indices: Indices of the items which need an abstract in the language
+        langkey: A specific language key e. g. 'en'
+        journal: Journal of the file, every finished chunk is committed
+        lock: Lock of the items and the journal
+    """
+    abstract_field = f"{ABSTRACT}_{langkey}"
+    extracted_count = 0
+    for chunk, abstracts in concurrent_map(
+        lambda chunk: get_wikipedia_abstracts(items, chunk, langkey), chunks(indices, WIKIPEDIA_TITLES_PER_REQUEST)
+    ):
+        with lock:
+            # add extracted abstracts to json objects
+            for i in chunk:
+                items[i][abstract_field] = abstracts[i]
+            journal.commit(
+                f"{langkey}:{chunk[0]}-{chunk[-1]}",
+                {"langkey": langkey, "abstracts": {i: abstracts[i] for i in chunk}},
+            )
+        extracted_count += len(chunk)
+        print(f"Extracts for language {langkey} status: {extracted_count}/{len(indices)}", end="\r", flush=True)
+    print(datetime.datetime.now(), f"Finished the {langkey}.wikipedia extracts")
+
+
 # ruff: noqa: C901
 def add_wikipedia_extracts(
     language_keys: Optional[List[str]] = lang_keys,
 ) -> None:
-    """Add the wikipedia extracts to the already existing files
+    """Add the wikipedia extracts to the entities in the entity store
+
+    Only the wikipedia links are read and only the abstracts are written back, see shared/entity_store.py
 
     Args:
         language_keys: Language keys to extract wikipedia abstracts for. Defaults to languageconfig.csv
     """
-    for filename in [
-        ARTWORK[PLURAL],
-        MOTIF[PLURAL],
-        GENRE[PLURAL],
-        MATERIAL[PLURAL],
-        MOVEMENT[PLURAL],
-        ARTIST[PLURAL],
-        LOCATION[PLURAL],
-        CLASS[PLURAL],
-    ]:
-        print(
-            datetime.datetime.now(),
-            "Starting extracting wikipedia extracts with",
-            filename,
-        )
-        try:
-            with open((create_new_path(filename)).with_suffix(f".{JSON}"), encoding="utf-8") as file:
-                if RECOVER_MODE and check_state(ETL_STATES.GET_WIKIPEDIA_EXTRACTS.EXTRACT_ABSTRACTS + filename):
-                    continue
-                items = json.load(file)
-                for key in language_keys:
-                    item_indices_with_wiki_link_for_lang = [
-                        items.index(item) for item in items if item[f"{WIKIPEDIA_LINK}_{key}"] != ""
-                    ]
-                    print(
-                        f"There are {len(item_indices_with_wiki_link_for_lang)} {key}.wikipedia links "
-                        f"within the {len(items)} {filename} items"
-                    )
-
-                    # retry operation until its done
-                    done = False
-                    # ToDo: The limit for extracts seems to be 20, there is an excontinue parameter which
-                    # could be used to increase the performance and load more at once (50 is allowed by the API)
-                    # The request method has to be adjusted for this
-                    # Further information https://stackoverflow.com/questions/9846795/prop-extracts-not-returning-all-extracts-in-the-wikimedia-api
-                    chunk_size = 20
-
-                    while not done:
-                        try:
-                            item_indices_chunks = chunks(item_indices_with_wiki_link_for_lang, chunk_size)
-                            extracted_count = 0
+    link_fields = [f"{WIKIPEDIA_LINK}_{key}" for key in language_keys]
+    abstract_fields = [f"{ABSTRACT}_{key}" for key in language_keys]
+    with EntityStore() as store:
+        for filename in [
+            ARTWORK[PLURAL],
+            MOTIF[PLURAL],
+            GENRE[PLURAL],
+            MATERIAL[PLURAL],
+            MOVEMENT[PLURAL],
+            ARTIST[PLURAL],
+            LOCATION[PLURAL],
+            CLASS[PLURAL],
+        ]:
+            print(
+                datetime.datetime.now(),
+                "Starting extracting wikipedia extracts with",
+                filename,
+            )
+            unit = ETL_STATES.GET_WIKIPEDIA_EXTRACTS.EXTRACT_ABSTRACTS + filename
+            if RECOVER_MODE and check_state(unit):
+                continue
+            try:
+                items = list(store.read(filename, link_fields))
+                # The abstracts of every finished chunk are recorded, after a crash they are replayed
+                journal = ChunkJournal(unit, resume=RECOVER_MODE)
+                replayed_indices = {}
+                for chunk_data in journal.chunks.values():
+                    for index, abstract in chunk_data["abstracts"].items():
+                        items[int(index)][f"{ABSTRACT}_{chunk_data['langkey']}"] = abstract
+                        replayed_indices.setdefault(chunk_data["langkey"], set()).add(int(index))
+                # One pass over the items collects the indices to extract for all languages
+                indices_to_extract = {key: [] for key in language_keys}
+                link_count = 0
+                for index, item in enumerate(items):
+                    for key in language_keys:
+                        if item[f"{WIKIPEDIA_LINK}_{key}"] == "":
                             # Fill json objects without wikilink to an abstract with empty key-value pairs
                             # (could be removed if frontend is adjusted)
-                            for j in range(len(items)):
-                                if j not in item_indices_with_wiki_link_for_lang:
-                                    items[j][f"{ABSTRACT}_{key}"] = ""
-
-                            for chunk in item_indices_chunks:
-                                # Get PageIds from URL https://en.wikipedia.org/w/api.php?action=query&titles=Jean_Wauquelin_presenting_his_'Chroniques_de_Hainaut'_to_Philip_the_Good
-                                page_id_indices_dictionary = get_wikipedia_page_ids(items, chunk, key)
-                                # Get Extracts from PageId https://en.wikipedia.org/w/api.php?format=json&action=query&prop=extracts&exintro&explaintext&pageids=70889|1115370
-                                raw_response = get_wikipedia_extracts(items, page_id_indices_dictionary, key)
-                                # add extracted abstracts to json objects
-                                for i in chunk:
-                                    items[i][f"{ABSTRACT}_{key}"] = raw_response[i]
-
-                                extracted_count += len(chunk)
-                                print(
-                                    f"Extracts for {filename} and language {key} "
-                                    f"status: {extracted_count}/{len(item_indices_with_wiki_link_for_lang)}",
-                                    end="\r",
-                                    flush=True,
-                                )
-
-                                # If a chunk is finished and the chunk size is < 20 (e.g. the previous
-                                # chunk failed but the current one succeeded): increase the chunk size
-                                chunk_size = chunk_size + 5 if chunk_size < 20 else chunk_size
-
-                            # set done to true after all items have been processed
-                            done = True
-                        except Exception as error:
-                            logger.error(
-                                f"Fetching wikipedia extracts for {filename}, lang:{key} and "
-                                f"chunk size:{chunk_size} failed!"
-                            )
-                            logger.error(error)
-
-                            # lower chunk size and try again in while loop
-                            chunk_size -= 5
-                            if chunk_size > 0:
-                                logger.info(f"Trying the wikipedia extracts again with chunk size:{chunk_size}")
-                                continue
-                            else:
-                                logger.exception(error)
-                                raise error
-
-            # overwrite file
-            with open(
-                (create_new_path(filename)).with_suffix(f".{JSON}"),
-                "w",
-                newline="",
-                encoding="utf-8",
-            ) as file:
-                json.dump(items, file, ensure_ascii=False)
-            write_state(ETL_STATES.GET_WIKIPEDIA_EXTRACTS.EXTRACT_ABSTRACTS + filename)
-
-        except Exception as error:
-            print(f"Error when opening following file: {filename}. Error: {error}. Skipping file now.")
-            continue
-        print(
-            datetime.datetime.now(),
-            "Finished extracting wikipedia extracts with",
-            filename,
-        )
+                            item[f"{ABSTRACT}_{key}"] = ""
+                            continue
+                        link_count += 1
+                        # Continue after the finished chunks of an interrupted run
+                        if index not in replayed_indices.get(key, ()):
+                            indices_to_extract[key].append(index)
+                print(f"There are {link_count} wikipedia links within the {len(items)} {filename} items")
+
+                # Every language is requested from its own host, so the languages are extracted concurrently.
+                # Each host is paced by its own rate controller
+                lock = threading.Lock()
+                with ThreadPoolExecutor(max_workers=max(len(language_keys), 1)) as executor:
+                    futures = [
+                        executor.submit(
+                            add_wikipedia_extracts_of_language, items, indices_to_extract[key], key, journal, lock
+                        )
+                        for key in language_keys
+                    ]
+                    for future in futures:
+                        future.result()
+
+                # write only the abstracts back
+                store.update(filename, abstract_fields, items)
+                write_state(unit)
+                journal.finish()
+
+            except Exception as error:
+                print(f"Error when opening following file: {filename}. Error: {error}. Skipping file now.")
+                continue
+            print(
+                datetime.datetime.now(),
+                "Finished extracting wikipedia extracts with",
+                filename,
+            )
 
 
 if __name__ == "__main__":
     if len(sys.argv) > 1 and "-r" in sys.argv:
         RECOVER_MODE = True
+    if "--no-cache" in sys.argv:
+        USE_EXTRACT_CACHE = False
 
     if RECOVER_MODE and check_state(ETL_STATES.GET_WIKIPEDIA_EXTRACTS.STATE):
         exit(0)
     logger.info("Extracting Wikipedia Abstracts")
     add_wikipedia_extracts()
+    log_session_stats(logger)
+    log_rate_controller_stats(logger)
+    if USE_EXTRACT_CACHE:
+        logger.info(f"Extract cache stats: {get_extract_cache().stats()}")
     write_state(ETL_STATES.GET_WIKIPEDIA_EXTRACTS.STATE)
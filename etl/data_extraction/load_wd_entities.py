@@ -4,19 +4,22 @@
 import datetime
 import re
 import time
-from json import JSONDecodeError
+from itertools import islice
 from pathlib import Path
-from typing import Callable, Dict, Iterator, List, Optional, Set
-from urllib.error import HTTPError
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-from SPARQLWrapper import SPARQLWrapper
+import requests
 
 from data_extraction import map_wd_attribute, map_wd_response
 from data_extraction.constants import *
-from data_extraction.request_utils import send_http_request
+from data_extraction.rate_controller import get_rate_controller, parse_retry_after
+from data_extraction.request_utils import concurrent_map, get_session, send_http_request
+from data_extraction.response_cache import get_entity_cache, merge_cached_entities
 from shared.blocklist import BLOCKLIST
+from shared.chunk_journal import ChunkJournal, chunk_id
 from shared.utils import (
     chunks,
+    iter_ndjson,
     language_config_to_list,
     setup_logger,
 )
@@ -28,57 +31,152 @@ logger = setup_logger(
 
 lang_keys = [item[0] for item in language_config_to_list()]
 
+# Serve entities from the on-disk entity cache and only request the missing ones
+USE_ENTITY_CACHE = True
 
-def query_artwork_qids(type_name: str, wikidata_id: str) -> List[str]:
-    """Extracts all artwork QIDs from the wikidata SPARQL endpoint https://query.wikidata.org/
+# Check the revisions of cached entities before they are served, set in the incremental mode.
+# Entity requests which are given the revisions of their qids e. g. the artworks don't check them again
+REVALIDATE_CACHED_ENTITIES = False
 
-    Args:
-        type_name: type name to extract from, only relevant for console output
-        wikidata_id: wikidata qid related to the given type name
+# Serve entities and artwork qids from a wikidata dump instead of the APIs, see wd_dump.load_dump_store
+DUMP_STORE = None
 
-    Returns:
-        A list of all qids of the provided wikidata_id
+# Props of the entity requests for the exhibitions in the exhibition history of artworks
+EXHIBITION_PROPS = [CLAIMS, DESCRIPTION[PLURAL], LABEL[PLURAL]]
 
-    Examples:
-        query_artwork_qids(DRAWING[PLURAL], DRAWING[ID])
-    """
-    artwork_ids_filepath = Path(__file__).parent.absolute() / ARTWORK_IDS_QUERY_FILENAME
-    QID_BY_ARTWORK_TYPE_QUERY = open(artwork_ids_filepath, "r", encoding="utf8").read().replace("$QID", wikidata_id)
 
-    sparql = SPARQLWrapper(WIKIDATA_SPARQL_URL, agent=AGENT_HEADER)
+def query_sparql_entity_ids(query: str) -> List[str]:
+    """Sends a SPARQL query with one entity column to the wikidata query service and parses the result row by row
 
-    sparql.setQuery(QID_BY_ARTWORK_TYPE_QUERY)
-    sparql.setReturnFormat(JSON)
+    The result is requested as TSV and streamed, so the response is never held in memory as a whole
+    like a SPARQL JSON result. The query service is paced by its own rate controller and a failed query
+    is sent again until it succeeds.
 
-    # ToDo: refactor would be better without while True
+    Args:
+        query: SPARQL query which selects one entity column
+
+    Returns:
+        The qids of the result rows
+    """
+    controller = get_rate_controller(WIKIDATA_SPARQL_URL, latency_target=SPARQL_LATENCY_TARGET)
     while True:
+        controller.acquire()
+        start = time.monotonic()
         try:
-            query_result = sparql.query().convert()
-            break
-        except HTTPError as error:
+            # The query service shares the pooled session with the wikidata and wikipedia API requests
+            with get_session().get(
+                WIKIDATA_SPARQL_URL,
+                params={"query": query},
+                headers={"User-Agent": AGENT_HEADER, "Accept": "text/tab-separated-values"},
+                timeout=SPARQL_TIMEOUT,
+                stream=True,
+            ) as response:
+                response.raise_for_status()
+                response.encoding = "utf-8"
+                rows = response.iter_lines(decode_unicode=True)
+                next(rows, None)  # Header with the variable name
+                entity_ids = []
+                for row in rows:
+                    if not row:
+                        continue
+                    # A row looks like <http://www.wikidata.org/entity/Q12418>, anything else
+                    # e. g. a timeout message within a truncated result is an error
+                    value = row.split("\t", 1)[0].strip("<>")
+                    if not value.startswith(WIKIDATA_ENTITY_URL):
+                        raise ValueError(f"Unexpected row in the SPARQL result: {row[:200]}")
+                    entity_ids.append(value[len(WIKIDATA_ENTITY_URL) :])
+            controller.on_success(time.monotonic() - start)
+            return entity_ids
+        except requests.HTTPError as error:
             print(error)
-            print("Waiting for 5 seconds")
-            time.sleep(5)
-            if error.errno != 403:
-                continue
-            else:
+            if error.response.status_code == 403:
                 print("Looks like the bot was blocked.")
                 exit(-1)
-        except JSONDecodeError as error:
+            controller.back_off(
+                f"HTTP {error.response.status_code}", parse_retry_after(error.response.headers.get("Retry-After"))
+            )
+        except (
+            ValueError,
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        ) as error:
             print(error)
-            print("Waiting for 5 seconds")
-            time.sleep(5)
-            continue
+            controller.back_off(type(error).__name__)
+        finally:
+            controller.release()
 
-    artwork_ids = list(
-        map(
-            lambda result: result["item"][VALUE].replace(WIKIDATA_ENTITY_URL, ""),
-            query_result["results"]["bindings"],
-        )
-    )
-    print(f"{type_name}: {len(artwork_ids)} ids from SPARQL query")
 
-    return artwork_ids
+def query_artwork_qids_of_types(source_types: List[Dict]) -> Dict[str, List[str]]:
+    """Extracts the artwork QIDs of several artwork types from the wikidata SPARQL endpoint https://query.wikidata.org/
+
+    Querying all instances of all subclasses of a type at once exceeds the 60 seconds limit of the query service
+    for big types. So the subclasses of every type are queried first and the artworks are queried in shards:
+    the class of the type itself and batches of SPARQL_SHARD_SIZE subclasses. A class which is a subclass of
+    several types is only queried once. The shards of all types are queried concurrently.
+
+    If a dump store is active the qids are selected from the dump instead.
+
+    Args:
+        source_types: Artwork types e. g. SOURCE_TYPES, the ids have the SPARQL prefix wd:
+
+    Returns:
+        A dict of the type names (plural) and the distinct qids of their artworks
+    """
+    if DUMP_STORE is not None:
+        # The ids of the SOURCE_TYPES are prefixed for the SPARQL query e. g. wd:Q3305213
+        artwork_ids_by_type = {}
+        for source_type in source_types:
+            artwork_ids = DUMP_STORE.instances_of_subclasses(source_type[ID].replace("wd:", ""))
+            print(f"{source_type[PLURAL]}: {len(artwork_ids)} ids from the wikidata dump")
+            artwork_ids_by_type[source_type[PLURAL]] = artwork_ids
+        return artwork_ids_by_type
+
+    query_directory = Path(__file__).parent.absolute()
+    classes_query = open(query_directory / ARTWORK_CLASSES_QUERY_FILENAME, "r", encoding="utf8").read()
+    artwork_ids_query = open(query_directory / ARTWORK_IDS_QUERY_FILENAME, "r", encoding="utf8").read()
+
+    # Shards of classes and the types they belong to
+    type_names_by_shard = {}
+    for source_type, class_ids in concurrent_map(
+        lambda source_type: query_sparql_entity_ids(classes_query.replace("$QID", source_type[ID])),
+        source_types,
+    ):
+        type_class = source_type[ID].replace("wd:", "")
+        subclasses = sorted(set(class_ids) - {type_class})
+        for shard in [(type_class,), *map(tuple, chunks(subclasses, SPARQL_SHARD_SIZE))]:
+            type_names_by_shard.setdefault(shard, []).append(source_type[PLURAL])
+
+    # Dicts keep the order of the first occurrence and are used as ordered sets
+    artwork_ids_by_type = {source_type[PLURAL]: {} for source_type in source_types}
+    for shard, artwork_ids in concurrent_map(
+        lambda shard: query_sparql_entity_ids(
+            artwork_ids_query.replace("$CLASSES", " ".join(f"wd:{class_id}" for class_id in shard))
+        ),
+        list(type_names_by_shard),
+    ):
+        for type_name in type_names_by_shard[shard]:
+            artwork_ids_by_type[type_name].update(dict.fromkeys(artwork_ids))
+
+    for type_name, artwork_ids in artwork_ids_by_type.items():
+        print(f"{type_name}: {len(artwork_ids)} ids from SPARQL query")
+    return {type_name: list(artwork_ids) for type_name, artwork_ids in artwork_ids_by_type.items()}
+
+
+def query_artwork_qids(type_name: str, wikidata_id: str) -> List[str]:
+    """Extracts all artwork QIDs of one artwork type, see query_artwork_qids_of_types
+
+    Args:
+        type_name: type name to extract from, only relevant for console output
+        wikidata_id: wikidata qid related to the given type name
+
+    Returns:
+        A list of all qids of the provided wikidata_id
+
+    Examples:
+        query_artwork_qids(DRAWING[PLURAL], DRAWING[ID])
+    """
+    return query_artwork_qids_of_types([{PLURAL: type_name, ID: wikidata_id}])[type_name]
 
 
 def wikidata_entity_request(
@@ -88,11 +186,18 @@ def wikidata_entity_request(
     timeout: Optional[int] = TIMEOUT,
     sleep_time: Optional[int] = SLEEP_TIME,
     maxlag: Optional[int] = MAX_LAG,
+    use_cache: Optional[bool] = None,
+    revisions: Optional[Dict[str, int]] = None,
 ) -> Dict:
     """Represents an wikidata entity request for a list of qids
     The API specifies that 50 items can be loaded at once without needing additional permissions:
     https://www.wikidata.org/w/api.php?action=help&modules=wbgetentities
 
+    Entities found in the dump store or the on-disk entity cache are not requested again. Requested entities
+    are stored in the cache together with their revision (lastrevid). If REVALIDATE_CACHED_ENTITIES is set
+    and no revisions are given, the current revisions of the cached entities are requested first and
+    the changed entities are requested again.
+
     Args:
         qids: List of qids
         language_keys: All language keys which should be extracted. Defaults to languageconfig.csv
@@ -101,6 +206,8 @@ def wikidata_entity_request(
         sleep_time: Sleep time if errors occur. Defaults to SLEEP_TIME
         maxlag: Maxlag for the wikidata server see https://www.mediawiki.org/wiki/Manual:Maxlag_parameter.
             Defaults to MAX_LAG
+        use_cache: Use the entity cache. Defaults to USE_ENTITY_CACHE
+        revisions: Current revisions of the qids, cached entities with another revision are requested again
 
     Returns:
         Raw wikidata response for the requested entities
@@ -110,6 +217,45 @@ def wikidata_entity_request(
     """
     if props is None:
         props = [CLAIMS, DESCRIPTION[PLURAL], LABEL[PLURAL], SITELINKS]
+    if use_cache is None:
+        use_cache = USE_ENTITY_CACHE
+    requested_qids = qids
+    cached = {}
+    if DUMP_STORE is not None:
+        cached = DUMP_STORE.get_entities(qids, props, language_keys)
+        qids = [qid for qid in qids if qid not in cached]
+        if not qids:
+            return {ENTITIES: cached}
+    if use_cache:
+        # The info prop contains the lastrevid which is stored in the cache
+        props = props if INFO in props else [*props, INFO]
+        entity_cache = get_entity_cache()
+        cached_entities = entity_cache.get_entities(qids, props, language_keys, revisions)
+        if revisions is None and REVALIDATE_CACHED_ENTITIES and cached_entities:
+            # One info request for the whole chunk is much smaller than the entities
+            revision_response = wikidata_entity_request(
+                list(cached_entities),
+                language_keys,
+                props=[INFO],
+                timeout=timeout,
+                sleep_time=sleep_time,
+                maxlag=maxlag,
+                use_cache=False,
+            )
+            current_revisions = {
+                qid: entity[LASTREVID]
+                for qid, entity in revision_response.get(ENTITIES, {}).items()
+                if LASTREVID in entity
+            }
+            cached_entities = {
+                qid: entity
+                for qid, entity in cached_entities.items()
+                if qid in current_revisions and entity.get(LASTREVID) == current_revisions[qid]
+            }
+        cached.update(cached_entities)
+        qids = [qid for qid in qids if qid not in cached]
+        if not qids:
+            return {ENTITIES: cached}
     initial_timeout = timeout
     langkeyPlusWikiList = [key + "wiki" for key in language_keys]
     parameters = {
@@ -126,17 +272,202 @@ def wikidata_entity_request(
     }
 
     url = WIKIDATA_API_URL
-    return send_http_request(
-        parameters,
-        HTTP_HEADER,
-        url,
-        logger,
-        initial_timeout=initial_timeout,
-        items=qids,
-        timeout=timeout,
-        sleep_time=sleep_time,
-        maxlag=maxlag,
-    )
+    try:
+        response = send_http_request(
+            parameters,
+            HTTP_HEADER,
+            url,
+            logger,
+            initial_timeout=initial_timeout,
+            items=qids,
+            timeout=timeout,
+            sleep_time=sleep_time,
+            maxlag=maxlag,
+        )
+    except requests.HTTPError:
+        # A client error e. g. an invalid qid, the callers skip the chunk without entities
+        return {}
+    if not use_cache:
+        return merge_cached_entities(requested_qids, cached, response)
+    if ENTITIES in response:
+        entity_cache.put_entities(response[ENTITIES].values(), props, language_keys)
+    return merge_cached_entities(requested_qids, cached, response)
+
+
+def wikidata_entity_requests(
+    qid_chunks: Iterable[List[str]],
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    **kwargs,
+) -> Iterator[Tuple[List[str], Dict]]:
+    """Sends the wikidata entity requests for several chunks of qids concurrently
+
+    Up to max_workers requests are in flight at the same time, the responses are yielded
+    in the order of the chunks. All keyword arguments are passed to wikidata_entity_request,
+    so the maxlag parameter is sent with every single request.
+
+    Args:
+        qid_chunks: Chunks of qids, each chunk may contain up to 50 qids
+        max_workers: Number of requests in flight. Defaults to MAX_CONCURRENT_REQUESTS
+
+    Yields:
+        Tuples of the chunk and the raw wikidata response for the chunk
+
+    Examples:
+        for chunk, query_result in wikidata_entity_requests(chunks(qids, 50), props=[LABEL[PLURAL]]):
+    """
+    yield from concurrent_map(lambda chunk: wikidata_entity_request(chunk, **kwargs), qid_chunks, max_workers)
+
+
+def prefetched_or_requested_entities(
+    qids: Iterable[str],
+    entities: Optional[Dict[str, Dict]] = None,
+    **kwargs,
+) -> Iterator[Tuple[List[str], Dict]]:
+    """Yields the entities of the qids in chunks like wikidata_entity_requests
+
+    If the entities were already fetched e. g. by the QidResolutionScheduler they are taken from
+    the given dict, otherwise they are requested from wikidata with the keyword arguments.
+
+    Args:
+        qids: Qids of the entities
+        entities: Already fetched raw wikidata entities by qid. Defaults to None.
+
+    Yields:
+        Tuples of the chunk and a wikidata response containing the entities of the chunk
+    """
+    chunk_size = 50  # The chunksize 50 is allowed by the wikidata api, bigger numbers need special permissions
+    id_chunks = chunks(list(qids), chunk_size)
+    if entities is None:
+        yield from wikidata_entity_requests(id_chunks, **kwargs)
+        return
+    for chunk in id_chunks:
+        yield chunk, {ENTITIES: {qid: entities[qid] for qid in chunk if qid in entities}}
+
+
+def get_entity_revisions(qids: List[str]) -> Dict[str, int]:
+    """Requests the current revisions (lastrevid) of entities
+
+    This is a lightweight wbgetentities request with props=info,
+    it doesn't contain labels, claims etc. and is never served from the entity cache.
+
+    Args:
+        qids: List of qids
+
+    Returns:
+        A dict of the qids and their current revision, missing entities are not contained
+    """
+    print(datetime.datetime.now(), f"Starting with the revisions of {len(qids)} entities")
+    revisions = {}
+    chunk_size = 50  # The chunksize 50 is allowed by the wikidata api, bigger numbers need special permissions
+    for _chunk, query_result in wikidata_entity_requests(chunks(qids, chunk_size), props=[INFO], use_cache=False):
+        if ENTITIES not in query_result:
+            logger.error("Skipping chunk")
+            continue
+        for result in query_result[ENTITIES].values():
+            if LASTREVID in result:
+                revisions[result[ID]] = result[LASTREVID]
+    print(datetime.datetime.now(), "Finished with the revisions")
+    return revisions
+
+
+# Fields of an oab artwork which are mapped from the claims of the wikidata entity.
+# Tuples of the field, the property name and the kind of the value, see map_wd_attribute.compile_claims_mapper
+ARTWORK_CLAIM_SPECS = [
+    (CLASS[PLURAL], CLASS[SINGULAR], map_wd_attribute.QID_LIST),
+    (ARTIST[PLURAL], ARTIST[SINGULAR], map_wd_attribute.QID_LIST),
+    (LOCATION[PLURAL], LOCATION[SINGULAR], map_wd_attribute.QID_LIST),
+    (GENRE[PLURAL], GENRE[SINGULAR], map_wd_attribute.QID_LIST),
+    (MOVEMENT[PLURAL], MOVEMENT[SINGULAR], map_wd_attribute.QID_LIST),
+    (MATERIAL[PLURAL], MATERIAL[SINGULAR], map_wd_attribute.QID_LIST),
+    (MOTIF[PLURAL], MOTIF[SINGULAR], map_wd_attribute.QID_LIST),
+    (MAIN_SUBJECT[PLURAL], MAIN_SUBJECT[SINGULAR], map_wd_attribute.QID_LIST),
+    (EXHIBITION_HISTORY, EXHIBITION_HISTORY, map_wd_attribute.QID_LIST),
+    (ICONCLASS[PLURAL], ICONCLASS[SINGULAR], map_wd_attribute.VALUE_LIST),
+    (INCEPTION, INCEPTION, map_wd_attribute.YEAR),
+    (COUNTRY, COUNTRY, map_wd_attribute.FIRST_QID),
+    (HEIGHT, HEIGHT, map_wd_attribute.DIMENSION_VALUE),
+    (HEIGHT_UNIT, HEIGHT, map_wd_attribute.DIMENSION_UNIT),
+    (WIDTH, WIDTH, map_wd_attribute.DIMENSION_VALUE),
+    (WIDTH_UNIT, WIDTH, map_wd_attribute.DIMENSION_UNIT),
+    (LENGTH, LENGTH, map_wd_attribute.DIMENSION_VALUE),
+    (LENGTH_UNIT, LENGTH, map_wd_attribute.DIMENSION_UNIT),
+    (DIAMETER, DIAMETER, map_wd_attribute.DIMENSION_VALUE),
+    (DIAMETER_UNIT, DIAMETER, map_wd_attribute.DIMENSION_UNIT),
+    (SIGNIFICANT_EVENT, SIGNIFICANT_EVENT, map_wd_attribute.SIGNIFICANT_EVENTS),
+]
+
+# The blocklisted qids are removed from the reference lists while mapping
+map_artwork_claims = map_wd_attribute.compile_claims_mapper(ARTWORK_CLAIM_SPECS, BLOCKLIST)
+
+
+def map_artwork(result: Dict, type_name: str, language_keys: Optional[List[str]] = lang_keys) -> Optional[Dict]:
+    """Maps a wikidata entity of an artwork to an oab artwork
+
+    Args:
+        result: Wikidata entity of the artwork
+        type_name: Type name of an artwork e. g. 'drawings'. Important for console output
+        language_keys: All language keys which should be extracted. Defaults to languageconfig.csv
+
+    Returns:
+        The artwork dict or None if the entity has no qid or image
+    """
+    try:
+        qid = result[ID]
+        image = map_wd_attribute.get_image_url_by_name(
+            result[CLAIMS][PROPERTY_NAME_TO_PROPERTY_ID[IMAGE]][0][MAINSNAK][DATAVALUE][VALUE]
+        )
+    except Exception as error:
+        logger.error("Error on qid or image, skipping item. Result set: {0}, Error: {1}".format(result, error))
+        return None
+
+    label = map_wd_attribute.try_get_label_or_description(result, LABEL[PLURAL], EN, type_name)
+    description = map_wd_attribute.try_get_label_or_description(result, DESCRIPTION[PLURAL], EN, type_name)
+    # The dimension units are qids which have to be resolved later
+    claims = map_artwork_claims(result, type_name)
+
+    artwork_dictionary = {
+        ID: qid,
+        CLASS[PLURAL]: claims[CLASS[PLURAL]],
+        LABEL[SINGULAR]: label,
+        DESCRIPTION[SINGULAR]: description,
+        IMAGE: image,
+        ARTIST[PLURAL]: claims[ARTIST[PLURAL]],
+        LOCATION[PLURAL]: claims[LOCATION[PLURAL]],
+        GENRE[PLURAL]: claims[GENRE[PLURAL]],
+        MOVEMENT[PLURAL]: claims[MOVEMENT[PLURAL]],
+        INCEPTION: claims[INCEPTION],
+        MATERIAL[PLURAL]: claims[MATERIAL[PLURAL]],
+        MOTIF[PLURAL]: claims[MOTIF[PLURAL]],
+        COUNTRY: claims[COUNTRY],
+        HEIGHT: claims[HEIGHT],
+        HEIGHT_UNIT: claims[HEIGHT_UNIT],
+        WIDTH: claims[WIDTH],
+        WIDTH_UNIT: claims[WIDTH_UNIT],
+        LENGTH: claims[LENGTH],
+        LENGTH_UNIT: claims[LENGTH_UNIT],
+        DIAMETER: claims[DIAMETER],
+        DIAMETER_UNIT: claims[DIAMETER_UNIT],
+        ICONCLASS[PLURAL]: claims[ICONCLASS[PLURAL]],
+        MAIN_SUBJECT[PLURAL]: claims[MAIN_SUBJECT[PLURAL]],
+        EXHIBITION_HISTORY: claims[EXHIBITION_HISTORY],
+        SIGNIFICANT_EVENT: claims[SIGNIFICANT_EVENT],
+        TYPE: ARTWORK[SINGULAR],
+    }
+
+    for langkey in language_keys:
+        label_lang = map_wd_attribute.try_get_label_or_description(result, LABEL[PLURAL], langkey, type_name)
+        description_lang = map_wd_attribute.try_get_label_or_description(
+            result, DESCRIPTION[PLURAL], langkey, type_name
+        )
+        wikipedia_link_lang = map_wd_attribute.try_get_wikipedia_link(result, langkey, type_name)
+        artwork_dictionary.update(
+            {
+                f"{LABEL[SINGULAR]}_{langkey}": label_lang,
+                f"{DESCRIPTION[SINGULAR]}_{langkey}": description_lang,
+                f"{WIKIPEDIA_LINK}_{langkey}": wikipedia_link_lang,
+            }
+        )
+    return artwork_dictionary
 
 
 def extract_artworks(
@@ -146,8 +477,22 @@ def extract_artworks(
     dev_mode: bool,
     dev_chunk_limit: int,
     language_keys: Optional[List[str]] = lang_keys,
-) -> List[Dict]:
-    """Extracts artworks metadata from Wikidata and stores them in a dictionary.
+    revisions: Optional[Dict[str, int]] = None,
+    previous_artworks_path: Optional[Path] = None,
+    journal: Optional[ChunkJournal] = None,
+    artwork_ids: Optional[List[str]] = None,
+) -> Iterator[List[Dict]]:
+    """Extracts artworks metadata from Wikidata and yields them chunk by chunk.
+
+    Only one chunk of mapped artworks is held in memory, the caller writes each chunk to the output files
+    before the next chunk is mapped.
+
+    In the incremental mode (previous_artworks_path is given) the current revisions of all artworks are requested
+    first. Only artworks which are new or whose revision changed since the previous run are requested and mapped,
+    the other artworks are streamed from the output of the previous run.
+
+    If a journal is given the chunks are built from the plan recorded in it (the queried qids and revisions),
+    so a resumed extraction continues at the first chunk which wasn't written before the crash.
 
     Args:
         type_name: Type name of an artwork e. g. 'drawings'. Important for console output
@@ -158,180 +503,136 @@ def extract_artworks(
         language_keys: All language keys which should be extracted. Defaults to languageconfig.csv
         dev_mode: To reduce the number of loaded chunks set this to true
         dev_chunk_limit: Limit of chunks per category
-    Returns:
-        A list with all artwork entity dicts (or JSON-objects) which are transformed for the OAB
+        revisions: Revisions of the artworks by qid. The revisions of the extracted artworks are added to the dict.
+        In the incremental mode it contains the revisions of the previous run, without them all artworks
+        are requested again. Defaults to None.
+        previous_artworks_path: NDJSON file with the artworks of this type of the previous run,
+        enables the incremental mode
+        journal: Journal of the unit. Every chunk is committed after the caller wrote it,
+        chunks which were committed before a crash are skipped. Defaults to None.
+        artwork_ids: Qids of the artworks of this type e. g. from query_artwork_qids_of_types.
+        If None they are queried. Defaults to None.
+    Yields:
+        Lists of artwork entity dicts (or JSON-objects) which are transformed for the OAB
 
     Examples:
-        extract_artworks('drawings', 'wd:Q93184', '('en', 'de'))
-        extract_artworks('sculptures', 'wd:Q860861', '('en', 'de'))
-        extract_artworks('paintings', 'wd:Q3305213', '('en', 'de'))
+        for artworks in extract_artworks('paintings', 'wd:Q3305213', set(), False, 0):
     """
     print(datetime.datetime.now(), "Starting with", type_name)
 
-    extract_dicts = []
-    chunk_count = 0
-    item_count = 0
-    artwork_ids = query_artwork_qids(type_name, wikidata_id)
+    chunk_size = 50  # The chunksize 50 is allowed by the wikidata api, bigger numbers need special permissions
 
-    # Don't load items again, if they were loaded in another artwork category
-    for artwork_id in artwork_ids:
-        if artwork_id in already_crawled_wikidata_items:
-            artwork_ids.remove(artwork_id)
+    def create_plan() -> Dict:
+        queried_artwork_ids = artwork_ids if artwork_ids is not None else query_artwork_qids(type_name, wikidata_id)
 
-    print(
-        f"{len(artwork_ids)} {type_name} entries are not loaded yet, starting now. "
-        f"Already crawled item count is {len(already_crawled_wikidata_items)}"
-    )
-    chunk_size = 50  # The chunksize 50 is allowed by the wikidata api, bigger numbers need special permissions
-    artwork_id_chunks = chunks(artwork_ids, chunk_size)
-    for chunk in artwork_id_chunks:
-        if dev_mode and chunk_count == dev_chunk_limit:
-            logger.info(f"DEV_CHUNK_LIMIT of {type_name} reached. End extraction for {type_name}")
-            break
+        # Don't load items again, if they were loaded in another artwork category
+        new_artwork_ids = [
+            artwork_id for artwork_id in queried_artwork_ids if artwork_id not in already_crawled_wikidata_items
+        ]
 
-        query_result = wikidata_entity_request(chunk)
+        print(
+            f"{len(new_artwork_ids)} {type_name} entries are not loaded yet, starting now. "
+            f"Already crawled item count is {len(already_crawled_wikidata_items)}"
+        )
+        current_revisions = None
+        unchanged_artwork_ids = []
+        if previous_artworks_path is not None:
+            current_revisions = get_entity_revisions(new_artwork_ids)
+            previous_revisions = revisions if revisions is not None else {}
+            unchanged_artwork_ids = [
+                artwork_id
+                for artwork_id in new_artwork_ids
+                if current_revisions.get(artwork_id) is not None
+                and previous_revisions.get(artwork_id) == current_revisions[artwork_id]
+            ]
+        return {"artwork_ids": new_artwork_ids, "unchanged": unchanged_artwork_ids, "revisions": current_revisions}
+
+    # The plan is recorded in the journal, so a resumed run builds the same chunks
+    plan = journal.load_or_create_plan(create_plan) if journal is not None else create_plan()
+    artwork_ids = plan["artwork_ids"]
+    current_revisions = plan["revisions"]
+
+    item_count = 0
+    if previous_artworks_path is not None:
+        unchanged_artwork_ids = set(plan["unchanged"])
+        copied_artwork_ids = set()
+        copied_artworks = []
+        copy_chunk_count = 0
+
+        def copy_chunk() -> Iterator[List[Dict]]:
+            nonlocal copy_chunk_count
+            copy_chunk_id = f"copy-{copy_chunk_count}"
+            copy_chunk_count += 1
+            already_crawled_wikidata_items.update(artwork[ID] for artwork in copied_artworks)
+            if journal is not None and journal.is_done(copy_chunk_id):
+                return
+            yield copied_artworks
+            if journal is not None:
+                journal.commit(copy_chunk_id)
+
+        for artwork in iter_ndjson(previous_artworks_path):
+            if artwork[ID] in unchanged_artwork_ids and artwork[ID] not in copied_artwork_ids:
+                copied_artworks.append(artwork)
+                copied_artwork_ids.add(artwork[ID])
+                if len(copied_artworks) == chunk_size:
+                    yield from copy_chunk()
+                    copied_artworks = []
+        if copied_artworks:
+            yield from copy_chunk()
+        # Unchanged artworks which aren't in the previous output are extracted again
+        artwork_ids = [artwork_id for artwork_id in artwork_ids if artwork_id not in copied_artwork_ids]
+        print(
+            f"{len(copied_artwork_ids)} {type_name} entries are unchanged since the previous run, "
+            f"{len(artwork_ids)} entries are new or changed"
+        )
+
+    artwork_id_chunks = chunks(artwork_ids, chunk_size)
+    if dev_mode:
+        # Limit the chunks before they're requested, otherwise requests for chunks after the limit would be in flight
+        logger.info(f"DEV_CHUNK_LIMIT of {type_name} is {dev_chunk_limit}. Only these chunks are extracted")
+        artwork_id_chunks = islice(artwork_id_chunks, dev_chunk_limit)
+    pending_chunks = []
+    for index, chunk in enumerate(artwork_id_chunks):
+        fetch_chunk_id = f"fetch-{index}"
+        if journal is not None and journal.is_done(fetch_chunk_id):
+            # The artworks of the chunk were written before the crash
+            chunk_revisions = journal.chunks[fetch_chunk_id]
+            already_crawled_wikidata_items.update(chunk)
+            if revisions is not None:
+                revisions.update(chunk_revisions)
+            item_count += len(chunk)
+        else:
+            pending_chunks.append((fetch_chunk_id, chunk))
+    if item_count:
+        print(f"{item_count} {type_name} entries were extracted before the crash, resuming")
+
+    # The info prop contains the revision of the entity
+    props = [CLAIMS, DESCRIPTION[PLURAL], LABEL[PLURAL], SITELINKS, INFO]
+    query_results = wikidata_entity_requests(
+        (chunk for _fetch_chunk_id, chunk in pending_chunks), props=props, revisions=current_revisions
+    )
+    for (fetch_chunk_id, _chunk), (chunk, query_result) in zip(pending_chunks, query_results, strict=True):
         if ENTITIES not in query_result:
+            # The chunk isn't committed, so it is requested again on resume
             logger.error("Skipping chunk")
             continue
 
+        extract_dicts = []
+        chunk_revisions = {}
         for result in query_result[ENTITIES].values():
-            try:
-                qid = result[ID]
-                image = map_wd_attribute.get_image_url_by_name(
-                    result[CLAIMS][PROPERTY_NAME_TO_PROPERTY_ID[IMAGE]][0][MAINSNAK][DATAVALUE][VALUE]
-                )
-            except Exception as error:
-                logger.error("Error on qid or image, skipping item. Result set: {0}, Error: {1}".format(result, error))
+            artwork_dictionary = map_artwork(result, type_name, language_keys)
+            if artwork_dictionary is None:
                 continue
-
-            label = map_wd_attribute.try_get_label_or_description(result, LABEL[PLURAL], EN, type_name)
-            description = map_wd_attribute.try_get_label_or_description(result, DESCRIPTION[PLURAL], EN, type_name)
-
-            (
-                classes,
-                artists,
-                locations,
-                genres,
-                movements,
-                materials,
-                motifs,
-                main_subjects,
-                exhibition_history,
-            ) = map_wd_attribute.get_attribute_values_with_try_get_func(
-                result,
-                [
-                    CLASS[SINGULAR],
-                    ARTIST[SINGULAR],
-                    LOCATION[SINGULAR],
-                    GENRE[SINGULAR],
-                    MOVEMENT[SINGULAR],
-                    MATERIAL[SINGULAR],
-                    MOTIF[SINGULAR],
-                    MAIN_SUBJECT[SINGULAR],
-                    EXHIBITION_HISTORY,
-                ],
-                type_name,
-                map_wd_attribute.try_get_qid_reference_list,
-            )
-
-            iconclasses = map_wd_attribute.try_get_value_list(
-                result, PROPERTY_NAME_TO_PROPERTY_ID[ICONCLASS[SINGULAR]], type_name
-            )
-            inception = map_wd_attribute.try_get_year_from_property_timestamp(
-                result, PROPERTY_NAME_TO_PROPERTY_ID[INCEPTION], type_name
-            )
-            country = map_wd_attribute.try_get_first_qid(result, PROPERTY_NAME_TO_PROPERTY_ID[COUNTRY], type_name)
-
-            # Resolve dimensions
-            # The units are qids which have to be resolved later
-            (
-                height,
-                width,
-                length,
-                diameter,
-            ) = map_wd_attribute.get_attribute_values_with_try_get_func(
-                result,
-                [HEIGHT, WIDTH, LENGTH, DIAMETER],
-                type_name,
-                map_wd_attribute.try_get_dimension_value,
-            )
-            (
-                height_unit,
-                width_unit,
-                length_unit,
-                diameter_unit,
-            ) = map_wd_attribute.get_attribute_values_with_try_get_func(
-                result,
-                [HEIGHT, WIDTH, LENGTH, DIAMETER],
-                type_name,
-                map_wd_attribute.try_get_dimension_unit,
-            )
-
-            significant_events = map_wd_attribute.try_get_significant_events(result)
-
-            artwork_dictionary = {
-                ID: qid,
-                CLASS[PLURAL]: classes,
-                LABEL[SINGULAR]: label,
-                DESCRIPTION[SINGULAR]: description,
-                IMAGE: image,
-                ARTIST[PLURAL]: artists,
-                LOCATION[PLURAL]: locations,
-                GENRE[PLURAL]: genres,
-                MOVEMENT[PLURAL]: movements,
-                INCEPTION: inception,
-                MATERIAL[PLURAL]: materials,
-                MOTIF[PLURAL]: motifs,
-                COUNTRY: country,
-                HEIGHT: height,
-                HEIGHT_UNIT: height_unit,
-                WIDTH: width,
-                WIDTH_UNIT: width_unit,
-                LENGTH: length,
-                LENGTH_UNIT: length_unit,
-                DIAMETER: diameter,
-                DIAMETER_UNIT: diameter_unit,
-                ICONCLASS[PLURAL]: iconclasses,
-                MAIN_SUBJECT[PLURAL]: main_subjects,
-                EXHIBITION_HISTORY: exhibition_history,
-                SIGNIFICANT_EVENT: significant_events,
-                TYPE: ARTWORK[SINGULAR],
-            }
-
-            # Apply blocklist to artwork dictionary
-            for t in [
-                CLASS[PLURAL],
-                ARTIST[PLURAL],
-                LOCATION[PLURAL],
-                GENRE[PLURAL],
-                MOVEMENT[PLURAL],
-                MATERIAL[PLURAL],
-                MOTIF[PLURAL],
-                ICONCLASS[PLURAL],
-                MAIN_SUBJECT[PLURAL],
-                EXHIBITION_HISTORY,
-            ]:
-                try:
-                    artwork_dictionary[t] = list(set(artwork_dictionary[t]) - set(BLOCKLIST))
-                except Exception as e:
-                    logger.exception(e)
-                    continue
-
-            for langkey in language_keys:
-                label_lang = map_wd_attribute.try_get_label_or_description(result, LABEL[PLURAL], langkey, type_name)
-                description_lang = map_wd_attribute.try_get_label_or_description(
-                    result, DESCRIPTION[PLURAL], langkey, type_name
-                )
-                wikipedia_link_lang = map_wd_attribute.try_get_wikipedia_link(result, langkey, type_name)
-                artwork_dictionary.update(
-                    {
-                        f"{LABEL[SINGULAR]}_{langkey}": label_lang,
-                        f"{DESCRIPTION[SINGULAR]}_{langkey}": description_lang,
-                        f"{WIKIPEDIA_LINK}_{langkey}": wikipedia_link_lang,
-                    }
-                )
+            qid = artwork_dictionary[ID]
             extract_dicts.append(artwork_dictionary)
             already_crawled_wikidata_items.add(qid)
+            if LASTREVID in result:
+                chunk_revisions[qid] = result[LASTREVID]
+        yield extract_dicts
+        if revisions is not None:
+            revisions.update(chunk_revisions)
+        if journal is not None:
+            journal.commit(fetch_chunk_id, chunk_revisions)
 
         item_count += len(chunk)
         print(
@@ -340,10 +641,7 @@ def extract_artworks(
             flush=True,
         )
 
-        chunk_count += 1
-
     print(datetime.datetime.now(), "Finished with", type_name)
-    return extract_dicts
 
 
 def get_distinct_attribute_values_from_dict(
@@ -376,13 +674,18 @@ def get_distinct_attribute_values_from_dict(
 
 def load_entities_by_attribute_with_transitive_closure(
     extract_dicts: List[Dict],
-    attribute_name: str,
+    attribute_names: List[str],
     oab_type: str,
     already_extracted_ids: Set[str],
-    entity_extraction_func: Callable[[str, List[str], Set[str], Optional[List[str]]], tuple[List[Dict], Set[str]]],
+    entity_extraction_func: Callable[[str, List[str]], List[Dict]],
     allowed_instances_of: List[str],
+    max_depth: Optional[int] = TRANSITIVE_CLOSURE_MAX_DEPTH,
 ) -> tuple[List[Dict], Set[str]]:
-    """Recursive function to load all entities which a attribute contains.
+    """Loads all entities which the attributes contain, and the entities their attributes contain and so on.
+
+    The closure is computed breadth first: all qids of one level which weren't extracted yet are requested
+    together in full concurrent batches, the attributes of the fetched entities form the next level.
+    There is no recursion, so deep chains (e. g. 'subclass_of') can't exceed the recursion limit.
 
     Remarks:
         This would be also possible with a SPARQL query however when we tested it
@@ -391,72 +694,91 @@ def load_entities_by_attribute_with_transitive_closure(
 
     Args:
         extract_dicts: Already extracted entities, the new entities are added to this list
-        attribute_name: Attribute which should be loaded with a transitive closure
-        already_extracted_ids: list that tracks the already extracted ids
+        attribute_names: Attributes which should be loaded with a transitive closure e. g. [PART_OF, HAS_PART]
+        oab_type: oab type of the loaded entities, passed to entity_extraction_func
+        already_extracted_ids: Set that tracks the already extracted ids, it is updated with the requested qids
+        entity_extraction_func: Function which requests and maps the entities of a list of qids (one level)
         allowed_instances_of: The extracted entity has to be instance of one provided qid in the list
+        max_depth: Maximum number of levels which are loaded. Defaults to TRANSITIVE_CLOSURE_MAX_DEPTH
 
     Returns:
-        Updated list of dicts with recursively loaded entities by an attribute
+        Updated list of dicts with the transitively loaded entities
         and the updated set of already extracted ids
     """
-    qids = get_distinct_attribute_values_from_dict(attribute_name, extract_dicts)
-    missing_qids = []
-
-    for id in qids:
-        if id not in already_extracted_ids:
-            missing_qids.append(id)
-
-    if len(missing_qids) == 0:
-        return extract_dicts, already_extracted_ids
-    else:
-        [already_extracted_ids.add(id) for id in qids]
-        entities, already_extracted_ids = entity_extraction_func(oab_type, missing_qids, already_extracted_ids)
-        for entity in entities:
+    extracted_ids = {entity[ID] for entity in extract_dicts}
+    allowed_instances_of = set(allowed_instances_of)
+    frontier = extract_dicts
+    for depth in range(max_depth):
+        qids = set()
+        for attribute_name in attribute_names:
+            qids.update(get_distinct_attribute_values_from_dict(attribute_name, frontier))
+        missing_qids = [qid for qid in qids if qid not in already_extracted_ids and qid not in extracted_ids]
+        already_extracted_ids.update(qids)
+        if not missing_qids:
+            return extract_dicts, already_extracted_ids
+        logger.info(
+            f"Transitive closure of {oab_type} over {attribute_names}: {len(missing_qids)} qids on level {depth}"
+        )
+        frontier = entity_extraction_func(oab_type, missing_qids)
+        for entity in frontier:
             # Check if an entity with the same qid is in the dict, if not then add
-            if not any(e[ID] == entity[ID] for e in extract_dicts):
-                # Check if allowed instances of has values
-                if allowed_instances_of:
-                    # If it has values only allow entities which have instance of ids
-                    # in the allowed instances of list
-                    if not set(entity[CLASS[PLURAL]]).isdisjoint(allowed_instances_of):
-                        extract_dicts.append(entity)
-                else:
-                    extract_dicts.append(entity)
-        return extract_dicts, already_extracted_ids
+            if entity[ID] in extracted_ids:
+                continue
+            # If allowed instances of has values only allow entities which have instance of ids
+            # in the allowed instances of list
+            if not allowed_instances_of or not allowed_instances_of.isdisjoint(entity[CLASS[PLURAL]]):
+                extract_dicts.append(entity)
+                extracted_ids.add(entity[ID])
+    logger.warning(f"Transitive closure of {oab_type} over {attribute_names} stopped at the depth limit {max_depth}")
+    return extract_dicts, already_extracted_ids
 
 
 # region subjects
-def get_subject(
+def extract_subjects(
     type_name: str,
     qids: List[str],
-    already_extracted_movement_ids: Set[str] = None,
+    already_extracted_movement_ids: Set[str],
     language_keys: Optional[List[str]] = lang_keys,
-) -> tuple[List[Dict], Set[str]]:
-    """Extract subjects (in our definition everything except artworks e. g. movements, motifs, etc.) from wikidata
+    journal: Optional[ChunkJournal] = None,
+) -> List[Dict]:
+    """Requests the subjects of the given qids and maps them to oab entities without any transitive closure
 
     Args:
         type_name: oab type name e. g. movements (Caution type names are always plural here)
-        qids: A list of qids extracted from the artworks
+        qids: A list of qids
+        already_extracted_movement_ids: The ids of extracted movements are added to this set
         language_keys: All language keys which should be extracted. Defaults to languageconfig.csv
+        journal: Journal of the subject type. The mapped subjects of every chunk are recorded,
+        chunks which were recorded before a crash are replayed instead of requested. Defaults to None.
 
     Returns:
         A list of dicts with the subjects transformed from wikidata entities to oab entities
     """
-    if already_extracted_movement_ids is None:
-        already_extracted_movement_ids = set()
     print(datetime.datetime.now(), f"Starting with {type_name}")
     print(f"Total {type_name} to extract: {len(qids)}")
     item_count = 0
     extract_dicts = []
     chunk_size = 50  # The chunksize 50 is allowed by the wikidata api, bigger numbers need special permissions
-    subject_id_chunks = chunks(list(qids), chunk_size)
-    for chunk in subject_id_chunks:
-        query_result = wikidata_entity_request(chunk)
-
+    # Sorted so that the chunks and their ids are the same in a resumed run
+    subject_id_chunks = chunks(sorted(qids), chunk_size)
+    if journal is not None:
+        pending_chunks = []
+        for chunk in subject_id_chunks:
+            if journal.is_done(chunk_id(chunk)):
+                replayed_dicts = journal.chunks[chunk_id(chunk)]
+                if type_name == MOVEMENT[PLURAL]:
+                    already_extracted_movement_ids.update(subject_dict[ID] for subject_dict in replayed_dicts)
+                extract_dicts.extend(replayed_dicts)
+                item_count += len(chunk)
+            else:
+                pending_chunks.append(chunk)
+        subject_id_chunks = pending_chunks
+    for chunk, query_result in wikidata_entity_requests(subject_id_chunks):
         if ENTITIES not in query_result:
             logger.error("Skipping chunk")
             continue
 
+        chunk_dicts = []
         for result in query_result[ENTITIES].values():
             subject_dict = map_wd_response.try_map_response_to_subject(result, type_name)
             if subject_dict is None:
@@ -473,46 +795,77 @@ def get_subject(
                 subject_dict.update(map_wd_response.try_map_response_to_artist(result))
             if type_name == LOCATION[PLURAL]:
                 subject_dict.update(map_wd_response.try_map_response_to_location(result))
-            extract_dicts.append(subject_dict)
+            chunk_dicts.append(subject_dict)
+        extract_dicts.extend(chunk_dicts)
+        if journal is not None:
+            journal.commit(chunk_id(chunk), chunk_dicts)
 
         item_count += len(chunk)
         print(f"Status of {type_name}: {item_count}/{len(qids)}", end="\r", flush=True)
 
+    print(datetime.datetime.now(), f"Finished with {type_name}")
+    return extract_dicts
+
+
+def get_subject(
+    type_name: str,
+    qids: List[str],
+    already_extracted_movement_ids: Set[str] = None,
+    language_keys: Optional[List[str]] = lang_keys,
+    journal: Optional[ChunkJournal] = None,
+) -> tuple[List[Dict], Set[str]]:
+    """Extract subjects (in our definition everything except artworks e. g. movements, motifs, etc.) from wikidata
+
+    The movements which are part of or have parts of the extracted movements are loaded with a transitive closure.
+
+    Args:
+        type_name: oab type name e. g. movements (Caution type names are always plural here)
+        qids: A list of qids extracted from the artworks
+        language_keys: All language keys which should be extracted. Defaults to languageconfig.csv
+        journal: Journal of the subject type, see extract_subjects. Defaults to None.
+
+    Returns:
+        A list of dicts with the subjects transformed from wikidata entities to oab entities
+    """
+    if already_extracted_movement_ids is None:
+        already_extracted_movement_ids = set()
+    extract_dicts = extract_subjects(type_name, qids, already_extracted_movement_ids, language_keys, journal)
+
     if type_name == MOVEMENT[PLURAL]:
         extract_dicts, already_extracted_movement_ids = load_entities_by_attribute_with_transitive_closure(
             extract_dicts,
-            PART_OF,
-            MOVEMENT[PLURAL],
-            already_extracted_movement_ids,
-            get_subject,
-            [ART_MOVEMENT[ID], ART_STYLE[ID]],
-        )
-        extract_dicts, already_extracted_movement_ids = load_entities_by_attribute_with_transitive_closure(
-            extract_dicts,
-            HAS_PART,
+            [PART_OF, HAS_PART],
             MOVEMENT[PLURAL],
             already_extracted_movement_ids,
-            get_subject,
+            lambda oab_type, missing_qids: extract_subjects(
+                oab_type, missing_qids, already_extracted_movement_ids, language_keys, journal
+            ),
             [ART_MOVEMENT[ID], ART_STYLE[ID]],
         )
-        return extract_dicts, already_extracted_movement_ids
-
-    print(datetime.datetime.now(), f"Finished with {type_name}")
     return extract_dicts, already_extracted_movement_ids
 
 
-def bundle_extract_subjects_calls(oab_type_list: List[str], merged_artworks: List[Dict]) -> Iterator[List[Dict]]:
+def bundle_extract_subjects_calls(
+    oab_type_list: List[str],
+    merged_artworks: List[Dict],
+    journals: Optional[Dict[str, ChunkJournal]] = None,
+) -> Iterator[List[Dict]]:
     """Bundles the extract subjects calls
 
     Args:
         oab_type_list: A list of oab types to extract from wikidata
         merged_artworks: The already crawled list of dictionaries to extract subjects like movements, motifs etc. from
+        journals: Journals of the oab types, see extract_subjects. Defaults to None.
 
     Yields:
         A list of dicts with from for the given oab type
     """
     for item in oab_type_list:
-        extract_dicts, _ids = get_subject(item, get_distinct_attribute_values_from_dict(item, merged_artworks))
+        extract_dicts, _ids = get_subject(
+            item,
+            get_distinct_attribute_values_from_dict(item, merged_artworks),
+            journal=journals.get(item) if journals is not None else None,
+        )
         yield extract_dicts
 
 
@@ -555,11 +908,12 @@ def get_distinct_unit_symbol_qids(merged_artworks: List[Dict]) -> Set[str]:
     return distinct_unit_qids
 
 
-def get_unit_symbols(qids: List[str]) -> List[Dict]:
+def get_unit_symbols(qids: List[str], entities: Optional[Dict[str, Dict]] = None) -> List[Dict]:
     """Function to get the unit symbols from the unit entities
 
     Args:
         qids: List of qids
+        entities: Already fetched unit entities by qid, if None the entities are requested. Defaults to None.
 
     Returns:
         List of dicts containing the unit id and their unit symbol in english language
@@ -568,11 +922,7 @@ def get_unit_symbols(qids: List[str]) -> List[Dict]:
     print(f"Total unit symbols to extract: {len(qids)}")
     item_count = 0
     extract_dicts = []
-    chunk_size = 50  # The chunksize 50 is allowed by the wikidata api, bigger numbers need special permissions
-    id_chunks = chunks(list(qids), chunk_size)
-    for chunk in id_chunks:
-        query_result = wikidata_entity_request(chunk, props=[CLAIMS], timeout=10)
-
+    for chunk, query_result in prefetched_or_requested_entities(qids, entities, props=[CLAIMS], timeout=10):
         if ENTITIES not in query_result:
             logger.error("Skipping chunk")
             continue
@@ -628,28 +978,21 @@ def resolve_unit_id_to_unit_symbol(artwork_dict: List[Dict], unit_symbols: List[
 
 
 # region classes
-def get_classes(
+def extract_classes(
     type_name: str,
     qids: List[str],
-    already_extracted_superclass_ids: Set[str] = None,
     language_keys: Optional[List[str]] = lang_keys,
-) -> tuple[List[Dict], Set[str]]:
-    """Function to extract the classes of the extracted wikidata entities
-        (meaning the 'instance of' attribute wikidata entity qids).
-    Their subclasses are also extracted recursively (also called transitive closure)
+) -> List[Dict]:
+    """Requests the classes of the given qids and maps them to class entities without any transitive closure
 
     Args:
         type_name: oab type e. g. movement
-        qids: List of qids to extract the labels from
+        qids: List of class qids
         language_keys: All language keys which should be extracted. Defaults to languageconfig.csv
-        already_extracted_superclass_ids: A list of already extracted superclass ids for the recursive calls,
-        this is also the anchor to stop recursion
 
     Returns:
-        Returns a list of dicts with the classes from the oab entities and their subclasses
+        Returns a list of dicts with the classes
     """
-    if already_extracted_superclass_ids is None:
-        already_extracted_superclass_ids = set()
     print(datetime.datetime.now(), f"Starting with {type_name}")
     if type_name == CLASS[PLURAL]:
         print(f"Total {type_name} to extract (only 'instance_of' of the provided qids): {len(qids)}")
@@ -659,9 +1002,7 @@ def get_classes(
     extract_dicts = []
     chunk_size = 50  # The chunksize 50 is allowed by the wikidata api, bigger numbers need special permissions
     classes_id_chunks = chunks(list(qids), chunk_size)
-    for chunk in classes_id_chunks:
-        query_result = wikidata_entity_request(chunk)
-
+    for chunk, query_result in wikidata_entity_requests(classes_id_chunks):
         if ENTITIES not in query_result:
             logger.error("Skipping chunk")
             continue
@@ -700,15 +1041,39 @@ def get_classes(
         item_count += len(chunk)
         print(f"Status of {type_name}: {item_count}/{len(qids)}", end="\r", flush=True)
 
-    extract_dicts, _ids = load_entities_by_attribute_with_transitive_closure(
+    return extract_dicts
+
+
+def get_classes(
+    type_name: str,
+    qids: List[str],
+    already_extracted_superclass_ids: Set[str] = None,
+    language_keys: Optional[List[str]] = lang_keys,
+) -> tuple[List[Dict], Set[str]]:
+    """Function to extract the classes of the extracted wikidata entities
+        (meaning the 'instance of' attribute wikidata entity qids).
+    Their subclasses are also extracted with a transitive closure
+
+    Args:
+        type_name: oab type e. g. movement
+        qids: List of qids to extract the labels from
+        language_keys: All language keys which should be extracted. Defaults to languageconfig.csv
+        already_extracted_superclass_ids: A set of already extracted superclass ids which aren't requested again
+
+    Returns:
+        Returns a list of dicts with the classes from the oab entities and their subclasses
+    """
+    if already_extracted_superclass_ids is None:
+        already_extracted_superclass_ids = set()
+    extract_dicts = extract_classes(type_name, qids, language_keys)
+    return load_entities_by_attribute_with_transitive_closure(
         extract_dicts,
-        SUBCLASS_OF,
+        [SUBCLASS_OF],
         CLASS[PLURAL],
         already_extracted_superclass_ids,
-        get_classes,
+        lambda oab_type, missing_qids: extract_classes(oab_type, missing_qids, language_keys),
         [],
     )
-    return extract_dicts, _ids
 
 
 def bundle_class_union_calls(distinct_classes: Set[str], oab_type_list: List[str]) -> Set[str]:
@@ -769,6 +1134,7 @@ def get_entity_labels(
     type_name: str,
     qids: List[str],
     language_keys: Optional[List[str]] = lang_keys,
+    entities: Optional[Dict[str, Dict]] = None,
 ) -> List[Dict]:
     """Function to get the entity labels from wikidata
 
@@ -776,6 +1142,7 @@ def get_entity_labels(
         type_name: oab type e. g. movement
         qids: List of qids to extract the labels from
         language_keys: All language keys which should be extracted. Defaults to languageconfig.csv
+        entities: Already fetched entities by qid, if None the entities are requested. Defaults to None.
 
     Returns:
         List of dicts containing the qid and the labels for each language
@@ -784,13 +1151,8 @@ def get_entity_labels(
     print(f"Total {type_name} {LABEL[PLURAL]} to extract: {len(qids)}")
     item_count = 0
     extract_dicts = []
-    chunk_size = 50  # The chunksize 50 is allowed by the wikidata api, bigger numbers need special permissions
-    id_chunks = chunks(list(qids), chunk_size)
-    for chunk in id_chunks:
-        query_result = wikidata_entity_request(
-            chunk, props=[LABEL[PLURAL]], timeout=10
-        )  # country entities take longer so timeout is increased
-
+    # country entities take longer so timeout is increased
+    for chunk, query_result in prefetched_or_requested_entities(qids, entities, props=[LABEL[PLURAL]], timeout=10):
         if ENTITIES not in query_result:
             logger.error("Skipping chunk")
             continue
@@ -861,25 +1223,46 @@ def resolve_entity_id_to_label(
     return extract_dicts
 
 
-def get_labels_for_artists(artists: List[Dict], prop_list: List[str]) -> List[Dict]:
+def get_labels_for_artists(
+    artists: List[Dict], prop_list: List[str], entities: Optional[Dict[str, Dict]] = None
+) -> List[Dict]:
     """Resolve the labels from qids in the artist entities
 
     Args:
         artists: List artist entities
         prop_list: List of properties to resolve
+        entities: Already fetched entities by qid, if None the entities are requested. Defaults to None.
 
     Returns:
         Updated artist entities with resolved labels
     """
     for item in prop_list:
         distinct_label = get_distinct_attribute_values_from_dict(item, artists, True)
-        extracted_labels = get_entity_labels(item, distinct_label)
+        extracted_labels = get_entity_labels(item, distinct_label, entities=entities)
         resolve_entity_id_to_label(item, artists, extracted_labels)
     return artists
 
 
+def get_distinct_country_qids(entity_lists: List[List[Dict]]) -> Set[str]:
+    """Load the distinct qids from the country attribute of all entities
+
+    Args:
+        entity_lists: Lists of entities with a country attribute e. g. locations, artworks and movements
+
+    Returns:
+        Set of distinct country ids
+    """
+    distinct_country_ids = set()
+    for entity_list in entity_lists:
+        distinct_country_ids.update(get_distinct_attribute_values_from_dict(COUNTRY, entity_list, True))
+    return distinct_country_ids
+
+
 def get_country_labels_for_merged_artworks_and_locations(
-    locations: List[Dict], merged_artworks: List[Dict], movements: List[Dict]
+    locations: List[Dict],
+    merged_artworks: List[Dict],
+    movements: List[Dict],
+    entities: Optional[Dict[str, Dict]] = None,
 ) -> Iterator[List[Dict]]:
     """Resolve the country qids for the merged artworks and locations to labels
 
@@ -887,15 +1270,14 @@ def get_country_labels_for_merged_artworks_and_locations(
         locations: List of location entities
         merged_artworks: List of artwork entities
         movements: List of movement entities
+        entities: Already fetched entities by qid, if None the entities are requested. Defaults to None.
 
     Yields:
         Yields the updated list of entities with resolved country qids to their labels
     """
     tmp = [locations, merged_artworks, movements]
-    distinct_ids = [get_distinct_attribute_values_from_dict(COUNTRY, item, True) for item in tmp]
-
-    distinct_country_ids = distinct_ids[0].union(distinct_ids[1], distinct_ids[2])
-    country_labels_extracted = get_entity_labels(COUNTRY, distinct_country_ids)
+    distinct_country_ids = get_distinct_country_qids(tmp)
+    country_labels_extracted = get_entity_labels(COUNTRY, distinct_country_ids, entities=entities)
 
     for item in tmp:
         yield resolve_entity_id_to_label(COUNTRY, item, country_labels_extracted)
@@ -909,6 +1291,7 @@ def get_exhibition_entities(
     qids: Set[str],
     language_keys: Optional[List[str]] = lang_keys,
     type_name: str = EXHIBITION,
+    entities: Optional[Dict[str, Dict]] = None,
 ) -> Dict[str, Dict]:
     """Function to get the exhibition entities from wikidata
 
@@ -916,6 +1299,7 @@ def get_exhibition_entities(
         qids: Distinct qid set to get the entities from
         language_keys: Language keys to extract label and description from. Defaults to languageconfig.csv
         type_name: OAB type name. Defaults to EXHIBITION.
+        entities: Already fetched entities by qid, if None the entities are requested. Defaults to None.
 
     Returns:
         A dict with the qids as key and the JSON object as value
@@ -924,10 +1308,7 @@ def get_exhibition_entities(
     print(f"Total exhibition entities to extract: {len(qids)}")
     item_count = 0
     extract_dicts = {}
-    chunk_size = 50  # The chunksize 50 is allowed by the wikidata api, bigger numbers need special permissions
-    id_chunks = chunks(list(qids), chunk_size)
-    for chunk in id_chunks:
-        query_result = wikidata_entity_request(chunk)
+    for chunk, query_result in prefetched_or_requested_entities(qids, entities, props=EXHIBITION_PROPS):
         for result in query_result[ENTITIES].values():
             try:
                 qid = result[ID]
@@ -974,17 +1355,18 @@ def get_exhibition_entities(
     return extract_dicts
 
 
-def resolve_exhibition_ids_to_exhibition_entities(artwork_dict: List[Dict]):
+def resolve_exhibition_ids_to_exhibition_entities(artwork_dict: List[Dict], entities: Optional[Dict[str, Dict]] = None):
     """Function to resolve the exhibition qids to exhibition entities which are part of artwork entities
 
     Args:
         artwork_dict: List of artworks
+        entities: Already fetched entities by qid, if None the entities are requested. Defaults to None.
 
     Returns:
         Modified artwork list with exhibition ids resolved to JSON objects
     """
     distinct_exhibition_ids = get_distinct_attribute_values_from_dict(EXHIBITION_HISTORY, artwork_dict)
-    qid_exhibition_entity_dict = get_exhibition_entities(distinct_exhibition_ids)
+    qid_exhibition_entity_dict = get_exhibition_entities(distinct_exhibition_ids, entities=entities)
 
     for artwork in artwork_dict:
         if artwork[
@@ -1000,14 +1382,14 @@ def resolve_exhibition_ids_to_exhibition_entities(artwork_dict: List[Dict]):
 
 
 # ruff: noqa: C901
-def resolve_significant_event_id_entities_to_labels(artwork_dict: List[Dict]):
-    """Function to resolve the labels from significant events entity ids
+def get_distinct_significant_event_qids(artwork_dict: List[Dict]) -> Set[str]:
+    """Load the distinct qids from the significant events of all artworks
 
     Args:
         artwork_dict: List of artworks
 
     Returns:
-        Modified artwork list with significant event ids resolved to JSON objects
+        Set of distinct qids which are values of the significant event properties
     """
     distinct_entity_ids = set()
     for artwork in artwork_dict:
@@ -1034,8 +1416,25 @@ def resolve_significant_event_id_entities_to_labels(artwork_dict: List[Dict]):
                         distinct_entity_ids.add(value)
                     else:
                         logger.info(f"The value: {value} is no list of qids or a qid")
+    return distinct_entity_ids
 
-    entity_labels = {item[ID]: item for item in get_entity_labels("significant events", list(distinct_entity_ids))}
+
+def resolve_significant_event_id_entities_to_labels(
+    artwork_dict: List[Dict], entities: Optional[Dict[str, Dict]] = None
+):
+    """Function to resolve the labels from significant events entity ids
+
+    Args:
+        artwork_dict: List of artworks
+        entities: Already fetched entities by qid, if None the entities are requested. Defaults to None.
+
+    Returns:
+        Modified artwork list with significant event ids resolved to JSON objects
+    """
+    distinct_entity_ids = get_distinct_significant_event_qids(artwork_dict)
+    entity_labels = {
+        item[ID]: item for item in get_entity_labels("significant events", list(distinct_entity_ids), entities=entities)
+    }
 
     for artwork in artwork_dict:
         if SIGNIFICANT_EVENT in artwork and artwork[SIGNIFICANT_EVENT]:
@@ -1053,3 +1452,137 @@ def resolve_significant_event_id_entities_to_labels(artwork_dict: List[Dict]):
                         logger.info(f"The value: {value} is no list of qids or a qid")
 
     return artwork_dict
+
+
+# region qid resolution
+class QidResolutionScheduler:
+    """Collects the qids of all label and entity lookups and fetches every entity once
+
+    Every lookup registers its qids with the props it needs. The qids are deduplicated over all lookups,
+    a qid needed by several lookups is requested with the union of their props. The qids are packed
+    into full batches of 50, partial batches are filled up with qids which need a subset of the props.
+    The fetched entities are passed to the resolvers with their entities argument.
+
+    Examples:
+        scheduler = QidResolutionScheduler()
+        scheduler.add(country_ids, [LABEL[PLURAL]])
+        scheduler.add(unit_ids, [CLAIMS])
+        entities = scheduler.resolve()
+    """
+
+    def __init__(self, chunk_size: Optional[int] = 50) -> None:
+        # The chunksize 50 is allowed by the wikidata api, bigger numbers need special permissions
+        self.chunk_size = chunk_size
+        self.pending: Dict[str, Set[str]] = {}
+        self.registered_count = 0
+
+    def add(self, qids: Iterable[str], props: List[str]) -> None:
+        """Registers qids which have to be fetched with the given props
+
+        Args:
+            qids: Qids of a lookup
+            props: Props of the wbgetentities request the lookup needs
+        """
+        for qid in qids:
+            self.pending.setdefault(qid, set()).update(props)
+            self.registered_count += 1
+
+    def batches(self) -> List[Tuple[List[str], List[str]]]:
+        """Packs the pending qids into batches of qids with the same props
+
+        Returns:
+            List of tuples of the qids and the props of a request
+        """
+        groups: Dict[frozenset, List[str]] = {}
+        for qid, props in self.pending.items():
+            groups.setdefault(frozenset(props), []).append(qid)
+        # Groups with more props first, so their partial batches can take qids which need fewer props
+        ordered_props = sorted(groups, key=lambda props: (-len(props), sorted(props)))
+        batches = []
+        for props in ordered_props:
+            qids = groups[props]
+            while qids:
+                batch = qids[: self.chunk_size]
+                del qids[: self.chunk_size]
+                for other_props in ordered_props:
+                    if len(batch) >= self.chunk_size:
+                        break
+                    if other_props < props:
+                        fill = groups[other_props][: self.chunk_size - len(batch)]
+                        del groups[other_props][: len(fill)]
+                        batch.extend(fill)
+                batches.append((batch, sorted(props)))
+        return batches
+
+    def resolve(self, timeout: Optional[int] = 10) -> Dict[str, Dict]:
+        """Fetches all pending qids, the batches are requested concurrently
+
+        Args:
+            timeout: Timeout for the queries, country entities take longer so it is increased. Defaults to 10
+
+        Returns:
+            A dict of the qids and their raw wikidata entity
+        """
+        batches = self.batches()
+        print(
+            datetime.datetime.now(),
+            f"Starting with the resolution of {len(self.pending)} distinct qids "
+            f"({self.registered_count} registered) in {len(batches)} requests",
+        )
+        entities = {}
+        item_count = 0
+        for (chunk, _props), query_result in concurrent_map(
+            lambda batch: wikidata_entity_request(batch[0], props=batch[1], timeout=timeout), batches
+        ):
+            if ENTITIES not in query_result:
+                logger.error("Skipping chunk")
+                continue
+            entities.update(query_result[ENTITIES])
+            item_count += len(chunk)
+            print(f"Status of the qid resolution: {item_count}/{len(self.pending)}", end="\r", flush=True)
+        self.pending = {}
+        print(datetime.datetime.now(), "Finished with the qid resolution")
+        return entities
+
+
+def resolve_qids_to_labels_and_entities(
+    locations: List[Dict],
+    merged_artworks: List[Dict],
+    movements: List[Dict],
+    artists: List[Dict],
+    artist_props: List[str],
+) -> Tuple[List[Dict], List[Dict], List[Dict], List[Dict]]:
+    """Resolves the country labels, artist labels, unit symbols, exhibitions and significant events
+    with one QidResolutionScheduler instead of one request pass per lookup
+
+    Args:
+        locations: List of location entities
+        merged_artworks: List of artwork entities
+        movements: List of movement entities
+        artists: List of artist entities
+        artist_props: Artist properties which are resolved to labels e. g. gender
+
+    Returns:
+        The updated locations, artworks, movements and artists
+    """
+    scheduler = QidResolutionScheduler()
+    scheduler.add(get_distinct_country_qids([locations, merged_artworks, movements]), [LABEL[PLURAL]])
+    for prop in artist_props:
+        scheduler.add(get_distinct_attribute_values_from_dict(prop, artists, True), [LABEL[PLURAL]])
+    scheduler.add(get_distinct_unit_symbol_qids(merged_artworks), [CLAIMS])
+    scheduler.add(get_distinct_attribute_values_from_dict(EXHIBITION_HISTORY, merged_artworks), EXHIBITION_PROPS)
+    scheduler.add(get_distinct_significant_event_qids(merged_artworks), [LABEL[PLURAL]])
+    entities = scheduler.resolve()
+
+    locations, merged_artworks, movements = get_country_labels_for_merged_artworks_and_locations(
+        locations, merged_artworks, movements, entities=entities
+    )
+    artists = get_labels_for_artists(artists, artist_props, entities=entities)
+    unit_symbols = get_unit_symbols(get_distinct_unit_symbol_qids(merged_artworks), entities=entities)
+    resolve_unit_id_to_unit_symbol(merged_artworks, unit_symbols)
+    merged_artworks = resolve_exhibition_ids_to_exhibition_entities(merged_artworks, entities=entities)
+    merged_artworks = resolve_significant_event_id_entities_to_labels(merged_artworks, entities=entities)
+    return locations, merged_artworks, movements, artists
+
+
+# endregion
@@ -5,13 +5,15 @@ to the openArtBrowser data model
 # ruff: noqa: F403 F405
 import hashlib
 import inspect
+import random
 import re
+import threading
+from collections import Counter
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional
-
-from pywikibot import WbTime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 from data_extraction.constants import *
+from data_extraction.wd_time import year_from_timestr
 from shared.constants import *
 from shared.utils import setup_logger
 
@@ -66,8 +68,88 @@ def get_image_url_by_name(image_name: str) -> str:
     return url
 
 
+# Missing attributes by (function, attribute, oab type) and a sample of the affected items,
+# they are written as one table by log_missing_attribute_stats instead of a log line per attribute
+_missing_attributes = Counter()
+_missing_attribute_examples: Dict[Tuple[str, str, str], List[str]] = {}
+_missing_attributes_lock = threading.Lock()
+
+
+def count_missing_attribute(function: str, attribute: str, oab_type: str, qid: str, error: Any = None) -> None:
+    """Counts a missing or malformed attribute, a few of the items are kept as examples (reservoir sampling)
+
+    Args:
+        function: Name of the function or kind which maps the attribute e. g. 'try_get_first_qid'
+        attribute: Property id or field of the attribute e. g. 'P17' or 'labels/de'
+        oab_type: openArtBrowser type e. g. 'paintings'
+        qid: Qid of the item
+        error: Exception if the attribute was malformed. Defaults to None.
+    """
+    key = (function, attribute, oab_type)
+    example = qid if error is None else f"{qid} ({error!r})"
+    with _missing_attributes_lock:
+        _missing_attributes[key] += 1
+        examples = _missing_attribute_examples.setdefault(key, [])
+        if len(examples) < MISSING_ATTRIBUTE_EXAMPLES:
+            examples.append(example)
+        else:
+            index = random.randrange(_missing_attributes[key])
+            if index < MISSING_ATTRIBUTE_EXAMPLES:
+                examples[index] = example
+
+
+def get_missing_attribute_stats(reset: Optional[bool] = False) -> Dict[Tuple[str, str, str], Tuple[int, List[str]]]:
+    """Returns the counts and examples of the missing attributes e. g. to send them from a worker process
+
+    Args:
+        reset: Reset the counters. Defaults to False.
+
+    Returns:
+        Count and examples by (function, attribute, oab type)
+    """
+    with _missing_attributes_lock:
+        stats = {key: (count, list(_missing_attribute_examples[key])) for key, count in _missing_attributes.items()}
+        if reset:
+            _missing_attributes.clear()
+            _missing_attribute_examples.clear()
+        return stats
+
+
+def merge_missing_attribute_stats(stats: Dict[Tuple[str, str, str], Tuple[int, List[str]]]) -> None:
+    """Adds the missing attributes counted in another process, see get_missing_attribute_stats"""
+    with _missing_attributes_lock:
+        for key, (count, examples) in stats.items():
+            _missing_attributes[key] += count
+            merged = _missing_attribute_examples.setdefault(key, [])
+            merged.extend(examples[: MISSING_ATTRIBUTE_EXAMPLES - len(merged)])
+
+
+def log_missing_attribute_stats(logging: Any) -> None:
+    """Writes the missing attributes as one table to the log and resets the counters
+
+    Args:
+        logging (Logger): Logger from the calling script
+    """
+    stats = get_missing_attribute_stats(reset=True)
+    rows = [
+        (str(count), *key, ", ".join(examples))
+        for key, (count, examples) in sorted(stats.items(), key=lambda item: item[1][0], reverse=True)
+    ]
+    if not rows:
+        return
+    rows.insert(0, ("count", "function", "attribute", "type", "examples"))
+    widths = [max(len(row[column]) for row in rows) for column in range(4)]
+    lines = [
+        "  ".join([*(value.ljust(width) for value, width in zip(row[:4], widths, strict=True)), row[4]]) for row in rows
+    ]
+    logging.info("Missing attributes:\n" + "\n".join(lines))
+
+
 def return_on_failure(return_value) -> Any:
-    """A decorator that wraps a function and logs exceptions
+    """A decorator that wraps a function and counts exceptions as missing attributes
+
+    The arguments between the entity and oab_type (e. g. the property id) identify the attribute,
+    see count_missing_attribute.
 
     Args:
         return_value: The return value of func in case of an exception
@@ -78,21 +160,20 @@ def return_on_failure(return_value) -> Any:
     """
 
     def decorator(func):
+        # The argument names are inspected once instead of on every failure
+        argspec = inspect.getfullargspec(func)
+        params = argspec.args
+        defaults = dict(zip(params[len(params) - len(argspec.defaults or []) :], argspec.defaults or [], strict=True))
+
         def wrapper(*args, **kwargs):
             try:
                 return func(*args, **kwargs)
             except Exception as error:
-                error_message = "Missing attribute in function {0} on item {1}".format(func.__name__, args[0][ID])
-                # iterate over argument names
-                # splice the array to skip the first argument and start at index 1
-                for index, param in enumerate(inspect.getfullargspec(func)[0][1:], 1):
-                    if index >= 0 and index < len(args):
-                        error_message += ", {0} {1}".format(param, args[index])
-                    else:
-                        error_message += ", {0}".format(param)
-                error_message += ", error {0}".format(error)
-                logger.info(error_message)
-
+                arguments = {**defaults, **dict(zip(params, args, strict=False)), **kwargs}
+                attribute = "/".join(
+                    str(arguments[param]) for param in params[1:] if param != "oab_type" and param in arguments
+                )
+                count_missing_attribute(func.__name__, attribute, arguments.get("oab_type", ""), args[0].get(ID), error)
                 return return_value
 
         return wrapper
@@ -244,7 +325,7 @@ def try_get_year_from_property_timestamp(entity_dict: Dict, property_id: str, oa
         Year from timestamp
     """
     timestr = entity_dict[CLAIMS][property_id][0][MAINSNAK][DATAVALUE][VALUE][TIME]
-    return WbTime.fromTimestr(timestr).year
+    return year_from_timestr(timestr)
 
 
 @return_on_failure("")
@@ -288,12 +369,24 @@ def try_get_significant_events(result: Dict, oab_type: Optional[str] = SIGNIFICA
         result: wikidata response
         oab_type: OpenArtBrowser type. Defaults to SIGNIFICANT_EVENT.
 
+    Returns:
+        List of JSON objects which represent significant events
+    """
+    return map_significant_events(result[CLAIMS][PROPERTY_NAME_TO_PROPERTY_ID[SIGNIFICANT_EVENT]], result[ID])
+
+
+def map_significant_events(statements: List[Dict], qid: str) -> List[Dict]:
+    """Maps the 'significant event' statements of an entity to a list of dicts
+
+    Args:
+        statements: Claims of the property 'significant event'
+        qid: Qid of the entity, important for logging
+
     Returns:
         List of JSON objects which represent significant events
     """
     significant_events = []
-    qid = result[ID]
-    for event in result[CLAIMS][PROPERTY_NAME_TO_PROPERTY_ID[SIGNIFICANT_EVENT]]:
+    for event in statements:
         event_dict = {LABEL[SINGULAR]: event[MAINSNAK][DATAVALUE][VALUE][ID]}
         for qualifiers in event[QUALIFIERS].values():
             datatype = qualifiers[0][DATATYPE]
@@ -301,7 +394,7 @@ def try_get_significant_events(result: Dict, oab_type: Optional[str] = SIGNIFICA
             # Get property name from dict, if the name is not in the dict ignore it and take the id
             property = PROPERTY_ID_TO_PROPERTY_NAME.get(property_id, property_id)
             if datatype == TIME:
-                event_dict.update({property: WbTime.fromTimestr(qualifiers[0][DATAVALUE][VALUE][TIME]).year})
+                event_dict.update({property: year_from_timestr(qualifiers[0][DATAVALUE][VALUE][TIME])})
             elif datatype == WIKIBASE_ITEM:
                 event_dict.update(
                     {
@@ -334,3 +427,129 @@ def try_get_significant_events(result: Dict, oab_type: Optional[str] = SIGNIFICA
         significant_events.append(event_dict)
 
     return significant_events
+
+
+# Kinds of the property specs of compile_claims_mapper, they correspond to the try_get functions above
+QID_LIST = "qid_list"
+FIRST_QID = "first_qid"
+VALUE_LIST = "value_list"
+FIRST_VALUE = "first_value"
+DIMENSION_VALUE = "dimension_value"
+DIMENSION_UNIT = "dimension_unit"
+YEAR = "year"
+SIGNIFICANT_EVENTS = "significant_events"
+
+_qid_pattern = re.compile(QID_PATTERN)
+
+
+# The map functions of the kinds get the statements of one property, the qid of the entity and the property id.
+# They raise an exception if the attribute is malformed
+def _map_qid_list(statements: List[Dict], qid: str, property_id: str) -> List[str]:
+    return list({statement[MAINSNAK][DATAVALUE][VALUE][ID] for statement in statements})
+
+
+def _map_first_qid(statements: List[Dict], qid: str, property_id: str) -> str:
+    return statements[0][MAINSNAK][DATAVALUE][VALUE][ID]
+
+
+def _map_value_list(statements: List[Dict], qid: str, property_id: str) -> List[Any]:
+    return [statement[MAINSNAK][DATAVALUE][VALUE] for statement in statements]
+
+
+def _map_first_value(statements: List[Dict], qid: str, property_id: str) -> Any:
+    return statements[0][MAINSNAK][DATAVALUE][VALUE]
+
+
+def _map_dimension_value(statements: List[Dict], qid: str, property_id: str) -> float:
+    return float(statements[0][MAINSNAK][DATAVALUE][VALUE][AMOUNT])
+
+
+def _map_dimension_unit(statements: List[Dict], qid: str, property_id: str) -> str:
+    unit_qid = statements[0][MAINSNAK][DATAVALUE][VALUE][UNIT].replace(WIKIDATA_ENTITY_URL, "")
+    if _qid_pattern.match(unit_qid):  # This regex check is necessary, we had references with wrong format
+        return unit_qid
+    logger.error(
+        "Missing attribute on item {0}, property {1}, Unit was provided but isn't a QID reference".format(
+            qid, property_id
+        )
+    )
+    return ""
+
+
+def _map_year(statements: List[Dict], qid: str, property_id: str) -> int:
+    return year_from_timestr(statements[0][MAINSNAK][DATAVALUE][VALUE][TIME])
+
+
+def _map_significant_events(statements: List[Dict], qid: str, property_id: str) -> List[Dict]:
+    return map_significant_events(statements, qid)
+
+
+# Map function and default value per kind
+CLAIM_KINDS = {
+    QID_LIST: (_map_qid_list, []),
+    FIRST_QID: (_map_first_qid, ""),
+    VALUE_LIST: (_map_value_list, []),
+    FIRST_VALUE: (_map_first_value, ""),
+    DIMENSION_VALUE: (_map_dimension_value, ""),
+    DIMENSION_UNIT: (_map_dimension_unit, ""),
+    YEAR: (_map_year, ""),
+    SIGNIFICANT_EVENTS: (_map_significant_events, []),
+}
+
+
+def _without_blocked(map_function: Callable, blocked: frozenset) -> Callable:
+    def map_and_filter(statements: List[Dict], qid: str, property_id: str) -> List[str]:
+        return list(set(map_function(statements, qid, property_id)) - blocked)
+
+    return map_and_filter
+
+
+def compile_claims_mapper(
+    specs: List[Tuple[str, str, str]], blocklist: Optional[Iterable[str]] = None
+) -> Callable[[Dict, str], Dict[str, Any]]:
+    """Compiles a table of property specs into one function which maps all claims of an entity
+
+    The specs are grouped by property id once, so the returned function looks up every property of an entity
+    a single time and fills all fields which are taken from it. The values are the same as the ones of the
+    corresponding try_get functions, including the default value if the attribute is missing or malformed.
+
+    Args:
+        specs: Tuples of the output field, the property name (see PROPERTY_NAME_TO_PROPERTY_ID) and the kind
+            e. g. (CLASS[PLURAL], CLASS[SINGULAR], QID_LIST)
+        blocklist: Qids which are removed from the QID_LIST and VALUE_LIST fields. Defaults to None.
+
+    Returns:
+        Function which takes an entity and the oab type (for logging) and returns a dict of all fields
+    """
+    blocked = frozenset(blocklist or [])
+    properties: Dict[str, List[Tuple[str, str, Callable, Any]]] = {}
+    for field, property_name, kind in specs:
+        map_function, default = CLAIM_KINDS[kind]
+        if blocked and kind in (QID_LIST, VALUE_LIST):
+            map_function = _without_blocked(map_function, blocked)
+        properties.setdefault(PROPERTY_NAME_TO_PROPERTY_ID[property_name], []).append(
+            (field, kind, map_function, default)
+        )
+    compiled = list(properties.items())
+
+    def map_claims(entity_dict: Dict, oab_type: str) -> Dict[str, Any]:
+        qid = entity_dict[ID]
+        claims = entity_dict.get(CLAIMS, {})
+        mapped = {}
+        for property_id, fields in compiled:
+            statements = claims.get(property_id)
+            for field, kind, map_function, default in fields:
+                if statements is None:
+                    # Missing properties are the common case, so they are handled without raising an exception
+                    count_missing_attribute(kind, property_id, oab_type, qid)
+                    mapped[field] = default.copy() if isinstance(default, list) else default
+                    continue
+                try:
+                    mapped[field] = map_function(statements, qid, property_id)
+                except Exception as error:
+                    count_missing_attribute(kind, property_id, oab_type, qid, error)
+                    # Copy list defaults, they must not be shared between the entities
+                    mapped[field] = default.copy() if isinstance(default, list) else default
+        return mapped
+
+    return map_claims
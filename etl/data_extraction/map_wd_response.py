@@ -188,13 +188,12 @@ def try_map_response_to_location(response):
         lat = coordinate[cnst.LATITUDE[cnst.SINGULAR]]
         lon = coordinate[cnst.LONGITUDE[cnst.SINGULAR]]
     except Exception as error:
-        logger.info(
-            "Error on item {0}, property {1}, type {2}, error {3}".format(
-                response[cnst.ID],
-                cnst.PROPERTY_NAME_TO_PROPERTY_ID[cnst.COORDINATE],
-                cnst.LOCATION[cnst.SINGULAR],
-                error,
-            )
+        map_wd_attribute.count_missing_attribute(
+            "try_map_response_to_location",
+            cnst.PROPERTY_NAME_TO_PROPERTY_ID[cnst.COORDINATE],
+            cnst.LOCATION[cnst.SINGULAR],
+            response[cnst.ID],
+            error,
         )
         lat = ""
         lon = ""
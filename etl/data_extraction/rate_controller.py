@@ -0,0 +1,274 @@
+"""Adaptive request rate control per host
+
+Every host (wikidata, the wikipedias, ...) gets an AIMD (additive increase, multiplicative decrease)
+controller which tunes how many requests are in flight and how far apart requests are started.
+Successful fast responses slowly raise the limit, throttling signals (429/503, maxlag errors,
+Retry-After headers, slow responses) cut it in half and pause the host for the time the server asked for.
+So the extraction runs at the highest throughput the API tolerates instead of sleeping a fixed minute
+after every transient error.
+"""
+
+import multiprocessing
+import threading
+import time
+from collections import Counter
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from data_extraction.constants import (
+    MAX_CONCURRENT_REQUESTS,
+    RATE_DECREASE_FACTOR,
+    RATE_LATENCY_TARGET,
+    RATE_MIN_BACKOFF,
+    RATE_MIN_CONCURRENCY,
+    SLEEP_TIME,
+)
+
+# Gap in seconds between request starts after the first throttling, doubled on every further throttling
+INITIAL_INTERVAL = 0.1
+
+# Default upper bound of requests in flight per host in this process
+max_concurrency_per_host = MAX_CONCURRENT_REQUESTS
+
+# Semaphores by host which worker processes share, so all of them together keep MAX_CONCURRENT_REQUESTS.
+# Set in the workers with use_shared_host_limits
+_shared_host_limits: Dict[str, Any] = {}
+
+
+class RateController:
+    """AIMD controller for the requests to one host
+
+    Callers wrap every request in acquire and release and report the outcome with on_success or back_off.
+    The controller can be used from several threads.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        max_concurrency: Optional[int] = None,
+        min_concurrency: Optional[int] = RATE_MIN_CONCURRENCY,
+        decrease_factor: Optional[float] = RATE_DECREASE_FACTOR,
+        latency_target: Optional[float] = RATE_LATENCY_TARGET,
+        min_backoff: Optional[float] = RATE_MIN_BACKOFF,
+        shared_limit: Optional[Any] = None,
+    ) -> None:
+        """Creates a controller which starts at the maximum concurrency
+
+        Args:
+            host: Host name, only used for the metrics
+            max_concurrency: Upper bound of requests in flight. Defaults to max_concurrency_per_host.
+            min_concurrency: Lower bound of requests in flight. Defaults to RATE_MIN_CONCURRENCY.
+            decrease_factor: Factor the in-flight limit is multiplied with on throttling.
+                Defaults to RATE_DECREASE_FACTOR.
+            latency_target: Responses slower than this are treated as throttling. Defaults to RATE_LATENCY_TARGET.
+            min_backoff: First back-off in seconds if the server sent no Retry-After. Defaults to RATE_MIN_BACKOFF.
+            shared_limit: Semaphore of the host which is shared with other processes, a request also needs one
+                of its slots. Defaults to None.
+        """
+        if max_concurrency is None:
+            max_concurrency = max_concurrency_per_host
+        self.host = host
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.min_backoff = min_backoff
+        self.shared_limit = shared_limit
+        self.limit = float(max_concurrency)
+        self.interval = 0.0
+        self.in_flight = 0
+        self._next_start = 0.0
+        self._last_decrease = float("-inf")
+        self._consecutive_failures = 0
+        self._condition = threading.Condition()
+        self.counters = Counter()
+        self.decreases_by_reason = Counter()
+
+    def acquire(self) -> None:
+        """Blocks until the host accepts another request
+
+        A request may start if fewer requests than the current limit are in flight,
+        the host isn't paused and the interval since the last start passed. With a shared limit it also waits
+        for a free slot of the other processes.
+        """
+        with self._condition:
+            waited_since = time.monotonic()
+            while True:
+                now = time.monotonic()
+                if self.in_flight < int(self.limit):
+                    if now >= self._next_start:
+                        break
+                    self._condition.wait(self._next_start - now)
+                else:
+                    self._condition.wait()
+            self.in_flight += 1
+            self._next_start = now + self.interval
+            self.counters["requests"] += 1
+            self.counters["waited_seconds"] += now - waited_since
+        if self.shared_limit is not None:
+            # Taken outside of the lock, so the other threads of this process aren't blocked meanwhile
+            waited_since = time.monotonic()
+            self.shared_limit.acquire()
+            with self._condition:
+                self.counters["waited_seconds"] += time.monotonic() - waited_since
+
+    def release(self) -> None:
+        """Frees the slot of a finished request"""
+        if self.shared_limit is not None:
+            self.shared_limit.release()
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency: float) -> None:
+        """Reports a successful response, raises the limit additively if the response was fast
+
+        Args:
+            latency: Seconds the request took
+        """
+        with self._condition:
+            self.counters["successes"] += 1
+            self._consecutive_failures = 0
+            if latency > self.latency_target:
+                self.counters["slow_responses"] += 1
+                self._decrease("slow response")
+            else:
+                # Additive increase of about one request per round trip of the whole window
+                if self.limit < self.max_concurrency:
+                    self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                    self.counters["increases"] += 1
+                self.interval = self.interval / 2 if self.interval > INITIAL_INTERVAL / 8 else 0.0
+            self._condition.notify_all()
+
+    def back_off(
+        self, reason: str, retry_after: Optional[float] = None, max_backoff: Optional[float] = SLEEP_TIME
+    ) -> None:
+        """Reports a throttling signal or an error, decreases the limit and pauses the host
+
+        Args:
+            reason: Kind of the signal e. g. 'HTTP 429' or 'maxlag', counted in the metrics
+            retry_after: Seconds the server asked to wait. If None an exponential back-off is used
+            max_backoff: Upper bound of the exponential back-off. Defaults to SLEEP_TIME.
+        """
+        with self._condition:
+            self.counters["back_offs"] += 1
+            self._consecutive_failures += 1
+            if retry_after is None:
+                retry_after = min(self.min_backoff * 2 ** (self._consecutive_failures - 1), max_backoff)
+            else:
+                self.counters["retry_after_received"] += 1
+            now = time.monotonic()
+            pause_until = now + retry_after
+            if pause_until > self._next_start:
+                self.counters["paused_seconds"] += pause_until - max(self._next_start, now)
+                self._next_start = pause_until
+            self._decrease(reason)
+            self._condition.notify_all()
+
+    def _decrease(self, reason: str) -> None:
+        """Multiplicative decrease, has to be called with the lock held
+
+        All requests in flight during a throttling usually fail together, so only one decrease
+        per latency target is applied to not collapse the limit on a single event.
+        """
+        now = time.monotonic()
+        if now - self._last_decrease < self.latency_target:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+        self.interval = min(max(self.interval * 2, INITIAL_INTERVAL), self.latency_target)
+        self.counters["decreases"] += 1
+        self.decreases_by_reason[reason] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Current state and decision counters of the controller
+
+        Returns:
+            A dict with the current limit, interval, requests in flight, the counters
+            and the number of decreases per reason
+        """
+        with self._condition:
+            return {
+                "limit": round(self.limit, 2),
+                "interval": round(self.interval, 3),
+                "in_flight": self.in_flight,
+                **{name: round(value, 2) for name, value in self.counters.items()},
+                "decreases_by_reason": dict(self.decreases_by_reason),
+            }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header which contains either seconds or a HTTP date
+
+    Args:
+        value: Value of the header, None if the header is missing
+
+    Returns:
+        Seconds to wait or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def create_shared_host_limits(urls: List[str], max_concurrency: int = MAX_CONCURRENT_REQUESTS) -> Dict[str, Any]:
+    """Creates semaphores for the hosts of the urls which are passed to worker processes
+
+    Args:
+        urls: URLs of the hosts the workers request
+        max_concurrency: Requests in flight of all processes together per host. Defaults to MAX_CONCURRENT_REQUESTS.
+
+    Returns:
+        The semaphores by host, see use_shared_host_limits
+    """
+    return {urlsplit(url).netloc: multiprocessing.BoundedSemaphore(max_concurrency) for url in urls}
+
+
+def use_shared_host_limits(limits: Dict[str, Any]) -> None:
+    """Makes the controllers of this process take the shared semaphores of their host, called in a worker process
+
+    Args:
+        limits: Semaphores by host from create_shared_host_limits
+    """
+    _shared_host_limits.update(limits)
+
+
+def get_rate_controller(url: str, **kwargs) -> RateController:
+    """Returns the process-wide controller for the host of the url, creates it on first use
+
+    Args:
+        url: URL of the request
+        kwargs: Arguments of RateController, only used when the controller is created
+
+    Returns:
+        The rate controller of the host
+    """
+    host = urlsplit(url).netloc
+    with _controllers_lock:
+        if host not in _controllers:
+            _controllers[host] = RateController(host, shared_limit=_shared_host_limits.get(host), **kwargs)
+        return _controllers[host]
+
+
+def log_rate_controller_stats(logging: Any) -> None:
+    """Writes the metrics of all rate controllers to the log
+
+    Args:
+        logging (Logger): Logger from the calling script
+    """
+    with _controllers_lock:
+        controllers = list(_controllers.values())
+    for controller in controllers:
+        logging.info(f"Rate controller stats for {controller.host}: {controller.metrics()}")
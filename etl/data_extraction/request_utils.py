@@ -1,15 +1,36 @@
 """Helper functions for requests"""
 
 import datetime
+import threading
 import time
-from typing import Any, Dict, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
 from urllib.error import HTTPError
 
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util import Retry
 
-from data_extraction.constants import MAX_LAG, SLEEP_TIME, TIMEOUT
+from data_extraction.constants import (
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    MAX_CONCURRENT_REQUESTS,
+    MAX_LAG,
+    SLEEP_TIME,
+    TIMEOUT,
+)
+from data_extraction.rate_controller import get_rate_controller, parse_retry_after
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Status codes with which the wikimedia servers signal that the client should slow down
+THROTTLE_STATUS_CODES = (403, 429, 503)
+
+# Process-wide session, created on first use by get_session
+_session = None
+_session_lock = threading.Lock()
 
 
 # ruff: noqa: C901
@@ -27,6 +48,11 @@ def send_http_request(
 ) -> Dict:
     """Send a HTTP request to an endpoint
 
+    The requests are paced by the rate controller of the host. Throttling responses (403, 429, 503),
+    server errors, maxlag errors and other failures pause the host for the time given in the Retry-After header
+    or the reported lag, otherwise an exponential back-off up to sleep_time is used. Other client errors
+    (e. g. 400, 404, 414) don't change on a retry, they are raised without slowing down the host.
+
     Args:
         parameters: Dict of params
         header: HTTP header to send as dict
@@ -37,36 +63,46 @@ def send_http_request(
         items: List of qids to extract, relevant for wikidata extraction. Defaults to empty list.
         abstracts: True if wikipedia extracts are extracted. Defaults to False.
         timeout: Seconds how long the request should wait until it times out. Defaults to TIMEOUT.
-        sleep_time: How long should the process sleep until trying again. Defaults to SLEEP_TIME.
+        sleep_time: Maximum back-off if the server doesn't say how long to wait. Defaults to SLEEP_TIME.
         maxlag: If the server exceeds maxlag seconds then the HTTP request should try
             again in maxlag seconds. Defaults to MAX_LAG.
 
+    Raises:
+        requests.HTTPError: If the server answers with a client error which isn't a throttling response
+
     Returns:
         A dict containing the response from the called endpoint
     """
     if items is None:
         items = []
+    controller = get_rate_controller(url)
     while True:
         try:
             t0 = time.time()
-            response = requests_retry_session().get(
-                url,
-                params=parameters,
-                headers=header,
-                timeout=timeout,
-            )
+            controller.acquire()
+            try:
+                response = get_session().get(
+                    url,
+                    params=parameters,
+                    headers=header,
+                    timeout=timeout,
+                )
+            finally:
+                controller.release()
+            latency = response.elapsed.total_seconds()
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
             logging.info(f"Response received {response.status_code}")
-            if response.status_code == 403:
-                logging.warning(f"Received 403 Forbidden for items: {items}. Sleeping {sleep_time}s and retrying.")
-                time.sleep(sleep_time)
-                # increase sleep_time to back off for subsequent retries
-                sleep_time = min(sleep_time * 2, 3600)
+            if response.status_code in THROTTLE_STATUS_CODES:
+                logging.warning(f"Received HTTP {response.status_code} for items: {items}. Backing off and retrying.")
+                controller.back_off(f"HTTP {response.status_code}", retry_after, sleep_time)
                 continue
-            if response.status_code >= 400:
-                logging.error(f"Received HTTP {response} for items: {items}. Sleeping {sleep_time}s and retrying.")
-                time.sleep(sleep_time)
-                sleep_time = min(sleep_time * 2, 3600)
+            if response.status_code >= 500:
+                logging.error(f"Received HTTP {response} for items: {items}. Backing off and retrying.")
+                controller.back_off(f"HTTP {response.status_code}", retry_after, sleep_time)
                 continue
+            if response.status_code >= 400:
+                logging.error(f"Received HTTP {response} for items: {items}. Not retrying the request.")
+                response.raise_for_status()
             # parse JSON only for successful responses
             response = response.json()
             if abstracts and "batchcomplete" not in response:
@@ -77,22 +113,28 @@ def send_http_request(
                 raise RuntimeError
             if "error" in response:
                 # ToDo: more specific error handling since unknown ids error throws a different message
-                print(
-                    f"The maxlag of the server exceeded ({maxlag} seconds) waiting a minute before retry. "
-                    f"Response: {response}",
-                    flush=True,
-                )
-                time.sleep(sleep_time)
+                if response["error"].get("code") == "maxlag":
+                    # The server reports its current lag, wait at least that long if there is no Retry-After
+                    lag = response["error"].get("lag")
+                    print(
+                        f"The maxlag of the server exceeded ({lag} seconds lag, maxlag {maxlag} seconds) "
+                        f"backing off before retry. Response: {response}",
+                        flush=True,
+                    )
+                    controller.back_off("maxlag", retry_after if retry_after is not None else lag, sleep_time)
+                else:
+                    print(f"The server returned an error, backing off before retry. Response: {response}", flush=True)
+                    controller.back_off("error response", retry_after, sleep_time)
                 continue
             else:
+                controller.on_success(latency)
                 break  # wenn die response richtig aussieht dann aus der schleife springen
         except HTTPError as http_error:
             logging.error(
                 f"Request error. Time: {datetime.datetime.now()}. HTTP-Error: {http_error}. Following items "
                 f"couldn't be loaded: {items}"
             )
-            time.sleep(sleep_time)
-            sleep_time *= 2  # increase sleep time if this happens again
+            controller.back_off("HTTP error", max_backoff=sleep_time)
             continue
         except NameError as nameError:
             logging.error(
@@ -100,10 +142,10 @@ def send_http_request(
                 f"couldn't be loaded: {items}"
             )
             logging.error(
-                "The request's response wasn't defined. Something went wrong (see above). Sleeping for one "
-                "minute and doubling the timeout. After that retry the request"
+                "The request's response wasn't defined. Something went wrong (see above). Backing off "
+                "and doubling the timeout. After that retry the request"
             )
-            time.sleep(sleep_time)
+            controller.back_off("undefined response", max_backoff=sleep_time)
             timeout *= 2
             if timeout >= initial_timeout * 8:
                 logging.error("The server doesn't respond to this request. Skipping chunk")
@@ -112,12 +154,14 @@ def send_http_request(
                 continue
         except RuntimeError as runtimeError:
             raise runtimeError
+        except requests.HTTPError:
+            raise
         except Exception as error:
             print(
                 f"Unknown error. Time: {datetime.datetime.now()}. Error: {error}. "
                 f"Following items couldn't be loaded: {items}"
             )
-            time.sleep(sleep_time)
+            controller.back_off(type(error).__name__, max_backoff=sleep_time)
             continue
 
         finally:
@@ -132,6 +176,8 @@ def requests_retry_session(
     backoff_factor: Optional[float] = 0.3,
     status_forcelist: Optional[Tuple[int, int, int]] = (500, 502, 504),
     session: Optional[Any] = None,
+    pool_connections: Optional[int] = HTTP_POOL_CONNECTIONS,
+    pool_maxsize: Optional[int] = HTTP_POOL_MAXSIZE,
 ) -> Any:
     """Request session with retry possibility
 
@@ -140,6 +186,8 @@ def requests_retry_session(
         backoff_factor: Backoff factor for next try. Defaults to 0.3.
         status_forcelist: Retry on given status codes. Defaults to (500, 502, 504).
         session (Session): Session object. Defaults to None.
+        pool_connections: Number of hosts for which a connection pool is kept. Defaults to HTTP_POOL_CONNECTIONS.
+        pool_maxsize: Number of kept-alive connections per host. Defaults to HTTP_POOL_MAXSIZE.
 
     Returns:
         Session with retry possibility
@@ -154,8 +202,123 @@ def requests_retry_session(
         connect=retries,
         backoff_factor=backoff_factor,
         status_forcelist=status_forcelist,
+        # Throttling responses are returned to the caller, send_http_request hands them to the rate controller
+        respect_retry_after_header=False,
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
     return session
+
+
+def get_session(
+    pool_connections: Optional[int] = HTTP_POOL_CONNECTIONS,
+    pool_maxsize: Optional[int] = HTTP_POOL_MAXSIZE,
+) -> requests.Session:
+    """Returns the process-wide HTTP session which is shared by all wikidata, wikipedia,
+    SPARQL and youtube requests
+
+    The session keeps the connections alive in a pool per host, so consecutive requests to the same host
+    reuse the TCP connection and the TLS session instead of doing a new handshake for every request.
+    The pool sizes only take effect on the first call which creates the session.
+
+    Args:
+        pool_connections: Number of hosts for which a connection pool is kept. Defaults to HTTP_POOL_CONNECTIONS.
+        pool_maxsize: Number of kept-alive connections per host. Defaults to HTTP_POOL_MAXSIZE.
+
+    Returns:
+        Session with retry possibility and connection pooling
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests_retry_session(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        return _session
+
+
+def get_session_stats() -> Dict[str, Dict[str, int]]:
+    """Statistics about the connection reuse of the shared session per host
+
+    A new connection to a https host means a TCP and a TLS handshake, every other request reused
+    a kept-alive connection.
+
+    Returns:
+        A dict with the host as key and the number of requests, new connections (handshakes)
+        and reused connections as value. The key 'total' contains the sums over all hosts.
+    """
+    stats = {}
+    total = {"requests": 0, "connections": 0, "tls_handshakes": 0, "reused_connections": 0}
+    if _session is None:
+        return {"total": total}
+    for adapter in set(_session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host_stats = {
+                "requests": pool.num_requests,
+                "connections": pool.num_connections,
+                "tls_handshakes": pool.num_connections if pool.scheme == "https" else 0,
+                "reused_connections": max(pool.num_requests - pool.num_connections, 0),
+            }
+            stats[pool.host] = host_stats
+            for name, value in host_stats.items():
+                total[name] += value
+    stats["total"] = total
+    return stats
+
+
+def log_session_stats(logging: Any) -> None:
+    """Writes the connection reuse statistics of the shared session to the log
+
+    Args:
+        logging (Logger): Logger from the calling script
+    """
+    for host, host_stats in get_session_stats().items():
+        logging.info(
+            f"HTTP session stats for {host}: {host_stats['requests']} requests, "
+            f"{host_stats['connections']} new connections ({host_stats['tls_handshakes']} TLS handshakes), "
+            f"{host_stats['reused_connections']} reused connections"
+        )
+
+
+def concurrent_map(
+    func: Callable[[T], R],
+    iterable: Iterable[T],
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+) -> Iterator[Tuple[T, R]]:
+    """Calls func for every element of iterable with up to max_workers calls in flight at the same time
+
+    The results are yielded in the order of the input elements, so consumers behave exactly like
+    in a sequential for-loop. Only a small window of elements is consumed ahead of the yielded result
+    which keeps the memory usage bounded for large inputs (e. g. generators over millions of qids).
+    The rate controller of the host still paces the requests sent by func.
+
+    Args:
+        func: Function which is called with each element, usually a function sending a HTTP request
+        iterable: Elements to call func with e. g. chunks of qids
+        max_workers: Number of calls in flight. Defaults to MAX_CONCURRENT_REQUESTS.
+
+    Yields:
+        Tuples of the element and the result of func for that element
+
+    Examples:
+        for chunk, response in concurrent_map(wikidata_entity_request, chunks(qids, 50)):
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = deque()
+    try:
+        for element in iterable:
+            pending.append((element, executor.submit(func, element)))
+            # Keep twice as many calls submitted as workers exist so the workers
+            # don't idle while the consumer processes the previous result
+            if len(pending) >= 2 * max_workers:
+                element, future = pending.popleft()
+                yield element, future.result()
+        while pending:
+            element, future = pending.popleft()
+            yield element, future.result()
+    finally:
+        # Cancel not started calls if the consumer stops early e. g. in dev mode
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,386 @@
+"""Persistent on-disk caches for API responses
+
+The caches are SQLite databases in the cache directory of the etl folder.
+Every entry stores the revision of the cached object, so an entry can either be served
+until its time to live expired or as long as the revision on the server didn't change.
+If the database exceeds its maximum size the least recently used entries are evicted.
+
+The size of all values is stored in the database and updated in the transaction which writes the entries, so
+the worker processes which share a cache also share its maximum size. The access times of read entries are
+buffered and written in batches, a read doesn't commit a transaction.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from data_extraction.constants import (
+    CACHE_ACCESS_FLUSH_SIZE,
+    ENTITIES,
+    ENTITY_CACHE_FILENAME,
+    ENTITY_CACHE_MAX_SIZE,
+    ENTITY_CACHE_TTL,
+    EXTRACT_CACHE_FILENAME,
+    EXTRACT_CACHE_MAX_SIZE,
+    EXTRACT_CACHE_TTL,
+    ID,
+    LASTREVID,
+)
+
+CACHE_DIRECTORY = Path(__file__).parent.parent.absolute() / "cache"
+MISSING = "missing"
+
+
+class ResponseCache:
+    """Key-value cache backed by a SQLite table with a time to live and size-based LRU eviction
+
+    The cache can be used from several threads, all database operations are serialized by a lock. Several
+    processes can open the same database, SQLite serializes their writes.
+    """
+
+    def __init__(self, path: Path, ttl: Optional[float], max_size: int) -> None:
+        """Opens the cache database, creates it if it doesn't exist
+
+        Args:
+            path: Path of the SQLite database file
+            ttl: Seconds an entry is served without knowing its current revision. None disables the expiry
+            max_size: Maximum size of all cached values in bytes
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._accessed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, revision INTEGER, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS cache_size (size INTEGER NOT NULL)")
+        self._connection.commit()
+        self._connection.execute("BEGIN IMMEDIATE")
+        self._connection.execute(
+            "INSERT INTO cache_size SELECT COALESCE(SUM(size), 0) FROM entries "
+            "WHERE NOT EXISTS (SELECT 1 FROM cache_size)"
+        )
+        self._connection.commit()
+
+    def get_many(self, keys: List[str], revisions: Optional[Dict[str, int]] = None) -> Dict[str, Tuple[str, int]]:
+        """Returns the valid cache entries for the given keys
+
+        Args:
+            keys: Keys to look up
+            revisions: Current revisions of the keys. If a revision is given for a key, the entry
+                is only valid if the cached revision matches, regardless of the time to live
+
+        Returns:
+            A dict with the found keys and tuples of the cached value and its revision
+        """
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key_chunk in _sqlite_chunks(keys):
+                rows = self._connection.execute(
+                    f"SELECT key, value, revision, fetched_at FROM entries WHERE key IN ({_placeholders(key_chunk)})",
+                    key_chunk,
+                ).fetchall()
+                for key, value, revision, fetched_at in rows:
+                    if revisions is not None and key in revisions:
+                        if revisions[key] != revision:
+                            continue
+                    elif self.ttl is not None and now - fetched_at > self.ttl:
+                        continue
+                    found[key] = (value, revision)
+            self._accessed.update(dict.fromkeys(found, now))
+            if len(self._accessed) >= CACHE_ACCESS_FLUSH_SIZE:
+                self._flush_accessed()
+                self._connection.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            self.bytes_saved += sum(len(value) for value, _revision in found.values())
+        return found
+
+    def get_expired(self, keys: List[str]) -> Dict[str, Tuple[str, int]]:
+        """Returns the entries for the given keys regardless of their time to live, e. g. to check their revisions
+
+        The entries are neither counted as hits nor as misses, see revalidate
+
+        Args:
+            keys: Keys to look up
+
+        Returns:
+            A dict with the found keys and tuples of the cached value and its revision
+        """
+        found = {}
+        with self._lock:
+            for key_chunk in _sqlite_chunks(keys):
+                rows = self._connection.execute(
+                    f"SELECT key, value, revision FROM entries WHERE key IN ({_placeholders(key_chunk)})",
+                    key_chunk,
+                ).fetchall()
+                found.update((key, (value, revision)) for key, value, revision in rows)
+        return found
+
+    def revalidate(self, entries: Dict[str, str]) -> None:
+        """Serves expired entries whose revision is still current for another time to live
+
+        The entries were counted as misses by get_many, now they are counted as hits.
+
+        Args:
+            entries: Keys and cached values of the revalidated entries
+        """
+        if not entries:
+            return
+        now = time.time()
+        with self._lock:
+            for key_chunk in _sqlite_chunks(list(entries)):
+                self._connection.execute(
+                    f"UPDATE entries SET fetched_at = ?, accessed_at = ? WHERE key IN ({_placeholders(key_chunk)})",
+                    [now, now, *key_chunk],
+                )
+            self._connection.commit()
+            self.hits += len(entries)
+            self.misses -= len(entries)
+            self.bytes_saved += sum(len(value) for value in entries.values())
+
+    def put_many(self, entries: Iterable[Tuple[str, str, Optional[int]]]) -> None:
+        """Stores entries in the cache and evicts the least recently used entries if the cache is too big
+
+        Args:
+            entries: Tuples of key, value and revision
+        """
+        now = time.time()
+        rows = [(key, revision, value, len(value), now, now) for key, value, revision in entries]
+        if not rows:
+            return
+        with self._lock:
+            # The write lock of the database is taken before the size is read, so no other process changes it
+            self._connection.execute("BEGIN IMMEDIATE")
+            self._flush_accessed()
+            replaced_size = 0
+            for key_chunk in _sqlite_chunks([row[0] for row in rows]):
+                replaced_size += self._connection.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM entries WHERE key IN ({_placeholders(key_chunk)})",
+                    key_chunk,
+                ).fetchone()[0]
+            self._connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)", rows)
+            size = self._add_size(sum(row[3] for row in rows) - replaced_size)
+            if size > self.max_size:
+                self._evict(size)
+            self._connection.commit()
+
+    def _add_size(self, delta: int) -> int:
+        """Adds to the stored size of all values and returns the new size. Has to be called in a transaction"""
+        return self._connection.execute("UPDATE cache_size SET size = size + ? RETURNING size", (delta,)).fetchone()[0]
+
+    def _flush_accessed(self) -> None:
+        """Writes the buffered access times, the caller commits. Has to be called with the lock held"""
+        if not self._accessed:
+            return
+        self._connection.executemany(
+            "UPDATE entries SET accessed_at = ? WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in self._accessed.items()],
+        )
+        self._accessed.clear()
+
+    def _evict(self, size: int) -> None:
+        """Deletes expired entries and then the least recently used entries until
+        the cache uses less than 90 % of its maximum size. Has to be called with the lock held in a transaction
+
+        Args:
+            size: The stored size of all values
+        """
+        if self.ttl is not None:
+            expired_at = time.time() - self.ttl
+            expired_size = self._connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries WHERE fetched_at < ?", (expired_at,)
+            ).fetchone()[0]
+            self._connection.execute("DELETE FROM entries WHERE fetched_at < ?", (expired_at,))
+            size = self._add_size(-expired_size)
+        target_size = self.max_size * 0.9
+        while size > target_size:
+            rows = self._connection.execute("SELECT key, size FROM entries ORDER BY accessed_at LIMIT 1000").fetchall()
+            if not rows:
+                break
+            evicted = []
+            evicted_size = 0
+            for key, entry_size in rows:
+                evicted.append(key)
+                evicted_size += entry_size
+                if size - evicted_size <= target_size:
+                    break
+            self._connection.execute(f"DELETE FROM entries WHERE key IN ({_placeholders(evicted)})", evicted)
+            size = self._add_size(-evicted_size)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit and miss counters since the cache was opened
+
+        Returns:
+            A dict with the number of hits, misses, bytes which didn't have to be downloaded and the cache size
+        """
+        with self._lock:
+            size = self._connection.execute("SELECT size FROM cache_size").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "bytes_saved": self.bytes_saved, "size": size}
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_accessed()
+            self._connection.commit()
+            self._connection.close()
+
+
+class EntityCache(ResponseCache):
+    """Cache for wikidata entities of wbgetentities responses
+
+    The entities are stored per qid, the requested props and languages are part of the key
+    because they determine which parts of the entity are contained in the response.
+    """
+
+    @staticmethod
+    def entity_key(qid: str, props: List[str], language_keys: List[str]) -> str:
+        return "{0}|{1}|{2}".format(qid, ",".join(sorted(props)), ",".join(sorted(language_keys)))
+
+    def get_entities(
+        self,
+        qids: List[str],
+        props: List[str],
+        language_keys: List[str],
+        revisions: Optional[Dict[str, int]] = None,
+    ) -> Dict[str, Dict]:
+        """Returns the cached entities for the given qids
+
+        Args:
+            qids: Qids to look up
+            props: Props of the wbgetentities request
+            language_keys: Languages of the wbgetentities request
+            revisions: Current revisions of the qids, see ResponseCache.get_many
+
+        Returns:
+            A dict of the qids with a cache hit and their entity
+        """
+        keys = {self.entity_key(qid, props, language_keys): qid for qid in qids}
+        key_revisions = None
+        if revisions is not None:
+            key_revisions = {key: revisions[qid] for key, qid in keys.items() if qid in revisions}
+        found = self.get_many(list(keys), key_revisions)
+        return {keys[key]: json.loads(value) for key, (value, _revision) in found.items()}
+
+    def put_entities(self, entities: Iterable[Dict], props: List[str], language_keys: List[str]) -> None:
+        """Stores entities of a wbgetentities response
+
+        Entities which are missing on wikidata are not stored
+
+        Args:
+            entities: Entities of a wbgetentities response
+            props: Props of the wbgetentities request
+            language_keys: Languages of the wbgetentities request
+        """
+        self.put_many(
+            (
+                self.entity_key(entity[ID], props, language_keys),
+                json.dumps(entity, ensure_ascii=False, separators=(",", ":")),
+                entity.get(LASTREVID),
+            )
+            for entity in entities
+            if ID in entity and MISSING not in entity
+        )
+
+
+class ExtractCache(ResponseCache):
+    """Cache for the intro extracts of wikipedia pages
+
+    The entries are stored per language and title of the sitelink, the value contains the page id,
+    the title of the page (after redirects) and the extract. The revision is the lastrevid of the page.
+    """
+
+    @staticmethod
+    def extract_key(langkey: str, title: str) -> str:
+        return f"{langkey}|{title}"
+
+
+def _placeholders(values: List) -> str:
+    return ",".join("?" * len(values))
+
+
+def _sqlite_chunks(values: List, size: int = 500) -> Iterable[List]:
+    """Splits values into chunks which stay below the SQLite limit of host parameters"""
+    for i in range(0, len(values), size):
+        yield values[i : i + size]
+
+
+_entity_cache = None
+_entity_cache_lock = threading.Lock()
+
+
+def get_entity_cache() -> EntityCache:
+    """Returns the process-wide wikidata entity cache, opens it on first use
+
+    Returns:
+        The entity cache stored in cache/wikidata_entities.sqlite
+    """
+    global _entity_cache
+    with _entity_cache_lock:
+        if _entity_cache is None:
+            _entity_cache = EntityCache(
+                CACHE_DIRECTORY / ENTITY_CACHE_FILENAME, ENTITY_CACHE_TTL, ENTITY_CACHE_MAX_SIZE
+            )
+        return _entity_cache
+
+
+_extract_cache = None
+_extract_cache_lock = threading.Lock()
+
+
+def get_extract_cache() -> ExtractCache:
+    """Returns the process-wide wikipedia extract cache, opens it on first use
+
+    Returns:
+        The extract cache stored in cache/wikipedia_extracts.sqlite
+    """
+    global _extract_cache
+    with _extract_cache_lock:
+        if _extract_cache is None:
+            _extract_cache = ExtractCache(
+                CACHE_DIRECTORY / EXTRACT_CACHE_FILENAME, EXTRACT_CACHE_TTL, EXTRACT_CACHE_MAX_SIZE
+            )
+        return _extract_cache
+
+
+def merge_cached_entities(qids: List[str], cached: Dict[str, Dict], response: Dict) -> Dict:
+    """Merges cached entities and a wbgetentities response for the missing qids to one response
+
+    Args:
+        qids: All requested qids, the entities of the merged response keep this order
+        cached: Cached entities by qid
+        response: wbgetentities response for the qids which weren't cached
+
+    Returns:
+        A wbgetentities response containing the entities of all requested qids.
+        If the request for the missing qids failed only the cached entities are contained
+    """
+    if not cached:
+        return response
+    fetched = response[ENTITIES] if response and ENTITIES in response else {}
+    entities = {}
+    for qid in qids:
+        if qid in cached:
+            entities[qid] = cached[qid]
+        elif qid in fetched:
+            entities[qid] = fetched[qid]
+    # Keep entities which are returned with another key e. g. normalized ids
+    for key, entity in fetched.items():
+        entities.setdefault(key, entity)
+    return {**(response if isinstance(response, dict) else {}), ENTITIES: entities}
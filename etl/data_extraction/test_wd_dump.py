@@ -0,0 +1,135 @@
+"""Tests of wd_dump.py on a small synthetic wikidata dump
+
+Examples:
+    python3 -m unittest data_extraction.test_wd_dump
+"""
+
+import bz2
+import gzip
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from data_extraction import wd_dump
+
+
+def _item_value(qid: str) -> Dict:
+    return {"datavalue": {"value": {"entity-type": "item", "id": qid}, "type": "wikibase-entityid"}}
+
+
+def _entity(
+    qid: str,
+    instance_of: Optional[List[str]] = None,
+    subclass_of: Optional[List[str]] = None,
+    image: bool = False,
+    claims: Optional[Dict] = None,
+) -> Dict:
+    """A dump entity with english and french labels and sitelinks"""
+    claims = dict(claims or {})
+    for property_id, values in ((wd_dump.INSTANCE_OF, instance_of), (wd_dump.SUBCLASS_OF, subclass_of)):
+        if values:
+            claims[property_id] = [{"mainsnak": _item_value(value), "rank": "normal"} for value in values]
+    if image:
+        claims[wd_dump.IMAGE] = [{"mainsnak": {"datavalue": {"value": f"{qid}.jpg", "type": "string"}}}]
+    return {
+        "type": "item",
+        "id": qid,
+        "labels": {"en": {"language": "en", "value": f"label {qid}"}, "fr": {"language": "fr", "value": qid}},
+        "descriptions": {},
+        "claims": claims,
+        "sitelinks": {"enwiki": {"site": "enwiki", "title": qid}, "frwiki": {"site": "frwiki", "title": qid}},
+        "lastrevid": int(qid[1:]),
+    }
+
+
+# Q1 is the artwork type, Q10 and Q11 are its transitive subclasses. Q100 and Q101 are artworks, Q100 references
+# the artist Q200 and with a qualifier Q300, Q1 references its superclass Q2
+DUMP_ENTITIES = [
+    _entity("Q1", subclass_of=["Q2"]),
+    _entity("Q2"),
+    _entity("Q10", subclass_of=["Q1"]),
+    _entity("Q11", subclass_of=["Q10"]),
+    _entity(
+        "Q100",
+        instance_of=["Q1"],
+        image=True,
+        claims={"P170": [{"mainsnak": _item_value("Q200"), "qualifiers": {"P1545": [_item_value("Q300")]}}]},
+    ),
+    _entity("Q101", instance_of=["Q11"], image=True),
+    _entity("Q102", instance_of=["Q11"]),  # no image
+    _entity("Q50", subclass_of=["Q60"]),
+    _entity("Q103", instance_of=["Q50"], image=True),
+    _entity("Q200", instance_of=["Q5"]),
+    _entity("Q300"),
+]
+
+
+def _write_dump(directory: Path, suffix: str) -> Path:
+    """Writes the entities like the wikidata dumps: an array with one entity per line"""
+    content = ("[\n" + ",\n".join(json.dumps(entity) for entity in DUMP_ENTITIES) + "\n]\n").encode("utf-8")
+    path = directory / f"dump.json{suffix}"
+    if suffix == ".gz":
+        path.write_bytes(gzip.compress(content))
+    elif suffix == ".bz2":
+        path.write_bytes(bz2.compress(content))
+    else:
+        path.write_bytes(content)
+    return path
+
+
+class WdDumpTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory_handle = tempfile.TemporaryDirectory()
+        self.directory = Path(self.directory_handle.name)
+
+    def tearDown(self) -> None:
+        self.directory_handle.cleanup()
+
+    def test_open_dump(self) -> None:
+        for suffix in ("", ".gz", ".bz2"):
+            lines = list(wd_dump.iter_dump_lines(_write_dump(self.directory, suffix)))
+            self.assertEqual([json.loads(line)["id"] for line in lines], [entity["id"] for entity in DUMP_ENTITIES])
+
+    def test_parse_lines(self) -> None:
+        lines = [json.dumps(entity).encode("utf-8") for entity in DUMP_ENTITIES]
+        wd_dump._init_worker({"Q100"}, None, None, ["en"])
+        rows = wd_dump._parse_lines(lines)
+        self.assertEqual([row[0] for row in rows], ["Q100"])
+        qid, value, relations, has_image, candidate = rows[0]
+        trimmed = json.loads(value)
+        self.assertEqual(list(trimmed["labels"]), ["en"])
+        self.assertEqual(list(trimmed["sitelinks"]), ["enwiki"])
+        self.assertEqual(relations, [(wd_dump.INSTANCE_OF, "Q1")])
+        self.assertTrue(has_image)
+        self.assertFalse(candidate)
+
+        # The classes and the instances with an image are candidates of the classes filter
+        wd_dump._init_worker(None, None, None, ["en"], {"Q1"})
+        rows = wd_dump._parse_lines(lines)
+        self.assertEqual([row[0] for row in rows], ["Q1", "Q10", "Q11", "Q100", "Q101", "Q50", "Q103"])
+        self.assertTrue(all(row[4] for row in rows))
+
+    def test_load_dump_store(self) -> None:
+        dump_path = _write_dump(self.directory, ".gz")
+        store_path = self.directory / "dump.sqlite"
+        store = wd_dump.load_dump_store(
+            dump_path, store_path=store_path, classes={"Q1"}, with_references=True, processes=2
+        )
+        stored = store.get_entities([entity["id"] for entity in DUMP_ENTITIES], ["labels"], ["en"])
+        self.assertEqual(sorted(stored), sorted(["Q1", "Q2", "Q10", "Q11", "Q100", "Q101", "Q200", "Q300"]))
+        self.assertEqual(stored["Q100"]["labels"], {"en": {"language": "en", "value": "label Q100"}})
+        self.assertEqual(store.instances_of_subclasses("Q1"), ["Q100", "Q101"])
+        self.assertEqual(store.instances_of_subclasses("Q1", with_image=False), ["Q100", "Q101"])
+        source = store.source()
+        store.close()
+
+        # The store isn't built again for the same dump and filter
+        store = wd_dump.load_dump_store(dump_path, store_path=store_path, classes={"Q1"}, with_references=True)
+        self.assertEqual(store.source(), source)
+        store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,554 @@
+"""Offline wikidata entity source backed by a wikidata JSON dump
+
+The dump (latest-all.json.gz or latest-all.json.bz2 from https://dumps.wikimedia.org/wikidatawiki/entities/)
+contains one entity per line. It is streamed once through a parallel decompressor (pigz, lbzip2 or pbzip2
+if installed, otherwise the gzip/bz2 modules), the lines are parsed in a process pool and the entities
+are stored in a SQLite database in the cache directory. The entities are trimmed to the languages of the
+languageconfig.csv like the wbgetentities responses.
+
+The store only keeps the entities the extraction needs. It's built in two passes over the dump: the class pass
+keeps the transitive subclasses of the artwork types and their instances with an image, the subject pass keeps
+the entities which the claims of these entities reference (artists, movements, ...).
+
+While a dump store is active (load_wd_entities.DUMP_STORE is set) wikidata_entity_request serves the entities
+from the store and only requests the entities which aren't contained in it. The artwork qids are selected
+from the store with the P31/P279 index instead of the SPARQL query, so a full rebuild needs no API requests.
+
+Examples:
+    Load a dump into the store and extract the artworks from it
+    python3 get_wikidata_items.py --dump /data/latest-all.json.gz
+
+    Only keep the subclasses of paintings, their instances with an image and the entities they reference
+    load_dump_store(Path("latest-all.json.gz"), classes={"Q3305213"}, with_references=True)
+
+    Only keep the instances and subclasses of paintings and the entities of a qid list
+    load_dump_store(Path("latest-all.json.gz"), qids={"Q42"}, instance_of={"Q3305213"}, subclass_of={"Q3305213"})
+"""
+
+import bz2
+import datetime
+import gzip
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import threading
+from itertools import islice
+from pathlib import Path
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from data_extraction.constants import (
+    CLAIMS,
+    DUMP_BATCH_SIZE,
+    DUMP_STORE_FILENAME,
+    ID,
+    INFO,
+    LASTREVID,
+    SITELINKS,
+)
+from data_extraction.response_cache import CACHE_DIRECTORY
+from shared.constants import DESCRIPTION, LABEL, PLURAL
+from shared.utils import language_config_to_list
+
+INSTANCE_OF = "P31"
+SUBCLASS_OF = "P279"
+IMAGE = "P18"
+INDEXED_PROPERTIES = (INSTANCE_OF, SUBCLASS_OF)
+
+# Decompressors which run in their own process and write the decompressed dump to stdout,
+# the parallel ones are preferred if they are installed
+DECOMPRESSORS = {".gz": ["pigz", "gzip"], ".bz2": ["lbzip2", "pbzip2", "bzip2"]}
+
+# Keys of a dump entity which are returned for the wbgetentities props
+PROP_KEYS = {
+    LABEL[PLURAL]: [LABEL[PLURAL]],
+    DESCRIPTION[PLURAL]: [DESCRIPTION[PLURAL]],
+    CLAIMS: [CLAIMS],
+    SITELINKS: [SITELINKS],
+    INFO: [LASTREVID, "modified"],
+}
+
+ID_PATTERN = re.compile(r'"id":"([QP]\d+)"')
+
+
+def open_dump(path: Path) -> Tuple[IO[bytes], Optional[subprocess.Popen]]:
+    """Opens the dump for reading, compressed dumps are decompressed by a parallel decompressor if available
+
+    Args:
+        path: Path of the dump, .json, .json.gz or .json.bz2
+
+    Returns:
+        The binary stream of the decompressed dump and the decompressor process (None if decompressed in python)
+    """
+    for tool in DECOMPRESSORS.get(path.suffix, []):
+        executable = shutil.which(tool)
+        if executable:
+            process = subprocess.Popen([executable, "-dc", str(path)], stdout=subprocess.PIPE, bufsize=1 << 20)
+            return process.stdout, process
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb"), None
+    if path.suffix == ".bz2":
+        return bz2.open(path, "rb"), None
+    return open(path, "rb"), None
+
+
+def iter_dump_lines(path: Path) -> Iterator[bytes]:
+    """Yields the entity lines of the dump without the surrounding array brackets and trailing commas
+
+    Args:
+        path: Path of the dump
+
+    Yields:
+        One JSON encoded entity per line
+    """
+    stream, process = open_dump(path)
+    try:
+        for line in stream:
+            line = line.strip()
+            if line.endswith(b","):
+                line = line[:-1]
+            if line in (b"", b"[", b"]"):
+                continue
+            yield line
+    finally:
+        stream.close()
+        if process is not None:
+            process.wait()
+
+
+def trim_entity(entity: Dict, language_keys: List[str]) -> Dict:
+    """Reduces a dump entity to the parts a wbgetentities request with the languages and sitefilter contains
+
+    Args:
+        entity: Entity of the dump
+        language_keys: Language keys of the labels, descriptions and sitelinks
+
+    Returns:
+        The trimmed entity
+    """
+    sites = {f"{key}wiki" for key in language_keys}
+    trimmed = {key: entity[key] for key in ("type", ID, CLAIMS, LASTREVID, "modified") if key in entity}
+    for key in (LABEL[PLURAL], DESCRIPTION[PLURAL]):
+        trimmed[key] = {lang: value for lang, value in entity.get(key, {}).items() if lang in language_keys}
+    trimmed[SITELINKS] = {site: value for site, value in entity.get(SITELINKS, {}).items() if site in sites}
+    return trimmed
+
+
+def entity_references(entity: Dict) -> Set[str]:
+    """Returns the qids which the statements and qualifiers of an entity reference
+
+    Args:
+        entity: Wikidata entity
+
+    Returns:
+        The referenced qids
+    """
+    references = set()
+    for statements in entity.get(CLAIMS, {}).values():
+        for statement in statements:
+            snaks = [statement.get("mainsnak", {})]
+            for qualifiers in statement.get("qualifiers", {}).values():
+                snaks += qualifiers
+            for snak in snaks:
+                value = snak.get("datavalue", {}).get("value")
+                if isinstance(value, dict) and str(value.get(ID, "")).startswith("Q"):
+                    references.add(value[ID])
+    return references
+
+
+def statement_values(entity: Dict, property_id: str) -> List[str]:
+    """Returns the qids of the not deprecated statements of an item property
+
+    Args:
+        entity: Wikidata entity
+        property_id: Property e. g. P31
+
+    Returns:
+        List of the qids of the statements
+    """
+    values = []
+    for statement in entity.get(CLAIMS, {}).get(property_id, []):
+        if statement.get("rank") == "deprecated":
+            continue
+        try:
+            values.append(statement["mainsnak"]["datavalue"]["value"][ID])
+        except (KeyError, TypeError):
+            continue
+    return values
+
+
+# Filter of the worker processes, set by _init_worker
+_worker_filter = {}
+
+
+def _init_worker(
+    qids: Optional[Set[str]],
+    instance_of: Optional[Set[str]],
+    subclass_of: Optional[Set[str]],
+    language_keys: List[str],
+    classes: Optional[Set[str]] = None,
+) -> None:
+    _worker_filter.update(
+        qids=qids, instance_of=instance_of, subclass_of=subclass_of, language_keys=language_keys, classes=classes
+    )
+
+
+def _parse_lines(lines: List[bytes]) -> List[Tuple[str, str, List[Tuple[str, str]], bool, bool]]:
+    """Parses and filters a batch of dump lines in a worker process
+
+    An entity passes the filter if no filter is set, its qid is in the qid filter, one of its P31 values
+    is in the instance_of filter or one of its P279 values is in the subclass_of filter. With the classes filter
+    every class (an entity with a P279 statement) and every instance with an image is a candidate, the
+    subclasses of the classes are only known after the pass (see DumpEntityStore.build).
+
+    Returns:
+        Tuples of the qid, the trimmed entity as JSON, the indexed (property, value) pairs, whether the entity
+        has an image and whether it only passed as candidate of the classes filter
+    """
+    qids = _worker_filter["qids"]
+    instance_of = _worker_filter["instance_of"]
+    subclass_of = _worker_filter["subclass_of"]
+    classes = _worker_filter["classes"]
+    only_qid_filter = qids is not None and instance_of is None and subclass_of is None and classes is None
+    only_classes_filter = classes is not None and qids is None and instance_of is None and subclass_of is None
+    rows = []
+    for line in lines:
+        if only_qid_filter:
+            # Skip the JSON parsing of entities which can't pass the filter, the id is at the start of the line
+            match = ID_PATTERN.search(line[:200].decode("utf-8", "ignore"))
+            if match and match.group(1) not in qids:
+                continue
+        if only_classes_filter and f'"{SUBCLASS_OF}"'.encode() not in line and f'"{IMAGE}"'.encode() not in line:
+            # Neither a class nor an instance with an image
+            continue
+        try:
+            entity = json.loads(line)
+        except ValueError:
+            continue
+        if ID not in entity:
+            continue
+        relations = [(prop, value) for prop in INDEXED_PROPERTIES for value in statement_values(entity, prop)]
+        has_image = IMAGE in entity.get(CLAIMS, {})
+        candidate = False
+        if qids is not None or instance_of is not None or subclass_of is not None or classes is not None:
+            passes = (
+                (qids is not None and entity[ID] in qids)
+                or (instance_of is not None and any(v in instance_of for p, v in relations if p == INSTANCE_OF))
+                or (subclass_of is not None and any(v in subclass_of for p, v in relations if p == SUBCLASS_OF))
+            )
+            if not passes and classes is not None:
+                candidate = entity[ID] in classes or any(
+                    p == SUBCLASS_OF or (p == INSTANCE_OF and has_image) for p, _v in relations
+                )
+            if not passes and not candidate:
+                continue
+        trimmed = trim_entity(entity, _worker_filter["language_keys"])
+        rows.append(
+            (
+                entity[ID],
+                json.dumps(trimmed, ensure_ascii=False, separators=(",", ":")),
+                relations,
+                has_image,
+                candidate,
+            )
+        )
+    return rows
+
+
+def _batches(lines: Iterable[bytes], batch_size: int) -> Iterator[List[bytes]]:
+    iterator = iter(lines)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+class DumpEntityStore:
+    """SQLite store of the entities of a wikidata dump with an index over P31 and P279"""
+
+    def __init__(self, path: Path) -> None:
+        """Opens the store, creates it if it doesn't exist
+
+        Args:
+            path: Path of the SQLite database file
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=OFF")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entities (qid TEXT PRIMARY KEY, value TEXT NOT NULL, has_image INTEGER)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS relations (property TEXT NOT NULL, value TEXT NOT NULL, qid TEXT NOT NULL)"
+        )
+        self._connection.execute("CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS candidates (qid TEXT PRIMARY KEY)")
+        self._connection.commit()
+
+    def source(self) -> Optional[str]:
+        """Returns the description of the dump the store was built from, None if it wasn't built completely"""
+        row = self._connection.execute("SELECT value FROM metadata WHERE key = 'source'").fetchone()
+        return row[0] if row else None
+
+    def build(
+        self,
+        dump_path: Path,
+        source: str,
+        qids: Optional[Set[str]] = None,
+        instance_of: Optional[Set[str]] = None,
+        subclass_of: Optional[Set[str]] = None,
+        language_keys: Optional[List[str]] = None,
+        processes: Optional[int] = None,
+        batch_size: Optional[int] = DUMP_BATCH_SIZE,
+        classes: Optional[Set[str]] = None,
+        append: bool = False,
+    ) -> int:
+        """Replaces the content of the store with the filtered entities of the dump
+
+        Args:
+            dump_path: Path of the dump
+            source: Description of the dump and the filter, stored to detect if the store has to be rebuilt
+            qids: Keep the entities with these qids. Defaults to None (no filter).
+            instance_of: Keep the entities which are instance of one of these qids. Defaults to None (no filter).
+            subclass_of: Keep the entities which are subclass of one of these qids. Defaults to None (no filter).
+            language_keys: Languages of the labels, descriptions and sitelinks. Defaults to languageconfig.csv
+            processes: Number of parsing processes. Defaults to the number of cpus.
+            batch_size: Number of lines which are parsed per task. Defaults to DUMP_BATCH_SIZE.
+            classes: Keep these classes, their transitive subclasses and the instances of them with an image.
+                Defaults to None (no filter).
+            append: Add the entities to the content of the store instead of replacing it. Defaults to False.
+
+        Returns:
+            The number of stored entities
+        """
+        if language_keys is None:
+            language_keys = [item[0] for item in language_config_to_list()]
+        processes = processes or os.cpu_count() or 1
+        print(datetime.datetime.now(), f"Starting with loading the dump {dump_path} with {processes} processes")
+        with self._lock:
+            for table in ("entities", "relations", "metadata", "candidates") if not append else ("metadata",):
+                self._connection.execute(f"DELETE FROM {table}")
+            self._connection.execute("DROP INDEX IF EXISTS relations_value")
+            self._connection.commit()
+            count = 0
+            with multiprocessing.Pool(
+                processes,
+                initializer=_init_worker,
+                initargs=(qids, instance_of, subclass_of, language_keys, classes),
+            ) as pool:
+                for rows in pool.imap_unordered(_parse_lines, _batches(iter_dump_lines(dump_path), batch_size)):
+                    self._connection.executemany(
+                        "INSERT OR REPLACE INTO entities VALUES (?, ?, ?)",
+                        [(qid, value, has_image) for qid, value, _relations, has_image, _candidate in rows],
+                    )
+                    self._connection.executemany(
+                        "INSERT INTO relations VALUES (?, ?, ?)",
+                        [
+                            (prop, value, qid)
+                            for qid, _value, relations, _has_image, _candidate in rows
+                            for prop, value in relations
+                        ],
+                    )
+                    self._connection.executemany(
+                        "INSERT OR IGNORE INTO candidates VALUES (?)", [(row[0],) for row in rows if row[4]]
+                    )
+                    count += len(rows)
+                    print(f"Entities loaded from the dump: {count}", end="\r", flush=True)
+            self._connection.execute("CREATE INDEX relations_value ON relations (property, value)")
+            if classes is not None:
+                count -= self._remove_candidates(classes)
+            self._connection.execute("INSERT INTO metadata VALUES ('source', ?)", (source,))
+            self._connection.commit()
+        print(datetime.datetime.now(), f"Finished with loading the dump, {count} entities stored")
+        return count
+
+    def _subclasses(self, class_qids: Iterable[str]) -> Set[str]:
+        """The classes and their transitive subclasses (P279*). Has to be called with the lock held"""
+        classes = set(class_qids)
+        frontier = list(classes)
+        while frontier:
+            rows = []
+            for i in range(0, len(frontier), 500):
+                chunk = frontier[i : i + 500]
+                rows += self._connection.execute(
+                    f"SELECT qid FROM relations WHERE property = ? AND value IN ({','.join('?' * len(chunk))})",
+                    [SUBCLASS_OF, *chunk],
+                ).fetchall()
+            frontier = list({qid for (qid,) in rows if qid not in classes})
+            classes.update(frontier)
+        return classes
+
+    def _remove_candidates(self, class_qids: Set[str]) -> int:
+        """Removes the candidates of the classes filter which are neither a subclass of the classes nor an
+        instance of such a subclass with an image. Has to be called with the lock held
+
+        Returns:
+            The number of removed entities
+        """
+        self._connection.execute("CREATE TEMP TABLE kept (qid TEXT PRIMARY KEY)")
+        self._connection.executemany("INSERT INTO kept VALUES (?)", [(qid,) for qid in self._subclasses(class_qids)])
+        self._connection.execute(
+            "INSERT OR IGNORE INTO kept SELECT relations.qid FROM relations "
+            "JOIN entities ON entities.qid = relations.qid "
+            "WHERE relations.property = ? AND relations.value IN (SELECT qid FROM kept) AND entities.has_image",
+            (INSTANCE_OF,),
+        )
+        removed = self._connection.execute(
+            "DELETE FROM entities WHERE qid IN (SELECT qid FROM candidates) AND qid NOT IN (SELECT qid FROM kept)"
+        ).rowcount
+        self._connection.execute("DELETE FROM relations WHERE qid NOT IN (SELECT qid FROM entities)")
+        self._connection.execute("DELETE FROM candidates")
+        self._connection.execute("DROP TABLE kept")
+        return removed
+
+    def referenced_qids(self) -> Set[str]:
+        """Qids which the stored entities reference but which aren't stored, see entity_references"""
+        references = set()
+        with self._lock:
+            for (value,) in self._connection.execute("SELECT value FROM entities"):
+                references.update(entity_references(json.loads(value)))
+            stored = set()
+            reference_list = list(references)
+            for i in range(0, len(reference_list), 500):
+                chunk = reference_list[i : i + 500]
+                rows = self._connection.execute(
+                    f"SELECT qid FROM entities WHERE qid IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                stored.update(qid for (qid,) in rows)
+        return references - stored
+
+    def get_entities(self, qids: List[str], props: List[str], language_keys: List[str]) -> Dict[str, Dict]:
+        """Returns the stored entities of the qids reduced to the props like a wbgetentities response
+
+        Args:
+            qids: Qids to look up
+            props: Props of the wbgetentities request
+            language_keys: Languages of the wbgetentities request
+
+        Returns:
+            A dict of the found qids and their entity
+        """
+        found = {}
+        with self._lock:
+            for i in range(0, len(qids), 500):
+                key_chunk = qids[i : i + 500]
+                rows = self._connection.execute(
+                    f"SELECT qid, value FROM entities WHERE qid IN ({','.join('?' * len(key_chunk))})", key_chunk
+                ).fetchall()
+                for qid, value in rows:
+                    found[qid] = project_entity(json.loads(value), props, language_keys)
+            self.hits += len(found)
+            self.misses += len(qids) - len(found)
+        return found
+
+    def instances_of_subclasses(self, class_qid: str, with_image: Optional[bool] = True) -> List[str]:
+        """Selects the entities which are instance of the class or one of its transitive subclasses
+
+        This is the equivalent of the artwork_classes_query.sparql and artwork_ids_query.sparql queries:
+        ?cls wdt:P279* $QID . ?item wdt:P31 ?cls
+
+        Args:
+            class_qid: Qid of the class e. g. Q3305213 (painting)
+            with_image: Only return entities with an image (P18). Defaults to True.
+
+        Returns:
+            List of the qids of the instances
+        """
+        with self._lock:
+            classes = self._subclasses([class_qid])
+            instances = set()
+            class_list = list(classes)
+            for i in range(0, len(class_list), 500):
+                chunk = class_list[i : i + 500]
+                rows = self._connection.execute(
+                    "SELECT DISTINCT relations.qid FROM relations JOIN entities ON entities.qid = relations.qid "
+                    f"WHERE relations.property = ? AND relations.value IN ({','.join('?' * len(chunk))}) "
+                    "AND (entities.has_image OR NOT ?)",
+                    [INSTANCE_OF, *chunk, with_image],
+                ).fetchall()
+                instances.update(qid for (qid,) in rows)
+        return sorted(instances, key=lambda qid: int(qid[1:]))
+
+    def stats(self) -> Dict[str, int]:
+        """Hit and miss counters since the store was opened"""
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def project_entity(entity: Dict, props: List[str], language_keys: List[str]) -> Dict:
+    """Reduces a stored entity to the props and languages of a wbgetentities request
+
+    Args:
+        entity: Trimmed dump entity
+        props: Props of the wbgetentities request
+        language_keys: Languages of the wbgetentities request
+
+    Returns:
+        The entity as the wbgetentities response would contain it
+    """
+    projected = {key: entity[key] for key in ("type", ID) if key in entity}
+    for prop in props:
+        for key in PROP_KEYS.get(prop, []):
+            if key in entity:
+                projected[key] = entity[key]
+    for key in (LABEL[PLURAL], DESCRIPTION[PLURAL]):
+        if key in projected:
+            projected[key] = {lang: value for lang, value in projected[key].items() if lang in language_keys}
+    if SITELINKS in projected:
+        sites = {f"{key}wiki" for key in language_keys}
+        projected[SITELINKS] = {site: value for site, value in projected[SITELINKS].items() if site in sites}
+    return projected
+
+
+def load_dump_store(
+    dump_path: Path,
+    qids: Optional[Set[str]] = None,
+    instance_of: Optional[Set[str]] = None,
+    subclass_of: Optional[Set[str]] = None,
+    store_path: Optional[Path] = None,
+    classes: Optional[Set[str]] = None,
+    with_references: bool = False,
+    processes: Optional[int] = None,
+) -> DumpEntityStore:
+    """Opens the dump store and builds it from the dump if it was built from another dump or filter
+
+    Args:
+        dump_path: Path of the dump
+        qids: Qid filter, see DumpEntityStore.build. Defaults to None.
+        instance_of: P31 filter, see DumpEntityStore.build. Defaults to None.
+        subclass_of: P279 filter, see DumpEntityStore.build. Defaults to None.
+        store_path: Path of the SQLite store. Defaults to cache/DUMP_STORE_FILENAME
+        classes: Class filter, see DumpEntityStore.build. Defaults to None.
+        with_references: Add the entities which the filtered entities reference in a second pass over the dump.
+            Defaults to False.
+        processes: Number of parsing processes. Defaults to the number of cpus.
+
+    Returns:
+        The dump store containing the filtered entities of the dump
+    """
+    store = DumpEntityStore(store_path or CACHE_DIRECTORY / DUMP_STORE_FILENAME)
+    stat = dump_path.stat()
+    filters = [sorted(values) if values is not None else None for values in (qids, instance_of, subclass_of, classes)]
+    source = json.dumps(
+        [str(dump_path.absolute()), stat.st_size, stat.st_mtime, language_config_to_list(), filters, with_references]
+    )
+    if store.source() != source:
+        # Until the subject pass finished the store is marked with the source of the class pass only
+        first_source = json.dumps([source, "without references"]) if with_references else source
+        store.build(dump_path, first_source, qids, instance_of, subclass_of, processes=processes, classes=classes)
+        if with_references:
+            references = store.referenced_qids()
+            print(datetime.datetime.now(), f"Loading the {len(references)} referenced entities from the dump")
+            store.build(dump_path, source, references, processes=processes, append=True)
+    else:
+        print(datetime.datetime.now(), f"The dump store is up to date with {dump_path}")
+    return store
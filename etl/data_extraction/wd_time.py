@@ -0,0 +1,112 @@
+"""Parser for the time values of wikidata
+
+A replacement of pywikibot.WbTime.fromTimestr for the extraction. Importing pywikibot loads its user-config.py
+and the WbTime constructor looks up the calendar model of the wikidata site, both are not needed to read the
+year of an inception or a date of birth.
+
+Wikidata time strings have the format '+1503-00-00T00:00:00Z'. The year has a sign and up to 16 digits,
+years before the common era (BCE) are negative e. g. '-0500-00-00T00:00:00Z' is 500 BCE. Month and day are 00
+if the precision of the value is a year or lower. The precision is not part of the string but a separate
+field of the time value.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, NamedTuple, Union
+
+from data_extraction.constants import TIME
+
+# Precisions of wikidata time values, same names as pywikibot.WbTime.PRECISION
+PRECISION = {
+    "1000000000": 0,
+    "100000000": 1,
+    "10000000": 2,
+    "1000000": 3,
+    "100000": 4,
+    "10000": 5,
+    "millenia": 6,
+    "century": 7,
+    "decade": 8,
+    "year": 9,
+    "month": 10,
+    "day": 11,
+    "hour": 12,
+    "minute": 13,
+    "second": 14,
+}
+
+# The same pattern as pywikibot.WbTime.fromTimestr
+_TIMESTR_PATTERN = re.compile(r"([-+]?\d{1,16})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})Z")
+
+# Number of parsed time strings which are kept, most artworks share a few thousand inception dates
+TIMESTR_CACHE_SIZE = 65536
+
+
+class WikidataTime(NamedTuple):
+    """Parsed wikidata time value, the fields have the same meaning as the attributes of pywikibot.WbTime"""
+
+    year: int
+    month: int
+    day: int
+    hour: int
+    minute: int
+    second: int
+    precision: int = PRECISION["second"]
+
+    @property
+    def is_bce(self) -> bool:
+        """True if the year is before the common era"""
+        return self.year < 0
+
+
+@lru_cache(maxsize=TIMESTR_CACHE_SIZE)
+def from_timestr(timestr: str, precision: Union[int, str] = PRECISION["second"]) -> WikidataTime:
+    """Parses a wikidata time string, repeated strings are served from a cache
+
+    Args:
+        timestr: Time string e. g. '+1503-00-00T00:00:00Z'
+        precision: Precision of the time value (0-14 or a name of PRECISION). Defaults to seconds like
+            pywikibot.WbTime.fromTimestr.
+
+    Raises:
+        ValueError: If the time string or the precision is invalid
+
+    Returns:
+        The parsed time
+    """
+    match = _TIMESTR_PATTERN.match(timestr)
+    if not match:
+        raise ValueError(f"Invalid format: '{timestr}'")
+    if precision in PRECISION:
+        precision = PRECISION[precision]
+    elif precision not in PRECISION.values():
+        raise ValueError(f'Invalid precision: "{precision}"')
+    year, month, day, hour, minute, second = map(int, match.groups())
+    return WikidataTime(year, month, day, hour, minute, second, precision)
+
+
+def from_time_value(value: Dict) -> WikidataTime:
+    """Parses the value of a time datavalue with its precision
+
+    Args:
+        value: Time value of a claim e. g. {'time': '+1503-00-00T00:00:00Z', 'precision': 9, ...}
+
+    Returns:
+        The parsed time
+    """
+    return from_timestr(value[TIME], value.get("precision", PRECISION["second"]))
+
+
+def year_from_timestr(timestr: str) -> int:
+    """Returns the year of a wikidata time string, negative for years BCE
+
+    Args:
+        timestr: Time string e. g. '+1503-00-00T00:00:00Z'
+
+    Raises:
+        ValueError: If the time string is invalid
+
+    Returns:
+        The year e. g. 1503
+    """
+    return from_timestr(timestr).year
@@ -11,9 +11,12 @@ import datetime
 import json
 import urllib
 from pathlib import Path
+from typing import Dict, Iterator
 
 from loguru import logger
 
+from shared.utils import DecimalEncoder, iter_json_items
+
 
 def uri_validator(uri: str) -> bool:
     """Validates if a string is an URI
@@ -32,6 +35,23 @@ def uri_validator(uri: str) -> bool:
         return False
 
 
+def read_language_file(file: Path) -> Iterator[Dict]:
+    """Reads the objects of a language file, split_languages.py writes it as art_ontology_<language>_part_*.ndjson
+
+    Args:
+        file: Path of the language file e. g. crawler_output/art_ontology_en.json
+
+    Yields:
+        The objects of the JSON file if it exists, else of its NDJSON batch files. Numbers with a fraction are
+        Decimals, see shared.utils.iter_json_items
+    """
+    if file.exists():
+        yield from iter_json_items(file)
+        return
+    for ndjson_file in sorted(file.parent.glob(file.stem + "_part_*.ndjson")):
+        yield from iter_json_items(ndjson_file)
+
+
 # ruff: noqa: C901
 def generate_rdf(
     file: str = Path(__file__).parent.parent.absolute() / "crawler_output" / "art_ontology_en.json",
@@ -41,7 +61,8 @@ def generate_rdf(
     """Generates an RDF Turtle file 'art_ontology_en.ttl' from *.json files
 
     Args:
-        file: Input file to generate the rdf from. Defaults to "crawler_output/art_ontology_en.json".
+        file: Input file to generate the rdf from. Defaults to "crawler_output/art_ontology_en.json", if it doesn't
+            exist its NDJSON batch files are read.
         header: Header for the rdf file which is inserted at the begining. Defaults to "art_ontology_header.txt".
         ontology: Output file. Defaults to "crawler_output/art_ontology_en.ttl".
 
@@ -59,36 +80,34 @@ def generate_rdf(
     motifs = []
     artists = []
 
-    with open(file, newline="", encoding="utf-8") as input:
-        json_data = json.load(input)
-        for json_object in json_data:
-            if json_object["type"] == "artwork":
-                artworks.append(json_object)
-            if json_object["type"] == "movement":
-                movements.append(json_object)
-            if json_object["type"] == "genre":
-                genres.append(json_object)
-            if json_object["type"] == "location":
-                locations.append(json_object)
-            if json_object["type"] == "material":
-                materials.append(json_object)
-            if json_object["type"] == "motif":
-                motifs.append(json_object)
-            if json_object["type"] == "artist":
-                artists.append(json_object)
+    for json_object in read_language_file(Path(file)):
+        if json_object["type"] == "artwork":
+            artworks.append(json_object)
+        if json_object["type"] == "movement":
+            movements.append(json_object)
+        if json_object["type"] == "genre":
+            genres.append(json_object)
+        if json_object["type"] == "location":
+            locations.append(json_object)
+        if json_object["type"] == "material":
+            materials.append(json_object)
+        if json_object["type"] == "motif":
+            motifs.append(json_object)
+        if json_object["type"] == "artist":
+            artists.append(json_object)
 
     configs = {
         # TODO: If classes should be used again they have to be loaded above
         # They're only contained in the classes.csv
         # there is no JSON for classes generated
         # 'classes': {'json_array': 'classes.csv', 'class': 'rdfs:Class'},
-        "movements": {"json_array": json.dumps(movements), "class": ":movement"},
-        "genre": {"json_array": json.dumps(genres), "class": ":genre"},
-        "locations": {"json_array": json.dumps(locations), "class": ":location"},
-        "materials": {"json_array": json.dumps(materials), "class": ":material"},
-        "motifs": {"json_array": json.dumps(motifs), "class": ":motif"},
-        "artists": {"json_array": json.dumps(artists), "class": ":artist"},
-        "artworks": {"json_array": json.dumps(artworks), "class": ":artwork"},
+        "movements": {"json_array": json.dumps(movements, cls=DecimalEncoder), "class": ":movement"},
+        "genre": {"json_array": json.dumps(genres, cls=DecimalEncoder), "class": ":genre"},
+        "locations": {"json_array": json.dumps(locations, cls=DecimalEncoder), "class": ":location"},
+        "materials": {"json_array": json.dumps(materials, cls=DecimalEncoder), "class": ":material"},
+        "motifs": {"json_array": json.dumps(motifs, cls=DecimalEncoder), "class": ":motif"},
+        "artists": {"json_array": json.dumps(artists, cls=DecimalEncoder), "class": ":artist"},
+        "artworks": {"json_array": json.dumps(artworks, cls=DecimalEncoder), "class": ":artwork"},
     }
 
     properties = {
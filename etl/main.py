@@ -1,5 +1,592 @@
+"""Runs the ETL process as a DAG of stages
+
+Every stage is one of the ETL scripts and declares the artifacts it reads and writes (e. g. the entities in the
+entity store, the abstracts or the language files). A stage starts as soon as the producers of all its inputs are
+finished, so independent stages run concurrently, e. g. the youtube videos and the movement periods are added
+while the wikipedia abstracts are fetched. The enhancement stages are built from the passes of
+data_enhancement/enhance_entities.py, which scripts/etl.sh runs in one process. The stages which write to the
+entity store change different fields, SQLite serializes their transactions.
+
+For every stage the wall time, the CPU time and the peak RSS of its process (including its worker processes)
+are written to logs/run_report.json.
+
+Examples:
+    python3 main.py
+
+    # recover mode: skip the stages whose outputs are up to date and recover the interrupted ones
+    python3 main.py -r
+
+    # development mode with 5 chunks per artwork type, 4 extraction processes and without the upload
+    python3 main.py -d 5 -p 4 --no-upload
+
+    # also generate the RDF file and rerun the stages even if their fingerprint matches
+    python3 main.py --rdf -f
+
+Every stage records a fingerprint of its inputs: the SHA-256 of its input files, of the outputs of its upstream
+stages, of the python files of its package and shared/ and of its arguments. The outputs of a stage are
+fingerprinted by content too, the files by their bytes and the fields in the entity store by their values. A stage
+whose fingerprint matches the recorded one and whose outputs still have their recorded fingerprint reuses its
+outputs instead of running again, so only the stages downstream of a change are run. The extraction stages
+depend on wikidata and wikipedia, they are always run.
+
+In the recover mode the extraction stages are skipped if they finished after all stages which produce their
+inputs, none of their input files changed since and their output files exist.
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Union
+
+from data_enhancement.enhance_entities import ENHANCEMENT_PASSES, depends_on
+from shared.constants import (
+    ABSTRACT,
+    ARTWORK,
+    CRAWLER_OUTPUT,
+    ETL_STATES,
+    INTERMEDIATE_FILES,
+    JSON,
+    LOGS,
+    PLURAL,
+    RUN_REPORT_FILENAME,
+    STAGE_RECORDS_FILENAME,
+)
+from shared.entity_store import EntityStore, entity_store_path
+from shared.utils import language_config_to_list
+
+ETL_DIRECTORY = Path(__file__).resolve().parent
+FIRST_LANGUAGE_KEY = language_config_to_list()[0][0]
+
+# Artifacts which are passed between the stages
+ENTITIES = "entities"
+ABSTRACTS = "abstracts"
+JSON_FILES = "json_files"
+LANGUAGE_FILES = "language_files"
+ELASTICSEARCH_INDICES = "elasticsearch_indices"
+RDF = "rdf"
+
+# Files which have to exist for an artifact to be up to date. The other artifacts are fields in the entity store
+# or the indices on the elasticsearch server
+ARTIFACT_FILES = {
+    ENTITIES: entity_store_path(ETL_DIRECTORY),
+    JSON_FILES: ETL_DIRECTORY / CRAWLER_OUTPUT / INTERMEDIATE_FILES / JSON / f"{ARTWORK[PLURAL]}.{JSON}",
+    # split_languages.py writes at least the first batch file of every language
+    LANGUAGE_FILES: ETL_DIRECTORY / CRAWLER_OUTPUT / f"art_ontology_{FIRST_LANGUAGE_KEY}_part_00001.ndjson",
+    RDF: ETL_DIRECTORY / CRAWLER_OUTPUT / "art_ontology_en.ttl",
+}
+
+# All files of the file artifacts as directory and glob pattern, their bytes are fingerprinted
+ARTIFACT_FILE_PATTERNS = {
+    JSON_FILES: (ETL_DIRECTORY / CRAWLER_OUTPUT / INTERMEDIATE_FILES / JSON, f"*.{JSON}"),
+    LANGUAGE_FILES: (ETL_DIRECTORY / CRAWLER_OUTPUT, "art_ontology_*_part_*.ndjson"),
+    RDF: (ETL_DIRECTORY / CRAWLER_OUTPUT, "art_ontology_en.ttl"),
+}
+
+# Fields of the entity store which the extracts and the enhancement passes write per entity type,
+# ALL_ENTITY_TYPES means every table. The artifact of a pass is named after it. The entities artifact are the
+# documents without these fields
+ALL_ENTITY_TYPES = "*"
+ARTIFACT_FIELDS = {
+    ABSTRACTS: {ALL_ENTITY_TYPES: [f"{ABSTRACT}_{language[0]}" for language in language_config_to_list()]},
+    **{enhancement_pass.name: enhancement_pass.writes for enhancement_pass in ENHANCEMENT_PASSES},
+}
+
+LANGUAGE_CONFIG_FILE = ETL_DIRECTORY / "shared" / "languageconfig.csv"
+
+# Statuses of the stages in the run report
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+SKIPPED = "skipped"  # up to date
+CACHED = "cached"  # the fingerprint matches, the outputs of the previous run are reused
+BLOCKED = "blocked"  # a stage it depends on failed
+
+
+class Stage(NamedTuple):
+    """A script of the ETL process with its inputs and outputs
+
+    Inputs are artifacts of other stages or files. The outputs of a cacheable stage depend only on its inputs, so
+    they are reused if its fingerprint matches.
+    """
+
+    name: str
+    module: str
+    inputs: List[Union[str, Path]]
+    outputs: List[str]
+    arguments: List[str] = []
+    cacheable: bool = True
+
+
+def get_stages(wikidata_arguments: List[str], recover: bool, upload: bool, rdf: bool = False) -> List[Stage]:
+    """The stages of the ETL process in the order of scripts/etl.sh
+
+    Args:
+        wikidata_arguments: Arguments of get_wikidata_items.py e. g. ['-d', '5']
+        recover: Pass -r to the scripts, so they continue at the first unfinished chunk
+        upload: Upload the language files to elasticsearch
+        rdf: Generate the RDF file of the english language file
+
+    Returns:
+        The stages
+    """
+    recover_arguments = ["-r"] if recover else []
+    batch_size = os.getenv("ART_ONTOLOGY_BATCH_SIZE", "2000")
+    stages = [
+        Stage(
+            "get_wikidata_items",
+            "data_extraction.get_wikidata_items",
+            [LANGUAGE_CONFIG_FILE],
+            [ENTITIES],
+            wikidata_arguments + recover_arguments,
+            cacheable=False,
+        ),
+        Stage(
+            "get_wikipedia_extracts",
+            "data_extraction.get_wikipedia_extracts",
+            [ENTITIES, LANGUAGE_CONFIG_FILE],
+            [ABSTRACTS],
+            recover_arguments,
+            cacheable=False,
+        ),
+        *get_enhancement_stages(recover_arguments),
+        Stage(
+            "export_entities",
+            "data_enhancement.export_entities",
+            [ENTITIES, ABSTRACTS, *(enhancement_pass.name for enhancement_pass in ENHANCEMENT_PASSES)],
+            [JSON_FILES],
+            recover_arguments,
+        ),
+        Stage(
+            "split_languages",
+            "data_enhancement.split_languages",
+            [JSON_FILES, LANGUAGE_CONFIG_FILE],
+            [LANGUAGE_FILES],
+            ["-b", batch_size, *recover_arguments],
+        ),
+    ]
+    if upload:
+        stages.append(
+            Stage(
+                "elasticsearch_helper",
+                "upload_to_elasticsearch.elasticsearch_helper",
+                [LANGUAGE_FILES, LANGUAGE_CONFIG_FILE],
+                [ELASTICSEARCH_INDICES],
+            )
+        )
+    if rdf:
+        stages.append(
+            Stage(
+                "generate_rdf",
+                "generate_rdf.generate_rdf",
+                [LANGUAGE_FILES, ETL_DIRECTORY / "generate_rdf" / "art_ontology_header.txt"],
+                [RDF],
+            )
+        )
+    return stages
+
+
+def get_enhancement_stages(recover_arguments: List[str]) -> List[Stage]:
+    """One stage per pass of data_enhancement/enhance_entities.py, which runs the pass with --pass
+
+    A stage depends on the stages of the earlier passes it has to run after (see enhance_entities.depends_on), so
+    the result is the same as the one of the fused runner of scripts/etl.sh. A pass which reads whole documents
+    depends on the abstracts too, e. g. the ranking counts all fields of an artwork.
+
+    Args:
+        recover_arguments: ['-r'] in the recover mode
+
+    Returns:
+        The stages in the order of ENHANCEMENT_PASSES
+    """
+    stages = []
+    for index, enhancement_pass in enumerate(ENHANCEMENT_PASSES):
+        inputs = [ENTITIES]
+        if None in enhancement_pass.reads.values():
+            inputs.append(ABSTRACTS)
+        inputs += [
+            earlier_pass.name
+            for earlier_pass in ENHANCEMENT_PASSES[:index]
+            if depends_on(enhancement_pass, earlier_pass)
+        ]
+        stages.append(
+            Stage(
+                enhancement_pass.name,
+                "data_enhancement.enhance_entities",
+                [*inputs, *enhancement_pass.files],
+                [enhancement_pass.name],
+                ["--pass", enhancement_pass.name, *recover_arguments],
+            )
+        )
+    return stages
+
+
+def get_producers(stages: List[Stage]) -> Dict[str, str]:
+    """Name of the stage which produces each artifact
+
+    Raises:
+        ValueError: If an artifact has several producers
+    """
+    producers = {}
+    for stage in stages:
+        for artifact in stage.outputs:
+            if artifact in producers:
+                raise ValueError(f"{artifact} is produced by {producers[artifact]} and {stage.name}")
+            producers[artifact] = stage.name
+    return producers
+
+
+def get_dependencies(stages: List[Stage]) -> Dict[str, List[str]]:
+    """Names of the stages which produce the input artifacts of each stage
+
+    Raises:
+        ValueError: If an artifact has no producer or several producers
+
+    Returns:
+        The names of the upstream stages per stage
+    """
+    producers = get_producers(stages)
+    dependencies = {}
+    for stage in stages:
+        artifacts = [artifact for artifact in stage.inputs if isinstance(artifact, str)]
+        missing = [artifact for artifact in artifacts if artifact not in producers]
+        if missing:
+            raise ValueError(f"No stage produces {', '.join(missing)} for {stage.name}")
+        dependencies[stage.name] = list(dict.fromkeys(producers[artifact] for artifact in artifacts))
+    return dependencies
+
+
+def load_stage_records(path: Path) -> Dict[str, Dict]:
+    """Finish times and fingerprints of the stages of the previous runs"""
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def is_up_to_date(stage: Stage, records: Dict[str, Dict], dependencies: List[str]) -> bool:
+    """Checks if a stage finished after its upstream stages and input files changed and its outputs exist
+
+    Args:
+        stage: The stage
+        records: Finish times of the stages, the upstream stages of this run are already contained
+        dependencies: Names of the upstream stages
+
+    Returns:
+        True if the stage doesn't need to run
+    """
+    if stage.name not in records:
+        return False
+    finished_at = records[stage.name]["finished_at"]
+    for dependency in dependencies:
+        if dependency not in records or records[dependency]["finished_at"] > finished_at:
+            return False
+    for path in stage.inputs:
+        if isinstance(path, Path) and path.exists() and path.stat().st_mtime > finished_at:
+            return False
+    return all(ARTIFACT_FILES[artifact].exists() for artifact in stage.outputs if artifact in ARTIFACT_FILES)
+
+
+def file_digest(path: Path) -> Optional[str]:
+    """SHA-256 of the bytes of a file, None if it doesn't exist"""
+    if not path.is_file():
+        return None
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def get_fields(artifact: str, entity_type: str) -> List[str]:
+    """Fields of an entity store artifact in the table of an entity type"""
+    fields = ARTIFACT_FIELDS[artifact]
+    return fields.get(ALL_ENTITY_TYPES, []) + fields.get(entity_type, [])
+
+
+def artifact_fingerprint(artifact: str) -> Optional[str]:
+    """Fingerprint of the current content of an artifact
+
+    File artifacts are fingerprinted by the names and bytes of their files, the entity store artifacts by the
+    values of their fields. The entities are the documents without the fields of the other artifacts, so the
+    enhancement stages don't change their fingerprint.
+
+    Args:
+        artifact: The artifact e. g. ABSTRACTS
+
+    Returns:
+        The hex digest, None for the elasticsearch indices which aren't fingerprinted
+    """
+    digest = hashlib.sha256()
+    if artifact in ARTIFACT_FILE_PATTERNS:
+        directory, pattern = ARTIFACT_FILE_PATTERNS[artifact]
+        for path in sorted(directory.glob(pattern)):
+            digest.update(f"{path.name}:{file_digest(path)}\n".encode("utf-8"))
+        return digest.hexdigest()
+    if artifact != ENTITIES and artifact not in ARTIFACT_FIELDS:
+        return None
+    store_path = ARTIFACT_FILES[ENTITIES]
+    if not store_path.exists():
+        return digest.hexdigest()
+    with EntityStore(store_path) as store:
+        for entity_type in store.entity_types():
+            if artifact == ENTITIES:
+                excluded_fields = [field for other in ARTIFACT_FIELDS for field in get_fields(other, entity_type)]
+                entity_digest = store.digest(entity_type, excluded_fields=excluded_fields)
+            else:
+                entity_digest = store.digest(entity_type, get_fields(artifact, entity_type))
+            digest.update(f"{entity_type}:{entity_digest}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def code_fingerprint(stage: Stage) -> str:
+    """SHA-256 of the python files of the package of a stage and of shared/"""
+    digest = hashlib.sha256()
+    for directory in dict.fromkeys([stage.module.split(".")[0], "shared"]):
+        for path in sorted((ETL_DIRECTORY / directory).glob("*.py")):
+            digest.update(f"{directory}/{path.name}:{file_digest(path)}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def stage_fingerprint(stage: Stage, upstream_fingerprints: Dict[str, Optional[str]]) -> Optional[str]:
+    """Fingerprint of the inputs, the code and the arguments of a stage
+
+    The recover flag is left out, it doesn't change the outputs.
+
+    Args:
+        stage: The stage
+        upstream_fingerprints: Recorded fingerprints of the input artifacts
+
+    Returns:
+        The hex digest, None if an input artifact has no recorded fingerprint
+    """
+    if any(upstream_fingerprints.get(artifact) is None for artifact in stage.inputs if isinstance(artifact, str)):
+        return None
+    fingerprint = {
+        "module": stage.module,
+        "code": code_fingerprint(stage),
+        "arguments": [argument for argument in stage.arguments if argument != "-r"],
+        "inputs": [
+            upstream_fingerprints[artifact] if isinstance(artifact, str) else [artifact.name, file_digest(artifact)]
+            for artifact in stage.inputs
+        ],
+    }
+    return hashlib.sha256(json.dumps(fingerprint).encode("utf-8")).hexdigest()
+
+
+def run_stage(stage: Stage) -> Dict:
+    """Runs the script of a stage in its own process and measures it
+
+    The CPU time and the peak RSS are taken from the resource usage of the process, it contains the worker
+    processes which the script waited for. On systems without os.wait4 they are None.
+
+    Args:
+        stage: The stage
+
+    Returns:
+        The measurements of the stage for the run report
+    """
+    command = [sys.executable, "-m", stage.module, *stage.arguments]
+    python_path = os.pathsep.join(filter(None, [str(ETL_DIRECTORY), os.getenv("PYTHONPATH")]))
+    environment = {**os.environ, "PYTHONPATH": python_path}
+    print(datetime.datetime.now(), f"Starting stage {stage.name}: {' '.join(command[1:])}")
+    started_at = time.time()
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ETL_DIRECTORY, env=environment)
+    cpu_time = max_rss = None
+    if hasattr(os, "wait4"):
+        _pid, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        cpu_time = {"user": round(usage.ru_utime, 3), "system": round(usage.ru_stime, 3)}
+        max_rss = usage.ru_maxrss * 1024  # Linux reports kilobytes
+    else:
+        process.wait()
+    wall_time = time.perf_counter() - start
+    status = SUCCEEDED if process.returncode == 0 else FAILED
+    print(datetime.datetime.now(), f"Stage {stage.name} {status} after {wall_time:.1f}s")
+    return {
+        "name": stage.name,
+        "status": status,
+        "command": command[1:],
+        "returncode": process.returncode,
+        "started_at": started_at,
+        "finished_at": time.time(),
+        "wall_time": round(wall_time, 3),
+        "cpu_time": cpu_time,
+        "max_rss": max_rss,
+    }
+
+
+def run_cached_stage(
+    stage: Stage, upstream_fingerprints: Dict[str, Optional[str]], record: Optional[Dict], use_cache: bool
+) -> Dict:
+    """Reuses the outputs of a stage if its fingerprint matches, runs it otherwise
+
+    Args:
+        stage: The stage
+        upstream_fingerprints: Recorded fingerprints of the input artifacts
+        record: Record of the stage from the previous runs
+        use_cache: Reuse the outputs of cacheable stages
+
+    Returns:
+        The report of the stage with its fingerprint and the fingerprints of its outputs if it succeeded
+    """
+    start = time.perf_counter()
+    fingerprint = stage_fingerprint(stage, upstream_fingerprints)
+    if (
+        use_cache
+        and stage.cacheable
+        and fingerprint is not None
+        and record
+        and record.get("fingerprint") == fingerprint
+        and all(artifact_fingerprint(artifact) == record["outputs"].get(artifact) for artifact in stage.outputs)
+    ):
+        wall_time = time.perf_counter() - start
+        print(datetime.datetime.now(), f"Stage {stage.name} is cached, its fingerprint matches")
+        return {"name": stage.name, "status": CACHED, "fingerprint": fingerprint, "wall_time": round(wall_time, 3)}
+    report = run_stage(stage)
+    if report["status"] == SUCCEEDED:
+        report["fingerprint"] = fingerprint
+        report["outputs"] = {artifact: artifact_fingerprint(artifact) for artifact in stage.outputs}
+    return report
+
+
+# ruff: noqa: C901
+def run_dag(
+    stages: List[Stage], recover: bool, max_parallel_stages: Optional[int] = None, use_cache: bool = True
+) -> List[Dict]:
+    """Runs every stage as soon as its upstream stages are finished
+
+    A failed stage blocks the stages which depend on it, independent stages still run.
+
+    Args:
+        stages: The stages
+        recover: Skip the stages which aren't cacheable and up to date
+        max_parallel_stages: Maximum number of stages which run at the same time. Defaults to all stages.
+        use_cache: Reuse the outputs of the stages whose fingerprint matches
+
+    Returns:
+        The reports of the stages in the order they were finished
+    """
+    dependencies = get_dependencies(stages)
+    producers = get_producers(stages)
+    records_path = ETL_DIRECTORY / LOGS / STAGE_RECORDS_FILENAME
+    records = load_stage_records(records_path)
+    pending = {stage.name: stage for stage in stages}
+    statuses = {}
+    reports = []
+    running: Dict[Future, Stage] = {}
+
+    def finish(name: str, report: Dict) -> None:
+        statuses[name] = report["status"]
+        reports.append(report)
+        if report["status"] == SUCCEEDED:
+            records[name] = {
+                "finished_at": report["finished_at"],
+                "fingerprint": report["fingerprint"],
+                "outputs": report["outputs"],
+            }
+            records_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(records_path, "w", encoding="utf-8") as file:
+                json.dump(records, file, indent=2)
+
+    with ThreadPoolExecutor(max_workers=max_parallel_stages or len(stages)) as executor:
+        while True:
+            # A skipped or blocked stage can make further stages ready, so the pending stages are checked until
+            # nothing changes
+            changed = True
+            while changed:
+                changed = False
+                for name, stage in list(pending.items()):
+                    upstream = [statuses.get(dependency) for dependency in dependencies[name]]
+                    if any(status in (FAILED, BLOCKED) for status in upstream):
+                        print(datetime.datetime.now(), f"Stage {name} is blocked by a failed stage")
+                        finish(name, {"name": name, "status": BLOCKED})
+                    elif not all(status in (SUCCEEDED, SKIPPED, CACHED) for status in upstream):
+                        continue
+                    elif recover and not stage.cacheable and is_up_to_date(stage, records, dependencies[name]):
+                        print(datetime.datetime.now(), f"Stage {name} is up to date")
+                        finish(name, {"name": name, "status": SKIPPED})
+                    else:
+                        # The fingerprints are read here, the records are only changed by this thread
+                        upstream_fingerprints = {
+                            artifact: records.get(producers[artifact], {}).get("outputs", {}).get(artifact)
+                            for artifact in stage.inputs
+                            if isinstance(artifact, str)
+                        }
+                        future = executor.submit(
+                            run_cached_stage, stage, upstream_fingerprints, records.get(name), use_cache
+                        )
+                        running[future] = stage
+                    del pending[name]
+                    changed = True
+            if not running:
+                break
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(running.pop(future).name, future.result())
+    if pending:
+        raise ValueError(f"The stages {', '.join(pending)} depend on each other")
+    return reports
+
+
+def write_run_report(reports: List[Dict], started_at: float, path: Path) -> None:
+    """Writes the reports of the stages as JSON and prints a summary table"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    run_report = {
+        "started_at": datetime.datetime.fromtimestamp(started_at).isoformat(),
+        "wall_time": round(time.time() - started_at, 3),
+        "stages": reports,
+    }
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(run_report, file, indent=2)
+
+    print(f"{'stage':<30} {'status':<10} {'wall [s]':>10} {'cpu [s]':>10} {'peak rss [MiB]':>15}")
+    for report in reports:
+        cpu_time = report.get("cpu_time")
+        cpu = f"{cpu_time['user'] + cpu_time['system']:.1f}" if cpu_time else "-"
+        wall = f"{report['wall_time']:.1f}" if "wall_time" in report else "-"
+        rss = f"{report['max_rss'] / 2**20:.0f}" if report.get("max_rss") else "-"
+        print(f"{report['name']:<30} {report['status']:<10} {wall:>10} {cpu:>10} {rss:>15}")
+    print(f"Run report written to {path}")
+
+
 def main():
-    print("Hello from etl!")
+    parser = argparse.ArgumentParser(description="Run the ETL stages as a DAG")
+    parser.add_argument("-d", dest="dev", nargs="?", const=5, type=int, help="dev mode with the number of chunks")
+    parser.add_argument("-i", dest="incremental", action="store_true", help="incremental mode")
+    parser.add_argument("-p", dest="processes", nargs="?", const=os.cpu_count(), type=int, help="extraction processes")
+    parser.add_argument("-r", dest="recover", action="store_true", help="recover mode, skip up to date stages")
+    parser.add_argument("-t", dest="test", nargs="?", const=5, type=int, help="test mode with the class limit")
+    parser.add_argument("-j", dest="jobs", type=int, default=None, help="maximum number of concurrent stages")
+    parser.add_argument("-f", dest="force", action="store_true", help="run the stages even if they are cached")
+    parser.add_argument("--no-upload", dest="upload", action="store_false", help="don't upload to elasticsearch")
+    parser.add_argument("--rdf", dest="rdf", action="store_true", help="generate the RDF file")
+    args = parser.parse_args()
+
+    wikidata_arguments = []
+    if args.dev is not None:
+        wikidata_arguments += ["-d", str(args.dev)]
+    if args.test is not None:
+        wikidata_arguments += ["-t", str(args.test)]
+    if args.incremental:
+        wikidata_arguments.append("-i")
+    if args.processes is not None:
+        wikidata_arguments += ["-p", str(args.processes)]
+
+    # Like scripts/etl.sh a new run starts without the states of the previous run
+    states_path = ETL_DIRECTORY / LOGS / ETL_STATES.FILENAME
+    if not args.recover and states_path.exists():
+        states_path.unlink()
+
+    started_at = time.time()
+    stages = get_stages(wikidata_arguments, args.recover, args.upload, args.rdf)
+    reports = run_dag(stages, args.recover, args.jobs, not args.force)
+    write_run_report(reports, started_at, ETL_DIRECTORY / LOGS / RUN_REPORT_FILENAME)
+    if any(report["status"] in (FAILED, BLOCKED) for report in reports):
+        exit(1)
 
 
 if __name__ == "__main__":
@@ -15,19 +15,19 @@ echo "Remember to add + 1 to the JSON files since the type-attribute is added to
 echo "Drawings columns / attributes"
 head -1 crawler_output/intermediate_files/csv/artworks/drawings.csv | sed 's/[^;]//g' | wc -c
 echo "Drawings JSON object count"
-jq length crawler_output/intermediate_files/json/artworks/drawings.json
+wc -l < crawler_output/intermediate_files/json/artworks/drawings.ndjson
 echo -e "\n"
 
 echo "Sculptures columns / attributes"
 head -1 crawler_output/intermediate_files/csv/artworks/sculptures.csv | sed 's/[^;]//g' | wc -c
 echo "Sculptures JSON object count"
-jq length crawler_output/intermediate_files/json/artworks/sculptures.json
+wc -l < crawler_output/intermediate_files/json/artworks/sculptures.ndjson
 echo -e "\n"
 
 echo "Paintings columns / attributes"
 head -1 crawler_output/intermediate_files/csv/artworks/paintings.csv | sed 's/[^;]//g' | wc -c
 echo "Paintings JSON object count"
-jq length crawler_output/intermediate_files/json/artworks/paintings.json
+wc -l < crawler_output/intermediate_files/json/artworks/paintings.ndjson
 echo -e "\n"
 
 echo "Artworks columns / attributes"
@@ -2,8 +2,8 @@
 set -eE
 set -x
 
-# Get parameters d, r and t (dev counter, recovery mode and test mode)
-while getopts "dlrt" opt; do
+# Get parameters d, i, p, r and t (dev counter, incremental mode, parallel mode, recovery mode and test mode)
+while getopts "dilprt" opt; do
   case $opt in
   d)
     DEV_MODE=true
@@ -17,9 +17,24 @@ while getopts "dlrt" opt; do
       DEV_COUNT=5
     fi
     ;;
+  i)
+    INC_MODE=true
+    ;;
   l)
     LOCAL_MODE=true
     ;;
+  p)
+    PARALLEL_MODE=true
+    # Check next positional parameter
+    eval nextopt=\${$OPTIND}
+    # existing or starting with dash?
+    if [[ -n $nextopt && $nextopt != -* ]]; then
+      OPTIND=$((OPTIND + 1))
+      PROCESSES=$nextopt
+    else
+      PROCESSES=$(nproc)
+    fi
+    ;;
   r)
     REC_MODE=true
     ;;
@@ -61,6 +76,8 @@ ETL_STATES_FILE=$WD/logs/etl_states.log
 params=() && [[ $DEV_MODE == true ]] && params+=('-d' "$DEV_COUNT")
 [[ $REC_MODE == true ]] && params+=('-r')
 [[ $TEST_MODE == true ]] && params+=('-t' "$CLASS_LIM")
+[[ $INC_MODE == true ]] && params+=('-i')
+[[ $PARALLEL_MODE == true ]] && params+=('-p' "$PROCESSES")
 python3 data_extraction/get_wikidata_items.py "${params[@]}"
 
 params=() && [[ $REC_MODE == true ]] && params+=(-r)
@@ -68,13 +85,11 @@ python3 data_extraction/get_wikipedia_extracts.py "${params[@]}"
 
 # DATA TRANSFORMATION / "Enhancement
 
-python3 data_enhancement/estimate_movement_period.py "${params[@]}"
-
-python3 data_enhancement/has_part_part_of_enhancement.py "${params[@]}"
-
-python3 data_enhancement/add_youtube_videos.py "${params[@]}"
+# estimate_movement_period, has_part_part_of_enhancement, add_youtube_videos and ranking in one pass
+python3 data_enhancement/enhance_entities.py "${params[@]}"
 
-python3 data_enhancement/ranking.py "${params[@]}"
+# Write the entities of the entity store to the json files once after all enhancements
+python3 data_enhancement/export_entities.py "${params[@]}"
 
 cd crawler_output/intermediate_files/json/
 # Instead of merging all into one large JSON file, stream-merge and split into
@@ -3,11 +3,8 @@ REM Batch script for executing ETL. No error handling!
 python ".\data_extraction\get_wikidata_items.py" -d
 python ".\data_extraction\get_wikipedia_extracts.py"
 
-python ".\data_enhancement\estimate_movement_period.py"
-python ".\data_enhancement\has_part_part_of_enhancement.py"
-python ".\data_enhancement\add_youtube_videos.py"
-
-python ".\data_enhancement\ranking.py"
+python ".\data_enhancement\enhance_entities.py"
+python ".\data_enhancement\export_entities.py"
 
 CD crawler_output\intermediate_files\json\
 
@@ -0,0 +1,184 @@
+"""Chunk-level checkpoint journal for the recover mode
+
+etl_states.log only records finished units like 'extract_source_paintings'. While a unit runs the journal
+records every completed chunk together with the size of the output files at that point and the data which is
+needed to replay the chunk (e. g. the mapped entities or revisions). Every record is fsynced before the next
+chunk starts, so after a crash the recover mode (-r) continues at the first unfinished chunk instead of
+restarting the whole unit.
+
+Every unit has its own JSON lines file in logs/journals. It is deleted when the unit is finished.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, List, Optional
+
+from shared.constants import JOURNAL_DIRECTORY, LOGS
+from shared.utils import DecimalEncoder
+
+PLAN = "plan"
+CHUNK = "chunk"
+OFFSETS = "offsets"
+DATA = "data"
+
+
+def journal_path(unit: str, parent_path: Optional[Path] = None) -> Path:
+    """Path of the journal file of a unit in logs/journals
+
+    Args:
+        unit: Name of the unit e. g. 'extract_source_paintings'
+        parent_path: Directory which contains the logs directory. Defaults to the current working directory
+    """
+    return (parent_path if parent_path else Path.cwd()) / LOGS / JOURNAL_DIRECTORY / f"{unit}.jsonl"
+
+
+def chunk_id(qids: List[str]) -> str:
+    """Content based id of a chunk which doesn't depend on the order the chunks are processed in
+
+    Args:
+        qids: Qids (or other keys) of the chunk
+
+    Returns:
+        A short hash of the keys
+    """
+    return hashlib.sha1("|".join(qids).encode("utf-8")).hexdigest()[:16]
+
+
+class ChunkJournal:
+    """Append-only journal of the completed chunks of one unit
+
+    Output files which are opened with open_output are flushed and fsynced on every commit and their size
+    is recorded, on resume they are truncated to the size of the last committed chunk.
+    """
+
+    def __init__(self, unit: str, resume: bool, parent_path: Optional[Path] = None) -> None:
+        """Opens the journal of a unit
+
+        Args:
+            unit: Name of the unit e. g. 'extract_source_paintings', used as file name
+            resume: Load the chunks of the previous run. If False the journal is started from scratch
+            parent_path: Directory which contains the logs directory. Defaults to the current working directory
+        """
+        self.unit = unit
+        self.path = journal_path(unit, parent_path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.plan = None
+        self.chunks: Dict[str, Any] = {}
+        self.offsets: Dict[str, int] = {}
+        self._outputs: Dict[str, IO] = {}
+        if resume:
+            self._load()
+        self._file = open(self.path, "a" if resume else "w", encoding="utf-8")
+        if self.chunks:
+            print(f"Journal of {unit}: {len(self.chunks)} completed chunks recovered")
+
+    def _load(self) -> None:
+        """Reads the records of the previous run, a record which was torn by a crash is ignored"""
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if PLAN in record:
+                    self.plan = record[PLAN]
+                else:
+                    self.chunks[record[CHUNK]] = record.get(DATA)
+                    self.offsets.update(record.get(OFFSETS, {}))
+
+    def _append(self, record: Dict) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False, cls=DecimalEncoder) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def reset(self) -> None:
+        """Forgets all chunks e. g. if the output files of the recorded chunks are missing"""
+        self.plan = None
+        self.chunks = {}
+        self.offsets = {}
+        self._file.seek(0)
+        self._file.truncate()
+
+    def load_or_create_plan(self, create: Callable[[], Any]) -> Any:
+        """Returns the plan of the unit (e. g. the qids to extract) recorded by the previous run or creates it
+
+        The chunks of a resumed unit have to be built from the same plan, otherwise the recorded chunk ids
+        wouldn't match e. g. if the SPARQL query returns the artworks in another order.
+
+        Args:
+            create: Function which creates a new plan, the plan has to be JSON serializable
+
+        Returns:
+            The plan of the unit
+        """
+        if self.plan is None:
+            self.plan = create()
+            self._append({PLAN: self.plan})
+        return self.plan
+
+    def is_done(self, chunk: str) -> bool:
+        return chunk in self.chunks
+
+    def open_output(self, name: str, path: Path) -> IO:
+        """Opens an output file of the unit for writing
+
+        On resume the file is truncated to its size after the last committed chunk, so rows of an unfinished
+        chunk are removed. If the file is missing or shorter the journal is reset and the unit starts over.
+
+        Args:
+            name: Name of the output in the journal records
+            path: Path of the file
+
+        Returns:
+            The text file opened for appending
+        """
+        offset = self.offsets.get(name)
+        if offset is not None and (not path.exists() or path.stat().st_size < offset):
+            print(f"Output {path} of {self.unit} doesn't match the journal, starting over")
+            self.reset()
+            for output in self._outputs.values():
+                output.seek(0)
+                output.truncate()
+            offset = None
+        if offset is None:
+            output = open(path, "w", newline="", encoding="utf-8")
+        else:
+            os.truncate(path, offset)
+            output = open(path, "a", newline="", encoding="utf-8")
+        self._outputs[name] = output
+        return output
+
+    def commit(self, chunk: str, data: Optional[Any] = None) -> None:
+        """Records a completed chunk after its output was written
+
+        Args:
+            chunk: Id of the chunk
+            data: JSON serializable data which is needed to replay the chunk on resume. Defaults to None.
+        """
+        offsets = {}
+        for name, output in self._outputs.items():
+            output.flush()
+            os.fsync(output.fileno())
+            offsets[name] = output.tell()
+        self._append({CHUNK: chunk, OFFSETS: offsets, DATA: data})
+        self.chunks[chunk] = data
+        self.offsets.update(offsets)
+
+    def close_outputs(self) -> None:
+        for output in self._outputs.values():
+            output.close()
+        self._outputs = {}
+
+    def close(self) -> None:
+        """Closes the journal and its outputs, the journal is kept for a resume"""
+        self.close_outputs()
+        self._file.close()
+
+    def finish(self) -> None:
+        """Closes the journal and deletes it, has to be called after the unit state was written"""
+        self.close()
+        self.path.unlink(missing_ok=True)
@@ -1,10 +1,21 @@
 """Shared constants for all python scripts"""
 
 JSON = "json"
+NDJSON = "ndjson"
 CSV = "csv"
 CRAWLER_OUTPUT = "crawler_output"
 INTERMEDIATE_FILES = "intermediate_files"
 LOGS = "logs"
+JOURNAL_DIRECTORY = "journals"
+# SQLite store of the intermediate entities in crawler_output/intermediate_files, see shared/entity_store.py
+ENTITY_STORE_FILENAME = "entities.sqlite"
+# Number of entities which are inserted or updated with one statement
+ENTITY_STORE_BATCH_SIZE = 10000
+# Files of main.py in the logs directory, the measurements of the last run and the finish times of the stages
+RUN_REPORT_FILENAME = "run_report.json"
+STAGE_RECORDS_FILENAME = "stage_records.json"
+# Size of the buffer of the streamed JSON and NDJSON files, one read call fills it
+JSON_READ_BUFFER_SIZE = 2**20
 TYPE = "type"
 SINGULAR = "singular"
 PLURAL = "plural"
@@ -40,6 +51,7 @@ YOUTUBE_VIDEOS_FILE = "youtube_videos.csv"
 # Logging Filenames for data enhancement & upload to elasticsearch
 ADD_YOUTUBE_VIDEOS_LOG_FILENAME = "add_youtube_videos.log"
 RANKING_LOG_FILENAME = "ranking.log"
+ENHANCE_ENTITIES_LOG_FILENAME = "enhance_entities.log"
 ELASTICSEARCH_HELPER_LOG_FILENAME = "elasticsearch_helper.log"
 
 
@@ -50,6 +62,7 @@ class ETL_STATES:
     class GET_WIKIDATA_ITEMS:
         STATE = "get_wikidata_items"
         EXTRACT_SOURCE = "extract_source_"
+        EXTRACT_SUBJECTS = "extract_subjects_"
         MERGED_ARTWORKS = "merged_artworks"
 
     class GET_WIKIPEDIA_EXTRACTS:
@@ -61,4 +74,5 @@ class ETL_STATES:
         HAS_PART_PART_OF_ENHANCEMENT = "has_part_part_of_enhancement"
         ADD_YOUTUBE_VIDEOS = "add_youtube_videos"
         RANKING = "ranking"
+        EXPORT_ENTITIES = "export_entities"
         SPLIT_LANGUAGES = "split_languages"
@@ -0,0 +1,299 @@
+"""SQLite store of the intermediate entities
+
+get_wikidata_items.py writes the entities of every type (artworks, movements, ...) into one table per type of
+crawler_output/intermediate_files/entities.sqlite instead of a JSON file. The enhancement steps read only the
+fields they need and update only the fields they change, so a step doesn't parse and rewrite the whole
+<type>.json anymore. The JSON files are exported once after the last enhancement (see
+data_enhancement/export_entities.py).
+
+Every row holds the JSON document of one entity, the qid is an indexed column. Fields are read and written with
+the JSON functions of SQLite, the rest of the document isn't parsed by python. The rowid keeps the order in which
+the entities were written.
+"""
+
+import hashlib
+import json
+import sqlite3
+from decimal import Decimal
+from itertools import islice
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from shared.constants import (
+    CRAWLER_OUTPUT,
+    ENTITY_STORE_BATCH_SIZE,
+    ENTITY_STORE_FILENAME,
+    ID,
+    INTERMEDIATE_FILES,
+    JSON,
+    NDJSON,
+)
+from shared.utils import create_new_path, encode_json, get_json_codec, iter_json_items
+
+
+def entity_store_path(parent_path: Optional[Path] = None) -> Path:
+    """Path of the entity store in crawler_output/intermediate_files
+
+    Args:
+        parent_path: Directory which contains the crawler_output directory. Defaults to the current working directory
+    """
+    return (parent_path if parent_path else Path.cwd()) / CRAWLER_OUTPUT / INTERMEDIATE_FILES / ENTITY_STORE_FILENAME
+
+
+def _table(entity_type: str) -> str:
+    return '"' + entity_type.replace('"', '""') + '"'
+
+
+def _field_path(field: str) -> str:
+    """JSON path of a top level field, the name is quoted because it may contain any character"""
+    return "$." + json.dumps(field)
+
+
+def _batches(iterable: Iterable, n: int) -> Iterator[List]:
+    """Yields successive n-sized lists of an iterable without materializing it"""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, n)):
+        yield batch
+
+
+def _encode_document(entity: Dict) -> Optional[str]:
+    return encode_json(entity)
+
+
+def _decimal_to_float(value: Any) -> float:
+    """ijson parses numbers with a fraction to Decimal, json.load would have parsed them to float"""
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode_imported_document(entity: Dict) -> str:
+    return json.dumps(entity, ensure_ascii=False, default=_decimal_to_float, separators=(",", ":"))
+
+
+class EntityStore:
+    """One table per entity type with the qid and the JSON document of every entity
+
+    Tables which don't exist yet are imported from crawler_output/intermediate_files/json/<type>.json, so the
+    enhancement steps also work on the JSON files of an older extraction.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        """Opens the store, creates it if it doesn't exist
+
+        Args:
+            path: Path of the SQLite database file. Defaults to entity_store_path()
+        """
+        self.path = path if path else entity_store_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> "EntityStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def entity_types(self) -> List[str]:
+        """Names of the tables in the order they were created"""
+        rows = self._connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY rowid")
+        return [name for (name,) in rows]
+
+    def has_entity_type(self, entity_type: str) -> bool:
+        return entity_type in self.entity_types()
+
+    def replace(self, entity_type: str, entities: Iterable[Dict]) -> None:
+        """Replaces the table of a type with the given entities in one transaction
+
+        Decimals are written as strings like DecimalEncoder does. Every entity is serialized once, entities which
+        aren't serializable are logged and skipped.
+
+        Args:
+            entity_type: Type of the entities e. g. 'artworks', used as table name
+            entities: The entities, every entity needs an id
+        """
+        self._replace(entity_type, entities, _encode_document)
+
+    def _replace(self, entity_type: str, entities: Iterable[Dict], encode: Callable[[Dict], Optional[str]]) -> None:
+        table = _table(entity_type)
+        with self._connection:
+            self._connection.execute(f"DROP TABLE IF EXISTS {table}")
+            self._connection.execute(f"CREATE TABLE {table} (qid TEXT NOT NULL, document TEXT NOT NULL)")
+            self._connection.execute(f"CREATE INDEX {_table(f'{entity_type}_qid')} ON {table} (qid)")
+            for batch in _batches(entities, ENTITY_STORE_BATCH_SIZE):
+                self._connection.executemany(
+                    f"INSERT INTO {table} (qid, document) VALUES (?, ?)",
+                    [(entity[ID], document) for entity in batch if (document := encode(entity)) is not None],
+                )
+
+    def _ensure_entity_type(self, entity_type: str) -> None:
+        """Imports the JSON file of a type if the store doesn't contain it yet
+
+        Raises:
+            FileNotFoundError: If neither the table nor the JSON file exist
+        """
+        if self.has_entity_type(entity_type):
+            return
+        json_path = create_new_path(entity_type).with_suffix(f".{JSON}")
+        if not json_path.exists():
+            raise FileNotFoundError(f"{entity_type} is neither in the entity store nor in {json_path}")
+        print(f"Importing {json_path} into the entity store")
+        self._replace(entity_type, iter_json_items(json_path), _encode_imported_document)
+
+    def count(self, entity_type: str) -> int:
+        self._ensure_entity_type(entity_type)
+        return self._connection.execute(f"SELECT COUNT(*) FROM {_table(entity_type)}").fetchone()[0]
+
+    def read(self, entity_type: str, fields: Optional[List[str]] = None) -> Iterator[Dict]:
+        """Streams the entities of a type in the order they were written
+
+        Args:
+            entity_type: Type of the entities e. g. 'artworks'
+            fields: Fields which are read, the id is always contained. Missing fields are None.
+                Defaults to the whole documents
+
+        Yields:
+            The entities, with fields only dicts with these fields
+        """
+        self._ensure_entity_type(entity_type)
+        table = _table(entity_type)
+        if fields is None:
+            for (document,) in self._connection.execute(f"SELECT document FROM {table} ORDER BY rowid"):
+                yield json.loads(document)
+            return
+        fields = [field for field in fields if field != ID]
+        columns = ", ".join("document -> ?" for _ in fields)
+        cursor = self._connection.execute(
+            f"SELECT qid{', ' if fields else ''}{columns} FROM {table} ORDER BY rowid",
+            [_field_path(field) for field in fields],
+        )
+        for qid, *values in cursor:
+            entity = {ID: qid}
+            for field, value in zip(fields, values, strict=True):
+                entity[field] = json.loads(value) if value is not None else None
+            yield entity
+
+    def digest(
+        self, entity_type: str, fields: Optional[List[str]] = None, excluded_fields: Optional[List[str]] = None
+    ) -> str:
+        """SHA-256 of the qids and the documents of a type in the order they were written
+
+        The documents are hashed as SQLite stores them, they aren't parsed by python.
+
+        Args:
+            entity_type: Type of the entities e. g. 'artworks'
+            fields: Only these fields of the documents are hashed, missing fields count as null.
+                Defaults to the whole documents
+            excluded_fields: Fields which are removed from the whole documents before they are hashed
+
+        Returns:
+            The hex digest
+        """
+        self._ensure_entity_type(entity_type)
+        table = _table(entity_type)
+        if fields is not None:
+            columns = "".join(", document -> ?" for _ in fields)
+            parameters = [_field_path(field) for field in fields]
+        elif excluded_fields:
+            columns = f", json_remove(document, {', '.join('?' for _ in excluded_fields)})"
+            parameters = [_field_path(field) for field in excluded_fields]
+        else:
+            columns = ", document"
+            parameters = []
+        digest = hashlib.sha256()
+        for row in self._connection.execute(f"SELECT qid{columns} FROM {table} ORDER BY rowid", parameters):
+            digest.update("\x1f".join("null" if value is None else value for value in row).encode("utf-8"))
+            digest.update(b"\n")
+        return digest.hexdigest()
+
+    def update(self, entity_type: str, fields: List[str], entities: Iterable[Dict]) -> int:
+        """Sets fields of entities in one transaction, the other fields of the documents are kept
+
+        The updates are sent in batches of ENTITY_STORE_BATCH_SIZE entities. All entities with the same qid
+        are updated.
+
+        Args:
+            entity_type: Type of the entities e. g. 'artworks'
+            fields: Fields which are set, every entity has to contain them
+            entities: Entities with their id and the fields, e. g. the dicts returned by read
+
+        Returns:
+            The number of updated documents
+        """
+        self._ensure_entity_type(entity_type)
+        fields = [field for field in fields if field != ID]
+        if not fields:
+            return 0
+        paths = [_field_path(field) for field in fields]
+        assignments = ", ".join("?, json(?)" for _ in fields)
+        statement = f"UPDATE {_table(entity_type)} SET document = json_set(document, {assignments}) WHERE qid = ?"
+        codec = get_json_codec()
+        updated = 0
+        with self._connection:
+            for batch in _batches(entities, ENTITY_STORE_BATCH_SIZE):
+                rows = []
+                for entity in batch:
+                    row = []
+                    for path, field in zip(paths, fields, strict=True):
+                        row.append(path)
+                        row.append(codec.dumps(entity[field]))
+                    row.append(entity[ID])
+                    rows.append(row)
+                cursor = self._connection.executemany(statement, rows)
+                updated += cursor.rowcount
+        return updated
+
+    def _write_documents(self, entity_type: str, file: IO, separator: str) -> int:
+        count = 0
+        for (document,) in self._connection.execute(f"SELECT document FROM {_table(entity_type)} ORDER BY rowid"):
+            if count:
+                file.write(separator)
+            file.write(document)
+            count += 1
+        return count
+
+    def export_json(self, entity_type: str, path: Optional[Path] = None) -> int:
+        """Writes the entities of a type to a JSON file, the documents are copied without parsing them
+
+        No file is written for a type without entities.
+
+        Args:
+            entity_type: Type of the entities e. g. 'artworks'
+            path: Path of the file. Defaults to crawler_output/intermediate_files/json/<type>.json
+
+        Returns:
+            The number of exported entities
+        """
+        if self.count(entity_type) == 0:
+            return 0
+        path = path if path else create_new_path(entity_type).with_suffix(f".{JSON}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            file.write("[")
+            count = self._write_documents(entity_type, file, ",")
+            file.write("]")
+        return count
+
+    def export_ndjson(self, entity_type: str, path: Optional[Path] = None) -> int:
+        """Writes the entities of a type to a NDJSON file (one JSON object per line)
+
+        Args:
+            entity_type: Type of the entities e. g. 'artworks'
+            path: Path of the file. Defaults to crawler_output/intermediate_files/json/<type>.ndjson
+
+        Returns:
+            The number of exported entities
+        """
+        if self.count(entity_type) == 0:
+            return 0
+        path = path if path else create_new_path(entity_type).with_suffix(f".{NDJSON}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            count = self._write_documents(entity_type, file, "\n")
+            file.write("\n")
+        return count
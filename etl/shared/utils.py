@@ -1,19 +1,36 @@
 """Shared util functions across all python scripts"""
 
 import csv
+import datetime
+import importlib
 import json
 import logging
+import math
+import multiprocessing.util
 import os
 import pkgutil
+import queue
+import time
 from decimal import Decimal
+from functools import lru_cache, partial
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Dict, List
+from types import ModuleType
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
 
-from shared.constants import CRAWLER_OUTPUT, ETL_STATES, INTERMEDIATE_FILES, JSON, LOGS
+from shared.constants import CRAWLER_OUTPUT, ETL_STATES, INTERMEDIATE_FILES, JSON, JSON_READ_BUFFER_SIZE, LOGS
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library is used without it
+    orjson = None
 
 root_logger = logging.getLogger()  # setup root logger
 root_logger.setLevel(logging.DEBUG)  # the root logger needs a debug level so that everything works correctly
 
+# Listener threads of the loggers created by setup_logger
+_log_listeners: List[QueueListener] = []
+
 
 def language_config_to_list() -> List[List[str]]:
     """Reads languageconfig.csv and returns array that contains its full contents
@@ -35,6 +52,8 @@ def language_config_to_list() -> List[List[str]]:
 def setup_logger(logger_name: str, filename: str):
     """Setup a logger for a python script.
     The root logging object is created within this helper script.
+    The logger only puts the records into a queue, the file and the console are written by a listener thread,
+    so logging doesn't block the mapping. The queue is drained when the script exits.
     Args:
         logger_name: Package + module name e.g. 'data_extraction.get_wikidata_items'
         filename: String to the path and file the logger writes to
@@ -62,11 +81,46 @@ def setup_logger(logger_name: str, filename: str):
     console_handler.setLevel(logging.WARNING)  # Print warnings and errors to console
     console_handler.setFormatter(console_formatter)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    _log_listeners.append(listener)
+    logger.addHandler(QueueHandler(log_queue))
     return logger
 
 
+def stop_log_listeners() -> None:
+    """Writes the queued records of all loggers and stops their listener threads"""
+    for listener in _log_listeners:
+        listener.stop()
+    _log_listeners.clear()
+
+
+def _register_stop_log_listeners(_function: Optional[Callable] = None) -> None:
+    """Stops the log listeners when the process exits
+
+    The worker processes of multiprocessing exit with os._exit after their atexit handlers were cleared,
+    only the finalizers of multiprocessing are run. They run after the other finalizers, which may still log.
+    The finalizers are cleared in a new process, so they are registered again after the fork.
+    """
+    multiprocessing.util.Finalize(None, stop_log_listeners, exitpriority=-1)
+
+
+def _restart_log_listeners() -> None:
+    """The listener threads are not copied into a forked process, start new ones on the same queues"""
+    listeners = [
+        QueueListener(listener.queue, *listener.handlers, respect_handler_level=True) for listener in _log_listeners
+    ]
+    _log_listeners[:] = listeners
+    for listener in listeners:
+        listener.start()
+
+
+os.register_at_fork(after_in_child=_restart_log_listeners)
+_register_stop_log_listeners()
+multiprocessing.util.register_after_fork(stop_log_listeners, _register_stop_log_listeners)
+
+
 def chunks(lst, n):
     """Yield successive n-sized chunks from lst."""
     for i in range(0, len(lst), n):
@@ -109,24 +163,230 @@ class DecimalEncoder(json.JSONEncoder):
         return super(DecimalEncoder, self).default(o)
 
 
-def is_jsonable(x):
+class JsonCodec(NamedTuple):
+    """Serializer of JSON values to compact strings, Decimals are written as strings like DecimalEncoder does or
+    as numbers (see get_json_codec)
+
+    dumps raises TypeError, OverflowError or ValueError if a value isn't serializable. NaN and Infinity aren't
+    valid JSON, both codecs reject them.
+    """
+
+    name: str
+    dumps: Callable[[Any], str]
+
+
+def _decimal_to_str(value: Any) -> str:
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decimal_to_float(value: Any) -> float:
+    if isinstance(value, Decimal):
+        number = float(value)
+        if not math.isfinite(number):
+            raise ValueError("Out of range float values are not JSON compliant")
+        return number
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _json_dumps(value: Any, default: Callable[[Any], Any] = _decimal_to_str) -> str:
+    return json.dumps(value, skipkeys=True, ensure_ascii=False, default=default, separators=(",", ":"), allow_nan=False)
+
+
+def _contains_non_finite_float(value: Any) -> bool:
+    if isinstance(value, float):
+        return not math.isfinite(value)
+    if isinstance(value, dict):
+        return any(_contains_non_finite_float(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_contains_non_finite_float(item) for item in value)
+    return False
+
+
+def _orjson_dumps(value: Any, default: Callable[[Any], Any] = _decimal_to_str) -> str:
     try:
-        json.dumps(x, skipkeys=True, ensure_ascii=False, cls=DecimalEncoder)
-        return True
-    except (TypeError, OverflowError):
+        document = orjson.dumps(value, default=default, option=orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        # e. g. integers with more than 64 bits or keys which skipkeys skips, the standard library decides
+        return _json_dumps(value, default)
+    # orjson writes NaN and Infinity as null, only then the value is searched for them
+    if b"null" in document and _contains_non_finite_float(value):
+        raise ValueError("Out of range float values are not JSON compliant")
+    return document.decode("utf-8")
+
+
+# The installed codecs, the fastest first
+JSON_CODECS = {
+    codec.name: codec
+    for codec in [JsonCodec("orjson", _orjson_dumps) if orjson else None, JsonCodec("json", _json_dumps)]
+    if codec
+}
+
+
+def get_json_codec(name: Optional[str] = None, decimals_as_numbers: bool = False) -> JsonCodec:
+    """Returns a JSON codec, the fastest installed one by default
+
+    Args:
+        name: Name of the codec ('json' or 'orjson'). Defaults to the environment variable ETL_JSON_CODEC or
+            the fastest installed codec
+        decimals_as_numbers: Write Decimals as numbers instead of strings, e. g. the numbers which ijson parsed
+
+    Raises:
+        ValueError: If the codec isn't installed
+
+    Returns:
+        The codec
+    """
+    name = name or os.getenv("ETL_JSON_CODEC")
+    if not name:
+        codec = next(iter(JSON_CODECS.values()))
+    elif name in JSON_CODECS:
+        codec = JSON_CODECS[name]
+    else:
+        raise ValueError(f"The JSON codec {name} isn't installed, installed are {', '.join(JSON_CODECS)}")
+    if decimals_as_numbers:
+        return JsonCodec(codec.name, partial(codec.dumps, default=_decimal_to_float))
+    return codec
+
+
+def encode_json(x: Any, codec: Optional[JsonCodec] = None) -> Optional[str]:
+    """Serializes a value, a value which isn't serializable is logged
+
+    Args:
+        x: The value
+        codec: The codec. Defaults to get_json_codec()
+
+    Returns:
+        The JSON string, None if the value isn't serializable
+    """
+    try:
+        return (codec or get_json_codec()).dumps(x)
+    except (TypeError, OverflowError, ValueError):
         logging.error(f"Object was not json serializable! Object:\n{x}")
-        return False
+        return None
 
 
-def generate_json(extract_dicts: List[Dict], filename: str) -> None:
-    """Generates a JSON file from a dictionary
+def iter_json_documents(objects: Iterable[Any], codec: Optional[JsonCodec] = None) -> Iterator[str]:
+    """Serializes objects, every object once. Objects which aren't serializable are logged and skipped
 
     Args:
-        extract_dicts: List of dicts that containing wikidata entities transformed to oab entities
-        filename: Name of the file to write the data to
+        objects: The objects, e. g. a generator
+        codec: The codec. Defaults to get_json_codec()
+
+    Yields:
+        The JSON strings of the serializable objects
+    """
+    codec = codec or get_json_codec()
+    for x in objects:
+        document = encode_json(x, codec)
+        if document is not None:
+            yield document
+
+
+def write_ndjson(objects: Iterable[Any], file: IO[str], codec: Optional[JsonCodec] = None) -> int:
+    """Writes objects to a NDJSON file (one JSON object per line), see iter_json_documents
+
+    Args:
+        objects: The objects, e. g. a generator
+        file: The file opened for writing text
+        codec: The codec. Defaults to get_json_codec()
+
+    Returns:
+        The number of written objects
     """
-    if len(extract_dicts) == 0:
-        return
-    filename.parent.mkdir(parents=True, exist_ok=True)
-    with open(filename.with_suffix(f".{JSON}"), "w", newline="", encoding="utf-8") as file:
-        json.dump(extract_dicts, file, skipkeys=True, ensure_ascii=False, cls=DecimalEncoder)
+    count = 0
+    for document in iter_json_documents(objects, codec):
+        file.write(document)
+        file.write("\n")
+        count += 1
+    return count
+
+
+def is_jsonable(x):
+    return encode_json(x) is not None
+
+
+def _iter_ndjson_lines(file: IO[bytes], parse_float: Optional[Callable[[str], Any]]) -> Iterator[Dict]:
+    for line in file:
+        if line.strip():
+            yield json.loads(line, parse_float=parse_float)
+
+
+def iter_ndjson(filename: Path, parse_float: Optional[Callable[[str], Any]] = None) -> Iterator[Dict]:
+    """Streams the objects of a NDJSON file (one JSON object per line)
+
+    Args:
+        filename: Path of the NDJSON file
+        parse_float: Type numbers with a fraction are parsed to e. g. Decimal like ijson does. Defaults to float.
+
+    Yields:
+        The objects of the file
+    """
+    with open(filename, "rb", buffering=JSON_READ_BUFFER_SIZE) as file:
+        yield from _iter_ndjson_lines(file, parse_float)
+
+
+# Backends of ijson, the fastest first. The yajl2_c wheels of ijson 3 contain yajl, the other yajl backends need
+# the system library
+IJSON_BACKENDS = ["yajl2_c", "yajl2_cffi", "yajl2", "yajl", "python"]
+
+
+@lru_cache(maxsize=None)
+def get_ijson_backend(name: Optional[str] = None) -> ModuleType:
+    """Returns the fastest installed ijson backend
+
+    A backend which can't be imported (e. g. yajl2 without the system yajl library) is skipped.
+
+    Args:
+        name: Name of the backend e. g. 'yajl2_c'. Defaults to the environment variable ETL_IJSON_BACKEND or the
+            fastest installed backend
+
+    Raises:
+        ValueError: If the backend isn't installed
+
+    Returns:
+        The backend module, it has the same functions as the ijson module e. g. items
+    """
+    name = name or os.getenv("ETL_IJSON_BACKEND")
+    for backend_name in [name] if name else IJSON_BACKENDS:
+        try:
+            return importlib.import_module(f"ijson.backends.{backend_name}")
+        except ImportError:
+            continue
+    raise ValueError(f"The ijson backend {name} isn't installed")
+
+
+def iter_json_items(filename: Path, backend: Optional[str] = None) -> Iterator[Any]:
+    """Streams the items of a JSON array file or the objects of a NDJSON file
+
+    The format is detected by the first character of the file. The file is read in blocks of
+    JSON_READ_BUFFER_SIZE, the JSON array is parsed with the fastest ijson backend. Numbers with a fraction are
+    parsed to Decimal in both formats, like ijson does. The backend and the items per second are printed when the
+    file is read.
+
+    Args:
+        filename: Path of the file
+        backend: Name of the ijson backend. Defaults to get_ijson_backend()
+
+    Yields:
+        The items of the file
+    """
+    start = time.perf_counter()
+    count = 0
+    with open(filename, "rb", buffering=JSON_READ_BUFFER_SIZE) as file:
+        if file.peek(JSON_READ_BUFFER_SIZE).lstrip()[:1] == b"[":
+            ijson_backend = get_ijson_backend(backend)
+            backend_name = ijson_backend.__name__.rsplit(".", 1)[-1]
+            items = ijson_backend.items(file, "item")
+        else:
+            backend_name = "json"
+            items = _iter_ndjson_lines(file, Decimal)
+        for item in items:
+            count += 1
+            yield item
+    elapsed = time.perf_counter() - start
+    print(
+        datetime.datetime.now(),
+        f"Read {count} items of {filename.name} with {backend_name} ({count / max(elapsed, 1e-9):.0f} items/s)",
+    )